@@ -1,23 +1,49 @@
 import streamlit as st
-import json
-from patent_qa import PatentQAChatbot
+import asyncio
+import uuid
+from patent_qa import PatentQAChatbot, DEFAULT_INDEX_DIR, DEFAULT_VECTORIZER_BACKEND, DEFAULT_ZIP_PATH, prepare_data
+from downloader import download_file
+from chat_history import DEFAULT_HISTORY_DIR, ChatHistoryStore, is_valid_session_id
 from datetime import datetime
 import os
-import requests
 
 # -------------------------------
 # JSON 다운로드 설정
 # -------------------------------
 JSON_URL = "https://drive.google.com/uc?id=1rlB_4MrzZLFXrwHgPbOQge7bDdinwyKl"
 JSON_PATH = "final_patent_chunking_results.json"
+# `python patent_columnar.py final_patent_chunking_results.json`로 변환해 두면 JSON 대신 사용
+COLUMNAR_PATH = "final_patent_chunking_results.columnar"
+# 알고 있으면 sha256(hex)을 지정해 내려받은 파일을 검증한다
+JSON_SHA256 = os.environ.get("PATENT_JSON_SHA256")
+
+def _looks_like_json_object(path):
+    """체크섬이 없을 때의 최소 검증: 파일 처음과 끝이 JSON 객체의 괄호인지 확인"""
+    with open(path, "rb") as f:
+        head = f.read(64).lstrip(b"\xef\xbb\xbf \t\r\n")
+        f.seek(max(0, os.path.getsize(path) - 64))
+        tail = f.read().rstrip()
+    return head.startswith(b"{") and tail.endswith(b"}")
 
 def download_json():
-    if not os.path.exists(JSON_PATH):
+    # 동봉된 data.zip이 있으면 먼저 압축 해제
+    if not os.path.exists(JSON_PATH) and not os.path.exists(COLUMNAR_PATH) and os.path.exists(DEFAULT_ZIP_PATH):
+        prepare_data(JSON_PATH, DEFAULT_ZIP_PATH)
+    
+    if not os.path.exists(JSON_PATH) and not os.path.exists(COLUMNAR_PATH):
         st.info("📥 특허 데이터 로딩 중입니다. 잠시만 기다려주세요...")
-        r = requests.get(JSON_URL)
-        r.raise_for_status()
-        with open(JSON_PATH, "wb") as f:
-            f.write(r.content)
+        bar = st.progress(0.0, text="다운로드 준비 중...")
+
+        def show_progress(received, total):
+            if total:
+                bar.progress(min(received / total, 1.0), text=f"{received / 2**20:.1f} / {total / 2**20:.1f} MB")
+            else:
+                bar.progress(0.0, text=f"{received / 2**20:.1f} MB")
+
+        # 중간에 끊겨도 다음 실행에서 .part 파일부터 이어받는다
+        download_file(JSON_URL, JSON_PATH, expected_sha256=JSON_SHA256,
+                      validate=_looks_like_json_object, progress=show_progress)
+        bar.empty()
 
 download_json()
 
@@ -139,10 +165,38 @@ st.markdown("""
 # -------------------------------
 @st.cache_resource
 def load_chatbot():
-    return PatentQAChatbot(JSON_PATH)
+    # 서버 프로세스를 여러 개 띄우면 같은 index_dir의 스냅샷을 메모리 맵으로 공유한다
+    # (PATENT_INDEX_DIR=/dev/shm/... 로 두면 디스크 대신 공유 메모리에 둔다)
+    # OPENAI_RPM / OPENAI_TPM: API 키의 분당 요청/토큰 한도 (배치 작업이 돌아도 대화형 질문이 먼저 나간다)
+    # PATENT_VECTORIZER_BACKEND=hashing: 어휘 사전 없는 문자 n-gram 인덱스 (조사가 달라도 검색되고 메모리가 고정)
+    # python chunk_digests.py 로 청크 digest를 미리 만들어 두면 질문마다 보내는 청크 원문이 줄어든다
+    # PATENT_QUESTION_CACHE_SIZE: 조사만 다른 비슷한 질문의 답변을 재사용할 질문 캐시 크기 (기본 0: 사용 안 함)
+    index_dir = os.environ.get("PATENT_INDEX_DIR", DEFAULT_INDEX_DIR)
+    digest_path = os.environ.get("PATENT_DIGEST_PATH", os.path.join(index_dir, "chunk_digests.sqlite"))
+    return PatentQAChatbot(
+        COLUMNAR_PATH if os.path.exists(COLUMNAR_PATH) else JSON_PATH,
+        index_dir=index_dir,
+        digest_path=digest_path if os.path.exists(digest_path) else None,
+        vectorizer_backend=os.environ.get("PATENT_VECTORIZER_BACKEND", DEFAULT_VECTORIZER_BACKEND),
+        requests_per_minute=float(os.environ["OPENAI_RPM"]) if os.environ.get("OPENAI_RPM") else None,
+        tokens_per_minute=float(os.environ["OPENAI_TPM"]) if os.environ.get("OPENAI_TPM") else None,
+        question_cache_size=int(os.environ.get("PATENT_QUESTION_CACHE_SIZE", "0"))
+    )
 
 chatbot = load_chatbot()
 
+# 대화 내역은 세션별 JSONL 파일에 덧붙이기만 하고, 화면에는 최근 구간만 그린다
+# (대화가 길어져도 rerun마다 그리는 메시지 수가 일정하다)
+HISTORY_WINDOW = 20
+HISTORY_PAGE = 20
+GREETING = "안녕하세요! 특허 QA 시스템입니다. 특허에 관한 질문을 자유롭게 입력해주세요."
+
+@st.cache_resource
+def load_history_store():
+    return ChatHistoryStore(os.environ.get("PATENT_CHAT_HISTORY_DIR", DEFAULT_HISTORY_DIR))
+
+history = load_history_store()
+
 # -------------------------------
 # 제목
 # -------------------------------
@@ -153,19 +207,51 @@ st.markdown("---")
 # -------------------------------
 # 세션 상태 초기화
 # -------------------------------
+# 공유 챗봇의 작업 큐에서 세션별 공평성을 맞추기 위한 식별자이자 대화 내역 파일 이름
+# (URL에 남겨 새로고침해도 같은 대화를 이어 본다)
+if "session_id" not in st.session_state:
+    session_id = st.query_params.get("session")
+    if not is_valid_session_id(session_id):
+        session_id = uuid.uuid4().hex
+        st.query_params["session"] = session_id
+    st.session_state.session_id = session_id
+
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    # 저장된 대화가 있으면 최근 구간만 불러온다
+    entries, cursor = history.read_before(st.session_state.session_id, limit=HISTORY_WINDOW)
+    st.session_state.messages = [dict(message, offset=offset) for offset, message in entries]
+    st.session_state.history_cursor = cursor
+    st.session_state.history_window = HISTORY_WINDOW
+    st.session_state.question_count = max((m.get("turn", 0) for m in st.session_state.messages), default=0)
 
-if len(st.session_state.messages) == 0:
-    st.session_state.messages.append({
-        "role": "assistant",
-        "content": "안녕하세요! 특허 QA 시스템입니다. 특허에 관한 질문을 자유롭게 입력해주세요."
-    })
+def add_message(message):
+    """메시지를 대화 내역 파일에 덧붙이고, 화면 구간을 넘는 오래된 메시지는 내린다"""
+    offset = history.append(st.session_state.session_id, message)
+    st.session_state.messages.append(dict(message, offset=offset))
+    overflow = len(st.session_state.messages) - st.session_state.history_window
+    if overflow > 0:
+        del st.session_state.messages[:overflow]
+        st.session_state.history_cursor = st.session_state.messages[0]["offset"]
 
 # -------------------------------
 # 대화 출력
 # -------------------------------
-for msg in st.session_state.messages:
+if st.session_state.history_cursor is not None:
+    if st.button("⬆️ 이전 대화 더 보기", use_container_width=True):
+        entries, cursor = history.read_before(
+            st.session_state.session_id, before=st.session_state.history_cursor, limit=HISTORY_PAGE
+        )
+        st.session_state.messages[:0] = [dict(message, offset=offset) for offset, message in entries]
+        st.session_state.history_cursor = cursor
+        st.session_state.history_window += len(entries)
+        st.rerun()
+
+# 대화의 맨 처음까지 보일 때만 인사말을 표시 (내역에는 저장하지 않는다)
+displayed = st.session_state.messages
+if st.session_state.history_cursor is None:
+    displayed = [{"role": "assistant", "content": GREETING}] + displayed
+
+for msg in displayed:
     if msg["role"] == "user":
         st.markdown(
             f'<div class="user-message-wrapper"><div class="user-message">{msg["content"]}</div></div>',
@@ -191,6 +277,8 @@ for msg in st.session_state.messages:
             if "patents" in msg and msg["patents"]:
                 patents_str = ", ".join(msg["patents"])
                 patent_html = f'<div class="patent-meta-inline">📋 {patents_str}</div>'
+            if msg.get("cache_hit"):
+                patent_html += '<div class="patent-meta-inline">⚡ 비슷한 질문의 답변 재사용</div>'
             
             st.markdown(
                 f'<div class="assistant-message">{msg["content"]}{patent_html}</div>',
@@ -204,9 +292,12 @@ user_input = st.chat_input("메시지를 입력하세요...")
 
 if user_input:
     # 1. 사용자 질문 먼저 추가
-    st.session_state.messages.append({
+    st.session_state.question_count += 1
+    add_message({
         "role": "user",
-        "content": user_input
+        "content": user_input,
+        "turn": st.session_state.question_count,
+        "timestamp": datetime.now().isoformat()
     })
     
     # 2. 화면 즉시 갱신 (질문 표시)
@@ -218,15 +309,52 @@ if (len(st.session_state.messages) > 0 and
     
     last_question = st.session_state.messages[-1]["content"]
     
-    # 로딩 표시
-    with st.spinner("💭 답변 생성 중..."):
-        result = chatbot.ask(last_question, verbose=False, max_patents=3)
+    # 진행 상황과 답변을 생성되는 대로 표시
+    col1, col2 = st.columns([0.05, 0.95])
+    with col2:
+        status = st.empty()
+        answer_box = st.empty()
+    
+    status.caption("💭 관련 특허 검색 중...")
+    
+    async def stream_answer():
+        """공유 작업 큐에서 답변을 받아 오며 진행 상황을 표시"""
+        answer_text = ""
+        result = None
+        
+        async for event in chatbot.ask_stream_async(last_question, max_patents=3,
+                                                    session_id=st.session_state.session_id):
+            if event["type"] == "queued":
+                status.caption(f"⏳ 다른 질문 {event['ahead']}건을 처리하는 중입니다. 잠시만 기다려주세요...")
+            elif event["type"] == "patents":
+                status.caption(f"🔍 관련 특허 {len(event['application_numbers'])}건 발견 · 문서 분석 중...")
+            elif event["type"] == "chunk_done":
+                status.caption(f"📄 문서 분석 중... ({event['done']}/{event['total']})")
+            elif event["type"] == "synthesis_start":
+                status.caption("✍️ 답변 작성 중...")
+            elif event["type"] == "token":
+                answer_text += event["text"]
+                answer_box.markdown(
+                    f'<div class="assistant-message">{answer_text}▌</div>',
+                    unsafe_allow_html=True
+                )
+            elif event["type"] == "result":
+                result = event["result"]
+        
+        return result
+    
+    result = asyncio.run(stream_answer())
+    
+    status.empty()
     
     # 답변 추가
-    st.session_state.messages.append({
+    add_message({
         "role": "assistant",
         "content": result["answer"],
-        "patents": result["application_numbers"]
+        "patents": result["application_numbers"],
+        "cache_hit": result.get("cache_hit", False),
+        "turn": st.session_state.messages[-1].get("turn", st.session_state.question_count),
+        "timestamp": datetime.now().isoformat()
     })
     
     # 답변 후 화면 갱신
@@ -235,14 +363,13 @@ if (len(st.session_state.messages) > 0 and
 # -------------------------------
 # 요약 정보
 # -------------------------------
-if len(st.session_state.messages) > 1:
+if st.session_state.question_count > 0:
     st.markdown("<hr>", unsafe_allow_html=True)
-    user_messages = [m for m in st.session_state.messages if m['role'] == 'user']
     st.markdown(f"""
     <div style="background: white; border-radius: 12px; padding: 1rem; box-shadow: 0 1px 3px rgba(0,0,0,0.08);">
         <h4 style="margin: 0 0 0.5rem 0; color: #1a1a1a;">📊 대화 요약</h4>
         <p style="margin: 0; color: #86868b; font-size: 0.9rem;">
-            총 질문 수: <strong>{len(user_messages)}개</strong>
+            총 질문 수: <strong>{st.session_state.question_count}개</strong>
         </p>
     </div>
     """, unsafe_allow_html=True)
@@ -253,5 +380,8 @@ if len(st.session_state.messages) > 1:
 with st.sidebar:
     st.markdown("### ⚙️ 설정")
     if st.button("🗑️ 대화 내역 초기화", use_container_width=True):
-        st.session_state.messages = []
+        # 이전 대화 파일은 그대로 두고 새 세션으로 시작
+        st.session_state.session_id = uuid.uuid4().hex
+        st.query_params["session"] = st.session_state.session_id
+        del st.session_state.messages
         st.rerun()
@@ -0,0 +1,159 @@
+"""
+특허 코퍼스 로딩 시간 / 메모리 비교 (원본 JSON vs SQLite 저장소 vs 컬럼형)
+
+방식마다 새 프로세스에서 다음을 측정한다.
+
+- json_load: json.load로 전체를 dict로 올림 (기존 방식)
+- sqlite_store: 이미 만든 patent_store(LazyPatents)를 열고 요약문 전체 순회 + 임의 접근
+- columnar: 이미 변환한 patent_columnar 코퍼스를 열고 요약문 전체 순회 + 임의 접근
+
+open 시간, 전체 순회 시간, 임의 접근(특허 1개) 지연 시간과 메모리를 출력한다.
+메모리는 인터프리터 자체(spawn 직후)를 뺀 값으로 비교한다.
+
+- RSS 증가: peak RSS - 측정 시작 전 peak RSS (메모리 맵으로 읽은 파일 페이지 포함,
+  인터프리터 시작 때의 peak보다 작게 쓰면 0)
+- 힙 증가: 익명 메모리 증가분 (Linux만, 프로세스마다 따로 드는 메모리 - 파싱한 dict 등)
+
+변환(JSON → SQLite / 컬럼형)은 한 번만 하는 작업이라 따로 출력한다. 컬럼형은 압축하지 않으므로
+파일 크기는 JSON과 거의 같다 (이득은 크기가 아니라 열기 시간과 프로세스별 메모리).
+
+    python -m benchmarks.bench_corpus_load --sizes 1000,10000,50000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from metrics import percentile
+from benchmarks.run_benchmarks import _anonymous_mb, _peak_rss_mb
+from benchmarks.synthetic_corpus import CorpusGenerator, write_corpus
+
+METHODS = ["json_load", "sqlite_store", "columnar"]
+
+
+def _measure(method: str, paths: dict, lookups: list) -> dict:
+    """로딩 방식 하나를 측정 (자식 프로세스에서 호출)"""
+    baseline_rss = _peak_rss_mb()
+    baseline_anonymous = _anonymous_mb()
+
+    start = time.perf_counter()
+    if method == "json_load":
+        with open(paths["json"], "r", encoding="utf-8") as f:
+            patents = json.load(f)
+    elif method == "sqlite_store":
+        from patent_store import LazyPatents
+        patents = LazyPatents(paths["sqlite"])
+    else:
+        from patent_columnar import ColumnarPatents
+        patents = ColumnarPatents(paths["columnar"])
+    open_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    total_chars = sum(len(patent.get("patent_summary", "")) for _, patent in patents.items())
+    scan_seconds = time.perf_counter() - start
+
+    samples = []
+    for patent_id in lookups:
+        start = time.perf_counter()
+        patents[patent_id]["content_chunks"]
+        samples.append(time.perf_counter() - start)
+
+    anonymous = _anonymous_mb()
+    return {
+        "open_seconds": open_seconds,
+        "scan_seconds": scan_seconds,
+        "lookup_p50_ms": percentile(samples, 50) * 1000,
+        "lookup_p95_ms": percentile(samples, 95) * 1000,
+        "peak_rss_mb": _peak_rss_mb(),
+        "rss_over_interpreter_mb": _peak_rss_mb() - baseline_rss,
+        "anonymous_over_interpreter_mb": None if anonymous is None else anonymous - baseline_anonymous,
+        "summary_chars": total_chars
+    }
+
+
+def _child(method, paths, lookups, queue):
+    try:
+        queue.put(_measure(method, paths, lookups))
+    except Exception as e:
+        queue.put({"error": repr(e)})
+
+
+def run_isolated(method: str, paths: dict, lookups: list) -> dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(method, paths, lookups, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def run(size: int, workdir: str, lookups: int, seed: int) -> dict:
+    from patent_columnar import convert_json_to_columnar
+    from patent_index import file_content_hash
+    from patent_store import _build_store
+
+    generator = CorpusGenerator(seed=seed)
+    paths = {
+        "json": os.path.join(workdir, f"corpus-{size}.json"),
+        "sqlite": os.path.join(workdir, f"corpus-{size}.patents.sqlite"),
+        "columnar": os.path.join(workdir, f"corpus-{size}.columnar")
+    }
+    write_corpus(paths["json"], size, generator)
+    report = {"size": size, "json_mb": os.path.getsize(paths["json"]) / 2 ** 20}
+
+    start = time.perf_counter()
+    _build_store(paths["json"], paths["sqlite"])
+    report["sqlite_convert_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    convert_json_to_columnar(paths["json"], paths["columnar"], source_hash=file_content_hash(paths["json"], workdir))
+    report["columnar_convert_seconds"] = time.perf_counter() - start
+    report["columnar_mb"] = sum(
+        os.path.getsize(os.path.join(paths["columnar"], name)) for name in os.listdir(paths["columnar"])
+    ) / 2 ** 20
+
+    targets = [generator.patent_id((i * 7919) % size) for i in range(lookups)]
+    for method in METHODS:
+        report[method] = run_isolated(method, paths, targets)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="특허 코퍼스 로딩 벤치마크")
+    parser.add_argument("--sizes", default="1000,10000", help="코퍼스 크기 (쉼표 구분)")
+    parser.add_argument("--lookups", type=int, default=500, help="임의 접근 횟수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="결과 JSON 경로")
+    args = parser.parse_args()
+
+    reports = []
+    print(f"{'size':>8} {'method':<13} {'open':>9} {'scan':>9} {'lookup p50':>11} {'RSS 증가':>10} {'힙 증가':>10}")
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        with tempfile.TemporaryDirectory() as workdir:
+            report = run(size, workdir, args.lookups, args.seed)
+        reports.append(report)
+
+        for method in METHODS:
+            result = report[method]
+            if "error" in result:
+                print(f"{size:>8} {method:<13} ❌ {result['error']}")
+                continue
+            anonymous = result["anonymous_over_interpreter_mb"]
+            anonymous = "-" if anonymous is None else f"{anonymous:.1f}MB"
+            print(f"{size:>8} {method:<13} {result['open_seconds']:>8.3f}s {result['scan_seconds']:>8.3f}s "
+                  f"{result['lookup_p50_ms']:>9.3f}ms {result['rss_over_interpreter_mb']:>8.1f}MB {anonymous:>10}")
+        print(f"{'':>8} 변환: sqlite {report['sqlite_convert_seconds']:.2f}s, "
+              f"columnar {report['columnar_convert_seconds']:.2f}s "
+              f"(JSON {report['json_mb']:.1f}MB → columnar {report['columnar_mb']:.1f}MB, 압축하지 않아 크기 이득은 없음)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+요약문 top-k 검색 지연 시간 vs 코퍼스 크기
+
+같은 질문들에 대해 다음 세 방식을 비교하고, 결과(출원번호 순서)가 모두 같은지 확인한다.
+
+- brute_force: 전체 코사인 유사도 + np.argsort[::-1] (기존 방식, 비교 기준)
+- inverted: patent_search.InvertedIndex (역색인 + argpartition)
+- sharded: patent_search.ShardedInvertedIndex (--shards 2 이상일 때)
+
+    python -m benchmarks.bench_retrieval --sizes 10000,100000,1000000 --shards 4
+"""
+import argparse
+import json
+import tempfile
+import time
+
+from metrics import percentile
+from patent_index import VECTORIZER_PARAMS, _save_sparse
+from patent_search import InvertedIndex, ShardedInvertedIndex, brute_force_top_k
+from benchmarks.synthetic_corpus import CorpusGenerator
+
+
+def _measure(search, query_vectors, top_k: int) -> tuple:
+    """질문별 검색 결과와 지연 시간 백분위수"""
+    results = []
+    samples = []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        results.append([idx for idx, _ in search(vector, top_k)])
+        samples.append(time.perf_counter() - start)
+    return results, {
+        "mean": sum(samples) / len(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99)
+    }
+
+
+def _mismatches(results: list, expected: list) -> int:
+    """기준(brute_force)과 순서까지 다른 질문 수"""
+    return sum(result != reference for result, reference in zip(results, expected))
+
+
+def run(size: int, num_questions: int, top_k: int, shards: int, seed: int) -> dict:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    generator = CorpusGenerator(seed=seed)
+    summaries = [generator.summary(i) for i in range(size)]
+    vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
+    matrix = vectorizer.fit_transform(summaries).tocsr()
+    del summaries
+
+    questions = [generator.question((i * 7919) % size) for i in range(num_questions)]
+    query_vectors = [vectorizer.transform([q]) for q in questions]
+
+    report = {"size": size, "nnz": int(matrix.nnz)}
+
+    expected, report["brute_force"] = _measure(
+        lambda vector, k: brute_force_top_k(vector, matrix, k), query_vectors, top_k
+    )
+
+    start = time.perf_counter()
+    inverted = InvertedIndex(matrix.tocsc())
+    report["inverted_build_seconds"] = time.perf_counter() - start
+    results, report["inverted"] = _measure(inverted.search, query_vectors, top_k)
+    report["inverted_mismatches"] = _mismatches(results, expected)
+    report["inverted_identical"] = report["inverted_mismatches"] == 0
+
+    if shards > 1:
+        with tempfile.TemporaryDirectory() as index_dir:
+            _save_sparse(index_dir, "summary_", matrix)
+            sharded = ShardedInvertedIndex(index_dir, "summary_", matrix.shape, shards)
+            try:
+                # 워커 로딩이 끝난 뒤부터 측정
+                sharded.search(query_vectors[0], top_k)
+                results, report["sharded"] = _measure(sharded.search, query_vectors, top_k)
+            finally:
+                sharded.close()
+        report["sharded_mismatches"] = _mismatches(results, expected)
+        report["sharded_identical"] = report["sharded_mismatches"] == 0
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="요약문 top-k 검색 벤치마크")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="코퍼스 크기 (쉼표 구분)")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--shards", type=int, default=0, help="2 이상이면 프로세스 샤딩도 측정")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="결과 JSON 경로")
+    args = parser.parse_args()
+
+    reports = []
+    print(f"{'size':>10} {'brute p50':>12} {'inverted p50':>14} {'sharded p50':>13} {'speedup':>9}  identical")
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        report = run(size, args.questions, args.top_k, args.shards, args.seed)
+        reports.append(report)
+
+        brute = report["brute_force"]["p50"]
+        inverted = report["inverted"]["p50"]
+        sharded = report.get("sharded", {}).get("p50")
+        mismatches = report["inverted_mismatches"] + report.get("sharded_mismatches", 0)
+        sharded_text = f"{sharded * 1000:>10.3f}ms" if sharded is not None else f"{'-':>12}"
+        print(f"{size:>10} {brute * 1000:>10.3f}ms {inverted * 1000:>12.3f}ms {sharded_text} "
+              f"{brute / inverted:>8.1f}x  {'✓' if not mismatches else f'✗ ({mismatches}건 다름)'}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
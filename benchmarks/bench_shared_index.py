@@ -0,0 +1,139 @@
+"""
+여러 서버 프로세스가 검색 인덱스를 공유할 때의 메모리 / 시작 시간
+
+워커 N개를 동시에 띄우고 각 워커가 인덱스를 준비한 뒤 모든 특허에 대해 검색/청크 점수 계산을 한 번씩
+해서 페이지를 실제로 건드린 상태의 메모리를 잰다.
+
+- private: 워커마다 PatentIndex.build로 자기 사본을 만든다 (스냅샷 공유 없음)
+- shared: load_or_build_index로 한 워커만 스냅샷을 만들어 게시하고 나머지는 메모리 맵으로 연다
+
+RSS는 공유 페이지를 워커마다 중복해서 세므로, Linux에서는 공유 페이지를 나눠 세는 PSS 합계도 출력한다.
+
+    python -m benchmarks.bench_shared_index --size 20000 --workers 4
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic_corpus import CorpusGenerator, write_corpus
+
+MODES = ["private", "shared"]
+
+
+def _memory_mb() -> dict:
+    """현재 프로세스의 RSS / PSS (MB, /proc을 읽을 수 없으면 0)"""
+    usage = {"rss_mb": 0.0, "pss_mb": 0.0}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss"):
+                    usage[f"{name.lower()}_mb"] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return usage
+
+
+def _worker(mode: str, json_path: str, index_dir: str, questions: list, barrier, queue):
+    try:
+        from patent_index import PatentIndex, file_content_hash, load_or_build_index
+        from patent_store import open_patent_store
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            source_hash = file_content_hash(json_path, index_dir)
+            patents = open_patent_store(json_path, source_hash, index_dir)
+            if mode == "private":
+                index = PatentIndex.build(patents)
+                from_snapshot = False
+            else:
+                index, from_snapshot = load_or_build_index(json_path, lambda: patents, index_dir, source_hash)
+        ready = time.perf_counter() - start
+
+        # 모든 페이지를 한 번씩 건드린다
+        for question in questions:
+            index.search(index.vectorizer.transform([question]), 3)
+        chunk_vector = index.chunk_vectorizer.transform([questions[0]])
+        for position in range(len(index.patent_ids)):
+            index.chunk_scores(chunk_vector, index.patent_ids[position])
+
+        # 모든 워커가 인덱스를 연 상태에서 재야 PSS가 공유를 반영한다
+        barrier.wait()
+        usage = _memory_mb()
+        barrier.wait()
+        queue.put(dict(usage, ready_seconds=ready, from_snapshot=from_snapshot))
+    except Exception as e:
+        barrier.abort()
+        queue.put({"error": repr(e)})
+
+
+def run(mode: str, json_path: str, index_dir: str, workers: int, questions: list) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    queue = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(mode, json_path, index_dir, questions, barrier, queue))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    errors = [r["error"] for r in results if "error" in r]
+    if errors:
+        return {"error": errors[0]}
+    return {
+        "workers": results,
+        "total_rss_mb": sum(r["rss_mb"] for r in results),
+        "total_pss_mb": sum(r["pss_mb"] for r in results),
+        "max_ready_seconds": max(r["ready_seconds"] for r in results),
+        "built": sum(not r["from_snapshot"] for r in results)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="프로세스 간 검색 인덱스 공유 벤치마크")
+    parser.add_argument("--size", type=int, default=10000, help="특허 수")
+    parser.add_argument("--workers", type=int, default=4, help="동시에 띄울 워커 프로세스 수")
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="결과 JSON 경로")
+    args = parser.parse_args()
+
+    generator = CorpusGenerator(seed=args.seed)
+    questions = [generator.question((i * 7919) % args.size) for i in range(args.questions)]
+
+    reports = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        json_path = write_corpus(os.path.join(workdir, "corpus.json"), args.size, generator)
+        for mode in MODES:
+            # 모드마다 빈 index_dir에서 시작 (shared는 첫 워커가 만들고 나머지가 기다렸다 연다)
+            index_dir = os.path.join(workdir, f"index-{mode}")
+            reports[mode] = run(mode, json_path, index_dir, args.workers, questions)
+            # 이미 게시된 스냅샷에 새 워커들이 붙는 경우 (재시작/스케일 아웃)
+            if mode == "shared":
+                reports["shared_warm"] = run(mode, json_path, index_dir, args.workers, questions)
+
+    print(f"{'mode':<12} {'workers':>7} {'RSS 합계':>10} {'PSS 합계':>10} {'준비 시간':>10} {'빌드 횟수':>8}")
+    for mode, report in reports.items():
+        if "error" in report:
+            print(f"{mode:<12} ❌ {report['error']}")
+            continue
+        print(f"{mode:<12} {args.workers:>7} {report['total_rss_mb']:>8.1f}MB {report['total_pss_mb']:>8.1f}MB "
+              f"{report['max_ready_seconds']:>9.2f}s {report['built']:>8}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
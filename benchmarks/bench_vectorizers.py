@@ -0,0 +1,166 @@
+"""
+검색 인덱스 vectorizer backend 비교 (검색 품질 / 학습 속도 / 메모리 / 인덱스 크기)
+
+설정마다 새 프로세스에서 PatentIndex.build → save → load 후 다음을 측정한다.
+
+- tfidf: 현재 설정 (단어 1~2-gram, max_features=10000)
+- hashing: 문자 n-gram 해싱 + idf (n_jobs=1)
+- hashing_parallel: 같은 설정을 --jobs개 프로세스로 해싱 (결과는 hashing과 같다)
+
+검색 품질은 특허 i를 겨냥한 질문으로 특허 i를 찾는지(recall@1 / recall@k / MRR)로 재고,
+질문 어절의 조사를 바꾼 변형 질문(예: "배터리를" → "배터리는")으로도 잰다.
+
+    python -m benchmarks.bench_vectorizers --sizes 2000,20000 --jobs 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from metrics import percentile
+from benchmarks.run_benchmarks import _peak_rss_mb
+from benchmarks.synthetic_corpus import PARTICLES, CorpusGenerator, write_corpus
+
+CONFIGS = ["tfidf", "hashing", "hashing_parallel"]
+
+
+def vary_particles(question: str, seed: int) -> str:
+    """질문 어절의 조사를 다른 조사로 바꾸거나 떼어낸 변형 (어간은 그대로)"""
+    rng = random.Random(seed)
+    particles = sorted({p for p in PARTICLES if p}, key=len, reverse=True)
+    words = []
+    for word in question.split():
+        for particle in particles:
+            if word.endswith(particle) and len(word) > len(particle) + 1:
+                stem = word[:-len(particle)]
+                word = stem + rng.choice([p for p in PARTICLES if p != particle])
+                break
+        words.append(word)
+    return " ".join(words)
+
+
+def _retrieval_quality(index, questions: list, targets: list, top_k: int) -> dict:
+    """질문마다 겨냥한 특허의 순위로 recall@1 / recall@k / MRR, 검색 지연 시간"""
+    ranks = []
+    samples = []
+    for question, target in zip(questions, targets):
+        start = time.perf_counter()
+        hits = index.search(index.vectorizer.transform([question]), top_k)
+        samples.append(time.perf_counter() - start)
+        found = [index.patent_ids[position] for position, _ in hits]
+        ranks.append(found.index(target) + 1 if target in found else None)
+
+    return {
+        "recall_at_1": sum(rank == 1 for rank in ranks) / len(ranks),
+        f"recall_at_{top_k}": sum(rank is not None for rank in ranks) / len(ranks),
+        "mrr": sum(1.0 / rank for rank in ranks if rank) / len(ranks),
+        "search_p50_ms": percentile(samples, 50) * 1000,
+        "search_p95_ms": percentile(samples, 95) * 1000
+    }
+
+
+def _measure(config: str, json_path: str, questions: list, targets: list, top_k: int, jobs: int) -> dict:
+    """설정 하나를 측정 (자식 프로세스에서 호출)"""
+    from patent_index import PatentIndex
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        patents = json.load(f)
+    baseline_rss = _peak_rss_mb()
+
+    backend = "tfidf" if config == "tfidf" else "hashing"
+    start = time.perf_counter()
+    index = PatentIndex.build(patents, backend, jobs if config == "hashing_parallel" else 1)
+    build_seconds = time.perf_counter() - start
+    build_rss = _peak_rss_mb() - baseline_rss
+    del patents
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        snapshot_dir = os.path.join(snapshot_dir, "snapshot")
+        index.save(snapshot_dir)
+        files = {name: os.path.getsize(os.path.join(snapshot_dir, name)) for name in os.listdir(snapshot_dir)}
+        # 학습한 상태(어휘 + idf)와 행렬은 따로 센다
+        state_bytes = sum(size for name, size in files.items() if "vocabulary" in name or "idf" in name)
+
+        start = time.perf_counter()
+        index = PatentIndex.load(snapshot_dir)
+        load_seconds = time.perf_counter() - start
+
+        report = {
+            "build_seconds": build_seconds,
+            "build_rss_mb": build_rss,
+            "load_seconds": load_seconds,
+            "summary_nnz": int(index.summary_vectors.nnz),
+            "chunk_nnz": int(index.chunk_vectors.nnz),
+            "snapshot_mb": sum(files.values()) / 2 ** 20,
+            "vectorizer_state_mb": state_bytes / 2 ** 20,
+            "exact": _retrieval_quality(index, questions["exact"], targets, top_k),
+            "varied": _retrieval_quality(index, questions["varied"], targets, top_k)
+        }
+    return report
+
+
+def _child(config, json_path, questions, targets, top_k, jobs, queue):
+    try:
+        queue.put(_measure(config, json_path, questions, targets, top_k, jobs))
+    except Exception as e:
+        queue.put({"error": repr(e)})
+
+
+def run_isolated(config: str, json_path: str, questions: dict, targets: list, top_k: int, jobs: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(config, json_path, questions, targets, top_k, jobs, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="검색 인덱스 vectorizer backend 벤치마크")
+    parser.add_argument("--sizes", default="2000,10000", help="코퍼스 크기 (쉼표 구분)")
+    parser.add_argument("--questions", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="hashing_parallel 프로세스 수")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="결과 JSON 경로")
+    args = parser.parse_args()
+
+    generator = CorpusGenerator(seed=args.seed)
+    reports = []
+    print(f"{'size':>7} {'config':<17} {'build':>8} {'build RSS':>10} {'snapshot':>9} {'state':>8} "
+          f"{'R@1':>6} {'MRR':>6} {'R@1 조사변형':>11} {'search p50':>11}")
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        positions = [(i * 7919) % size for i in range(args.questions)]
+        targets = [generator.patent_id(i) for i in positions]
+        exact = [generator.question(i) for i in positions]
+        questions = {"exact": exact, "varied": [vary_particles(q, i) for i, q in enumerate(exact)]}
+
+        report = {"size": size}
+        with tempfile.TemporaryDirectory() as workdir:
+            json_path = write_corpus(os.path.join(workdir, f"corpus-{size}.json"), size, generator)
+            for config in CONFIGS:
+                report[config] = run_isolated(config, json_path, questions, targets, args.top_k, args.jobs)
+        reports.append(report)
+
+        for config in CONFIGS:
+            result = report[config]
+            if "error" in result:
+                print(f"{size:>7} {config:<17} ❌ {result['error']}")
+                continue
+            print(f"{size:>7} {config:<17} {result['build_seconds']:>7.2f}s {result['build_rss_mb']:>8.1f}MB "
+                  f"{result['snapshot_mb']:>7.1f}MB {result['vectorizer_state_mb']:>6.1f}MB "
+                  f"{result['exact']['recall_at_1']:>6.3f} {result['exact']['mrr']:>6.3f} "
+                  f"{result['varied']['recall_at_1']:>11.3f} {result['exact']['search_p50_ms']:>9.3f}ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 결과 저장: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+downloader.download_file 이어받기/검증 경로 확인 (로컬 FakeFileServer 사용)
+
+- 끊긴 연결을 Range 요청으로 이어받기
+- Range를 지원하지 않는 서버에서 처음부터 다시 받기
+- 이전 실행이 남긴 .part 파일에서 이어받기
+- sha256 불일치, HTML 오류 페이지를 실패로 처리하고 깨진 파일을 남기지 않기
+
+기대와 다른 경로가 있으면 종료 코드 1로 끝난다. 재시도 대기(2초) 때문에 몇 초 걸린다.
+
+    python -m benchmarks.check_downloader
+"""
+import hashlib
+import os
+import sys
+import tempfile
+
+from benchmarks.fake_file_server import FakeFileServer
+from downloader import download_file
+
+SIZE = 3 << 20
+
+
+def _leftovers(dest_path: str) -> list:
+    """실패 후 남으면 안 되는 파일 (dest와 .part)"""
+    return [path for path in (dest_path, dest_path + ".part") if os.path.exists(path)]
+
+
+def main():
+    data = b"{" + os.urandom(SIZE // 2).hex().encode() + b"}"
+    sha256 = hashlib.sha256(data).hexdigest()
+    resume_range = f"bytes={SIZE // 3}-"
+
+    # (이름, 서버 설정, 미리 남겨 둘 .part 바이트 수, 기대하는 실패 메시지 일부 또는 None, 기대하는 Range 요청들)
+    cases = [
+        ("전체 받기", {}, 0, None, [None]),
+        ("끊긴 연결 이어받기", {"drop_after": SIZE // 3}, 0, None, [None, resume_range]),
+        ("Range 미지원 서버", {"drop_after": SIZE // 3, "support_range": False}, 0, None, [None, resume_range]),
+        ("남은 .part에서 이어받기", {}, SIZE // 3, None, [resume_range]),
+        ("sha256 불일치", {"corrupt": True}, 0, "체크섬 불일치", [None]),
+        ("HTML 오류 페이지", {"content_type": "text/html"}, 0, "HTML", [None])
+    ]
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        for number, (name, options, partial, error, expected_requests) in enumerate(cases):
+            dest_path = os.path.join(workdir, f"case-{number}.json")
+            if partial:
+                with open(dest_path + ".part", "wb") as f:
+                    f.write(data[:partial])
+
+            with FakeFileServer(data, **options) as server:
+                try:
+                    download_file(server.url, dest_path, expected_sha256=sha256, max_retries=2)
+                    with open(dest_path, "rb") as f:
+                        outcome = "ok" if f.read() == data else "내용 불일치"
+                except Exception as e:
+                    outcome = str(e)
+                requests = list(server.requests)
+
+            if error is None:
+                ok = outcome == "ok"
+            else:
+                ok = error in outcome and not _leftovers(dest_path)
+            ok = ok and requests == expected_requests
+            failures += not ok
+            print(f"{'✓' if ok else '❌'} {name:<18} 결과: {outcome[:60]:<60} 요청 Range: {requests}")
+
+    if failures:
+        print(f"\n❌ 기대와 다른 경로 {failures}건")
+        sys.exit(1)
+    print("\n✅ 이어받기와 검증 경로가 모두 기대대로 동작합니다")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+질문 캐시(SemanticQuestionCache) 재사용 판정 확인
+
+문자 n-gram 유사도는 높지만 뜻이 반대인 질문(양극재/음극재, 장점/단점, 최대/최소)은 캐시를 재사용하지 않고,
+조사만 다른 질문은 재사용하는지 확인한다. 같은 특허 집합이 검색된 경우(캐시가 실제로 틀린 답을 줄 수 있는 경우)만 본다.
+기대와 다른 쌍이 있으면 종료 코드 1로 끝난다.
+
+    python -m benchmarks.check_question_cache
+"""
+import sys
+
+from question_cache import SemanticQuestionCache
+
+PATENT_IDS = ["1020200000001", "1020200000002", "1020200000003"]
+
+# (캐시에 넣은 질문, 새 질문, 재사용해야 하는지)
+PAIRS = [
+    ("리튬 이차전지 양극재의 조성은 무엇인가요?", "리튬 이차전지 음극재의 조성은 무엇인가요?", False),
+    ("이 발명의 장점은 무엇인가요?", "이 발명의 단점은 무엇인가요?", False),
+    ("전극 활물질층의 최대 두께는 얼마인가요?", "전극 활물질층의 최소 두께는 얼마인가요?", False),
+    ("분리막의 기공률을 높이는 방법은?", "분리막의 기공률을 낮추는 방법은?", False),
+    ("배터리를 충전하는 방법은 무엇인가요?", "배터리 충전하는 방법은 무엇인가요?", True),
+    ("리튬 이차전지 양극재의 조성은 무엇인가요?", "리튬 이차전지 양극재 조성은 무엇인가요?", True),
+    ("전극의 최대 두께는?", "전극 최대 두께는?", True)
+]
+
+
+def main():
+    cache = SemanticQuestionCache()
+    failures = 0
+    print(f"{'기대':<4} {'결과':<4} {'유사도':>6}  질문")
+    for cached_question, question, expected in PAIRS:
+        cache.clear()
+        cache.set(cached_question, PATENT_IDS, {"answer": cached_question})
+        hit = cache.get(question, PATENT_IDS)
+        ok = (hit is not None) == expected
+        failures += not ok
+        similarity = f"{hit[2]:.3f}" if hit else "-"
+        print(f"{'hit' if expected else 'miss':<4} {'hit' if hit else 'miss':<4} {similarity:>6}  "
+              f"{'✓' if ok else '❌'} {cached_question} → {question}")
+
+    if failures:
+        print(f"\n❌ 기대와 다른 판정 {failures}건")
+        sys.exit(1)
+    print("\n✅ 반대말 질문은 재사용하지 않고, 조사만 다른 질문은 재사용합니다")
+
+
+if __name__ == "__main__":
+    main()
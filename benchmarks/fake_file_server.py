@@ -0,0 +1,105 @@
+"""
+파일 다운로드 대체용 로컬 HTTP 서버 (다운로드/이어받기 확인 전용)
+
+Range(206), If-Range, ETag를 지원하고, 응답 도중 연결을 끊거나(drop_after) 일부러 깨진 데이터를
+보내도록(corrupt) 설정할 수 있어 downloader.download_file의 이어받기와 검증 경로를 재현할 수 있다.
+
+    with FakeFileServer(data, drop_after=1 << 20) as server:
+        download_file(server.url, "out.json")
+"""
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeFileServer:
+    def __init__(self, data: bytes, host: str = "127.0.0.1", port: int = 0, drop_after: int = None,
+                 drops: int = 1, support_range: bool = True, content_type: str = "application/octet-stream",
+                 corrupt: bool = False):
+        """
+        Args:
+            data: 내려줄 파일 내용
+            drop_after: 한 응답에서 이만큼 보낸 뒤 연결을 끊는다 (None이면 끊지 않음)
+            drops: 연결을 끊는 최대 횟수
+            support_range: False면 Range 헤더를 무시하고 항상 200으로 전체를 보낸다
+            content_type: Content-Type 헤더
+            corrupt: True면 마지막 바이트를 바꿔서 보낸다 (체크섬 실패 재현)
+        """
+        self.data = data
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self.etag = f'"{self.sha256[:16]}"'
+        self.requests = []
+        self._drops_left = drops if drop_after is not None else 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                body = server.data
+                if corrupt and body:
+                    body = body[:-1] + bytes([body[-1] ^ 0xFF])
+
+                start = 0
+                range_header = self.headers.get("Range")
+                if_range = self.headers.get("If-Range")
+                with server._lock:
+                    server.requests.append(range_header)
+                    drop = server._drops_left > 0
+                    if drop:
+                        server._drops_left -= 1
+
+                if support_range and range_header and if_range in (None, server.etag):
+                    start = int(range_header.split("=", 1)[1].split("-", 1)[0])
+                    if start >= len(body):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(body)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+                else:
+                    self.send_response(200)
+
+                if support_range:
+                    self.send_header("Accept-Ranges", "bytes")
+                self.send_header("ETag", server.etag)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body) - start))
+                self.end_headers()
+
+                payload = body[start:]
+                if drop:
+                    # 약속한 길이보다 덜 보내고 연결을 끊는다
+                    self.wfile.write(payload[:drop_after])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(payload)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/data.json"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,280 @@
+"""
+OpenAI chat completions 대체용 로컬 LLM (벤치마크 전용)
+
+- FakeChatClient: PatentQAChatbot(client=...)에 바로 넣을 수 있는 프로세스 내 클라이언트
+- FakeChatCompletionsServer: /v1/chat/completions를 흉내 내는 로컬 HTTP 서버
+  (실제 openai.OpenAI(base_url=server.base_url)로 HTTP 경로까지 포함해 측정할 때 사용)
+
+지연 시간, 지터, 오류(429) 비율을 설정할 수 있고, 같은 seed와 같은 요청 순서면 같은 결과를 낸다.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+
+NO_ANSWER_TEXT = "문서에서 해당 정보를 찾을 수 없습니다."
+
+# 묶음 요청(patent_qa.PACKED_SECTION_HEADER)의 문서 구분 머리글
+SECTION_PATTERN = re.compile(r"^### 문서 (\d+)$", re.MULTILINE)
+
+# 청크 digest 요청(chunk_digests.digest_messages)에만 있는 응답 형식 필드
+DIGEST_MARKER = '"entities"'
+
+
+class FakeLLM:
+    """요청 하나에 대한 지연/오류/응답 내용을 결정하는 공통 로직"""
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.1, error_rate: float = 0.0,
+                 no_answer_rate: float = 0.3, tokens_per_second: float = 200.0, seed: int = 0):
+        """
+        Args:
+            latency: 요청당 기본 지연 (초)
+            jitter: 지연에 더해지는 0~jitter초 균등 분포 잡음
+            error_rate: rate limit(429) 오류를 낼 확률
+            no_answer_rate: "정보 없음" 답변을 낼 확률 (프롬프트 해시로 결정되어 재현 가능)
+            tokens_per_second: 스트리밍 시 토큰 생성 속도
+            seed: 난수 seed
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.no_answer_rate = no_answer_rate
+        self.tokens_per_second = tokens_per_second
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        """대략적인 토큰 수 (한국어 기준 약 2자당 1토큰)"""
+        return max(1, len(text) // 2)
+
+    def _is_no_answer(self, text: str) -> bool:
+        """텍스트 해시로 "정보 없음" 여부를 결정 (같은 텍스트면 항상 같은 결과)"""
+        digest = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+        return digest % 1000 < self.no_answer_rate * 1000
+
+    def _json_reply(self, prompt: str) -> str:
+        """
+        JSON 요청에 대한 응답
+
+        - 청크 digest 요청(chunk_digests.digest_messages): 본문 일부로 만든 digest
+        - 묶음 요청: {"results": [...]} (문서마다 정보 유무 / 관련 여부를 따로 결정)
+        """
+        if DIGEST_MARKER in prompt:
+            body = prompt.split("문서 내용:", 1)[-1].split("다음 JSON 형식", 1)[0].strip()
+            words = body.split()
+            return json.dumps({
+                "summary": " ".join(words[:12]),
+                "entities": words[12:18],
+                "claims": [" ".join(words[18:30])] if len(words) > 18 else [],
+                "parameters": [word for word in words if any(ch.isdigit() for ch in word)][:4]
+            }, ensure_ascii=False)
+
+        sections = SECTION_PATTERN.split(prompt)
+        results = []
+        # split 결과: [머리말, 번호1, 본문1, 번호2, 본문2, ...]
+        for number, body in zip(sections[1::2], sections[2::2]):
+            if self._is_no_answer(body):
+                results.append({"document": int(number), "has_answer": False, "relevant": False, "answer": ""})
+            else:
+                snippet = body.strip()[:120].replace("\n", " ")
+                results.append({"document": int(number), "has_answer": True, "relevant": True,
+                                "answer": f"문서에 따르면 {snippet}"})
+        return json.dumps({"results": results}, ensure_ascii=False)
+
+    def plan(self, messages: list, max_tokens: int = None, response_format: dict = None) -> dict:
+        """지연 시간, 오류 여부, 응답 텍스트, 토큰 사용량 결정"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+
+        prompt = "\n".join(m.get("content", "") for m in messages)
+
+        if response_format and response_format.get("type") == "json_object":
+            content = self._json_reply(prompt)
+        elif self._is_no_answer(prompt):
+            content = NO_ANSWER_TEXT
+        else:
+            # 프롬프트 마지막 부분을 재료로 한 결정적인 답변
+            tail = prompt[-200:].replace("\n", " ")
+            content = f"문서에 따르면 {tail}"
+            if max_tokens:
+                content = content[:max_tokens * 2]
+
+        return {
+            "delay": delay,
+            "failed": failed,
+            "content": content,
+            "prompt_tokens": self.count_tokens(prompt),
+            "completion_tokens": self.count_tokens(content)
+        }
+
+
+def _rate_limit_error():
+    """openai.RateLimitError (HTTP 응답 없이 생성)"""
+    from openai import RateLimitError
+
+    response = SimpleNamespace(request=None, status_code=429, headers={"retry-after": "0"})
+    return RateLimitError("Rate limit reached (fake)", response=response, body=None)
+
+
+class _FakeCompletions:
+    def __init__(self, llm: FakeLLM):
+        self._llm = llm
+
+    def create(self, model: str, messages: list, max_tokens: int = None, temperature: float = None,
+               timeout: float = None, stream: bool = False, stream_options: dict = None, **kwargs):
+        plan = self._llm.plan(messages, max_tokens, kwargs.get("response_format"))
+        time.sleep(plan["delay"])
+        if plan["failed"]:
+            raise _rate_limit_error()
+
+        usage = SimpleNamespace(
+            prompt_tokens=plan["prompt_tokens"],
+            completion_tokens=plan["completion_tokens"],
+            total_tokens=plan["prompt_tokens"] + plan["completion_tokens"]
+        )
+
+        if not stream:
+            message = SimpleNamespace(role="assistant", content=plan["content"])
+            return SimpleNamespace(
+                model=model,
+                choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")],
+                usage=usage
+            )
+
+        include_usage = bool(stream_options and stream_options.get("include_usage"))
+        return self._stream(plan["content"], usage if include_usage else None)
+
+    def _stream(self, content: str, usage):
+        step = 4
+        for i in range(0, len(content), step):
+            time.sleep(step / 2 / self._llm.tokens_per_second)
+            delta = SimpleNamespace(content=content[i:i + step])
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta)], usage=None)
+        if usage is not None:
+            yield SimpleNamespace(choices=[], usage=usage)
+
+
+class FakeChatClient:
+    """openai.OpenAI 대신 쓰는 프로세스 내 클라이언트 (client.chat.completions.create만 제공)"""
+
+    def __init__(self, **kwargs):
+        self.llm = FakeLLM(**kwargs)
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self.llm))
+
+
+class FakeChatCompletionsServer:
+    """
+    /v1/chat/completions를 흉내 내는 로컬 HTTP 서버
+
+    사용 예:
+        with FakeChatCompletionsServer(latency=0.2) as server:
+            client = OpenAI(base_url=server.base_url, api_key="fake")
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **kwargs):
+        self.llm = FakeLLM(**kwargs)
+        llm = self.llm
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                plan = llm.plan(body.get("messages", []), body.get("max_tokens"), body.get("response_format"))
+                time.sleep(plan["delay"])
+
+                if plan["failed"]:
+                    self._send_json(429, {"error": {
+                        "message": "Rate limit reached (fake)", "type": "rate_limit_error", "code": "rate_limit_exceeded"
+                    }}, {"retry-after": "0"})
+                    return
+
+                usage = {
+                    "prompt_tokens": plan["prompt_tokens"],
+                    "completion_tokens": plan["completion_tokens"],
+                    "total_tokens": plan["prompt_tokens"] + plan["completion_tokens"]
+                }
+                base = {"id": f"chatcmpl-fake-{llm.requests}", "created": int(time.time()),
+                        "model": body.get("model", "fake")}
+
+                if body.get("stream"):
+                    self._send_stream(base, plan["content"], usage,
+                                      bool((body.get("stream_options") or {}).get("include_usage")))
+                else:
+                    self._send_json(200, dict(base, object="chat.completion", usage=usage, choices=[{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": plan["content"]},
+                        "finish_reason": "stop"
+                    }]))
+
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, base, content, usage, include_usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+
+                def send(payload):
+                    line = f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                    self.wfile.write(line.encode("utf-8"))
+                    self.wfile.flush()
+
+                step = 4
+                for i in range(0, len(content), step):
+                    time.sleep(step / 2 / llm.tokens_per_second)
+                    send(dict(base, object="chat.completion.chunk", choices=[{
+                        "index": 0, "delta": {"content": content[i:i + step]}, "finish_reason": None
+                    }]))
+                if include_usage:
+                    send(dict(base, object="chat.completion.chunk", choices=[], usage=usage))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,292 @@
+"""
+PatentQAChatbot 오프라인 벤치마크
+
+합성 코퍼스와 로컬 가짜 LLM(FakeChatClient)으로 다음 시나리오를 측정하고 결과를 JSON으로 저장한다.
+
+- startup_cold: 인덱스/저장소가 없는 상태에서 챗봇 생성
+- startup_warm: 스냅샷이 있는 상태에서 챗봇 생성
+- retrieval: _find_top_relevant_patents 지연 시간
+- ask: ask() 전체 지연 시간 (LLM은 가짜 클라이언트)
+- batch: batch_process 처리량
+
+시나리오마다 별도 프로세스에서 실행하여 peak RSS를 따로 잰다.
+
+    python -m benchmarks.run_benchmarks --sizes 1000,10000 --output bench.json
+    python -m benchmarks.run_benchmarks --sizes 1000 --compare bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from metrics import percentile
+from benchmarks.synthetic_corpus import CorpusGenerator, write_corpus
+
+# 결과에 남길 커밋을 읽을 저장소 경로
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+SCENARIOS = ["startup_cold", "startup_warm", "retrieval", "ask", "batch"]
+
+
+def _peak_rss_mb() -> float:
+    """현재 프로세스의 peak RSS (MB)"""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS는 바이트, Linux는 KB 단위
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _anonymous_mb():
+    """
+    현재 프로세스의 익명(파일에 매핑되지 않은) 메모리 (MB, Linux만 - 다른 OS는 None)
+
+    메모리 맵으로 읽은 파일 페이지는 RSS에 잡혀도 프로세스끼리 공유되고 회수할 수 있으므로,
+    프로세스마다 따로 드는 메모리(파싱한 객체 등)는 이 값으로 비교한다.
+    """
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                if line.startswith("Anonymous:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _latency_stats(samples: list) -> dict:
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples) if samples else 0.0,
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99)
+    }
+
+
+def _make_chatbot(config: dict, json_path: str, index_dir: str):
+    from patent_qa import PatentQAChatbot
+    from benchmarks.fake_llm import FakeChatClient
+
+    client = FakeChatClient(
+        latency=config["llm_latency"],
+        jitter=config["llm_jitter"],
+        error_rate=config["llm_error_rate"],
+        seed=config["seed"]
+    )
+    options = dict(config.get("chatbot_options", {}))
+    options.setdefault("max_concurrency", config["max_concurrency"])
+    return PatentQAChatbot(json_path, index_dir=index_dir, cache_path=None, client=client, **options), client
+
+
+def _run_scenario(scenario: str, config: dict, json_path: str, index_dir: str, size: int) -> dict:
+    """시나리오 하나를 실행 (자식 프로세스에서 호출)"""
+    generator = CorpusGenerator(seed=config["seed"])
+    targets = [(i * 7919) % size for i in range(config["questions"])]
+    questions = [generator.question(i) for i in targets]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if scenario == "startup_cold":
+            shutil.rmtree(index_dir, ignore_errors=True)
+            start = time.perf_counter()
+            _make_chatbot(config, json_path, index_dir)
+            return {"seconds": time.perf_counter() - start}
+
+        start = time.perf_counter()
+        chatbot, client = _make_chatbot(config, json_path, index_dir)
+        startup = time.perf_counter() - start
+
+        if scenario == "startup_warm":
+            return {"seconds": startup}
+
+        if scenario == "retrieval":
+            samples = []
+            hits = 0
+            for question, target in zip(questions, targets):
+                start = time.perf_counter()
+                top_patents = chatbot._find_top_relevant_patents(question, top_k=3)
+                samples.append(time.perf_counter() - start)
+                hits += generator.patent_id(target) in [p[0] for p in top_patents]
+            stats = _latency_stats(samples)
+            # 질문을 만든 특허가 top-3에 든 비율 (검색 품질 회귀 확인용)
+            stats["recall_at_3"] = hits / max(1, len(samples))
+            return stats
+
+        if scenario == "ask":
+            samples = []
+            llm_calls = 0
+            for question in questions[:config["ask_questions"]]:
+                start = time.perf_counter()
+                result = chatbot.ask(question, verbose=False)
+                samples.append(time.perf_counter() - start)
+                llm_calls += len(result.get("metrics", {}).get("calls", []))
+            stats = _latency_stats(samples)
+            stats["llm_calls_per_question"] = llm_calls / max(1, len(samples))
+            return stats
+
+        if scenario == "batch":
+            fd, output = tempfile.mkstemp(suffix=".jsonl")
+            os.close(fd)
+            try:
+                batch_questions = questions[:config["batch_questions"]]
+                start = time.perf_counter()
+                results = chatbot.batch_process(batch_questions, output_file=output, resume=False)
+                elapsed = time.perf_counter() - start
+            finally:
+                os.remove(output)
+
+            tokens = sum(r.get("prompt_tokens", 0) + r.get("completion_tokens", 0) for r in results)
+            return {
+                "seconds": elapsed,
+                "questions": len(results),
+                "questions_per_minute": len(results) / elapsed * 60,
+                "tokens_per_minute": tokens / elapsed * 60,
+                "llm_requests": client.llm.requests
+            }
+
+    raise ValueError(f"알 수 없는 시나리오: {scenario}")
+
+
+def _child(scenario, config, json_path, index_dir, size, queue):
+    try:
+        result = _run_scenario(scenario, config, json_path, index_dir, size)
+        result["peak_rss_mb"] = _peak_rss_mb()
+        queue.put(result)
+    except Exception as e:
+        queue.put({"error": repr(e)})
+
+
+def run_isolated(scenario: str, config: dict, json_path: str, index_dir: str, size: int) -> dict:
+    """시나리오를 새 프로세스에서 실행하여 결과와 peak RSS 반환"""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(scenario, config, json_path, index_dir, size, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(previous: dict, current: dict):
+    """이전 결과 대비 주요 지표 변화 출력 (+는 느려짐/증가)"""
+    keys = {"startup_cold": "seconds", "startup_warm": "seconds", "retrieval": "p50",
+            "ask": "p50", "batch": "questions_per_minute"}
+
+    print("\n📊 이전 결과 대비 변화")
+    for size, scenarios in current["results"].items():
+        old = previous.get("results", {}).get(size, {})
+        for scenario, result in scenarios.items():
+            key = keys.get(scenario)
+            if key is None or key not in result or key not in old.get(scenario, {}):
+                continue
+            before, after = old[scenario][key], result[key]
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"   [{size}] {scenario:<13} {key:<21} {before:>12.4f} → {after:>12.4f} ({change:+.1f}%)")
+            rss_before = old[scenario].get("peak_rss_mb", 0.0)
+            print(f"   [{size}] {scenario:<13} {'peak_rss_mb':<21} {rss_before:>12.1f} → {result['peak_rss_mb']:>12.1f}")
+
+
+def _parse_options(items: list) -> dict:
+    """KEY=VALUE 목록을 dict로 (VALUE가 JSON이 아니면 문자열로 취급)"""
+    options = {}
+    for item in items:
+        key, _, value = item.partition("=")
+        try:
+            options[key] = json.loads(value)
+        except json.JSONDecodeError:
+            options[key] = value
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PatentQAChatbot 오프라인 벤치마크")
+    parser.add_argument("--sizes", default="1000,10000", help="코퍼스 크기 (쉼표 구분, 예: 1000,10000,100000,1000000)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--workdir", default=".bench", help="합성 코퍼스와 인덱스를 둘 디렉토리")
+    parser.add_argument("--output", default=None, help="결과 JSON 경로 (기본: workdir/results-<시각>.json)")
+    parser.add_argument("--compare", default=None, help="비교할 이전 결과 JSON")
+    parser.add_argument("--questions", type=int, default=200, help="검색 벤치마크 질문 수")
+    parser.add_argument("--ask-questions", type=int, default=20)
+    parser.add_argument("--batch-questions", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="가짜 LLM 기본 지연 (초)")
+    parser.add_argument("--llm-jitter", type=float, default=0.02)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--option", action="append", default=[], metavar="KEY=VALUE",
+                        help="PatentQAChatbot 생성 인자 (값은 JSON 또는 문자열, 예: --option early_exit_answers=3 --option extraction_mode=packed)")
+    args = parser.parse_args()
+
+    config = {
+        "questions": args.questions,
+        "ask_questions": args.ask_questions,
+        "batch_questions": args.batch_questions,
+        "llm_latency": args.llm_latency,
+        "llm_jitter": args.llm_jitter,
+        "llm_error_rate": args.llm_error_rate,
+        "max_concurrency": args.max_concurrency,
+        "seed": args.seed,
+        "chatbot_options": _parse_options(args.option)
+    }
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    scenarios = [s for s in args.scenarios.split(",") if s]
+
+    os.makedirs(args.workdir, exist_ok=True)
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": {}
+    }
+
+    for size in sizes:
+        json_path = os.path.join(args.workdir, f"corpus-{size}-seed{args.seed}.json")
+        if not os.path.exists(json_path):
+            print(f"📝 합성 코퍼스 생성 중: {size}개 특허")
+            tmp_path = json_path + ".tmp"
+            write_corpus(tmp_path, size, CorpusGenerator(seed=args.seed))
+            os.replace(tmp_path, json_path)
+
+        index_dir = os.path.join(args.workdir, f"index-{size}")
+        report["results"][str(size)] = {}
+
+        # startup_warm 이후 시나리오는 스냅샷이 있어야 하므로 cold를 먼저 실행
+        for scenario in sorted(scenarios, key=SCENARIOS.index):
+            print(f"⏱️ [{size}] {scenario} ...", end=" ", flush=True)
+            result = run_isolated(scenario, config, json_path, index_dir, size)
+            report["results"][str(size)][scenario] = result
+            print(json.dumps(result, ensure_ascii=False))
+
+    output = args.output or os.path.join(args.workdir, f"results-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 결과 저장: {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+벤치마크용 합성 특허 코퍼스 생성기
+
+final_patent_chunking_results.json과 같은 스키마
+({출원번호: {"patent_summary": ..., "content_chunks": [{"chunk_id", "text"}, ...]}})로
+1천 ~ 100만 건 규모의 코퍼스를 스트리밍으로 기록한다 (메모리 사용량은 규모와 무관).
+
+    python -m benchmarks.synthetic_corpus --patents 100000 --output .bench/corpus-100k.json
+"""
+import argparse
+import json
+import random
+
+
+SYLLABLES = (
+    "가 나 다 라 마 바 사 아 자 차 카 타 파 하 기 니 디 리 미 비 시 이 지 치 "
+    "전 극 판 층 막 선 관 체 질 소 재 열 광 압 류 량 속 도 계 회 로 신 호 처 리 "
+    "장 치 방 법 모 듈 센 서 렌 즈 기 판 반 도 배 터 냉 각 코 팅 필 름 구 조 제 어"
+).split()
+PARTICLES = ["", "", "", "은", "는", "이", "가", "을", "를", "의", "에", "으로", "에서"]
+CONNECTIVES = ["또한", "이때", "상기", "그리고", "따라서", "본 발명은", "일 실시예에서"]
+
+
+def build_vocabulary(size: int = 20000, seed: int = 0) -> list:
+    """2~4음절 합성 단어 목록 (앞쪽 단어일수록 자주 쓰이도록 Zipf 분포로 샘플링한다)"""
+    rng = random.Random(seed)
+    words = []
+    seen = set()
+    while len(words) < size:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+class CorpusGenerator:
+    """출원번호 i의 특허 내용을 (seed, i)만으로 결정적으로 생성"""
+
+    def __init__(self, seed: int = 0, vocabulary_size: int = 20000, topic_size: int = 8,
+                 chunks_per_patent: tuple = (5, 20), words_per_chunk: tuple = (60, 120),
+                 words_per_summary: tuple = (30, 60)):
+        import numpy as np
+
+        self.seed = seed
+        self.vocabulary = build_vocabulary(vocabulary_size, seed)
+        self.topic_size = topic_size
+        self.chunks_per_patent = chunks_per_patent
+        self.words_per_chunk = words_per_chunk
+        self.words_per_summary = words_per_summary
+
+        # Zipf 분포 (s=1.1) 누적 확률 - 배경 단어 샘플링용
+        ranks = np.arange(1, vocabulary_size + 1, dtype=np.float64)
+        weights = 1.0 / ranks ** 1.1
+        self._cumulative = np.cumsum(weights / weights.sum())
+
+    @staticmethod
+    def patent_id(i: int) -> str:
+        return f"10-{2000 + i // 1000000:04d}-{i % 10000000:07d}"
+
+    def _rng(self, i: int):
+        import numpy as np
+        return np.random.default_rng([self.seed, i])
+
+    def topic(self, i: int) -> list:
+        """특허 i의 주제 단어 (요약과 청크에 자주 등장하며, 질문 생성에도 사용)"""
+        rng = self._rng(i)
+        # 주제 단어는 너무 흔하지 않은 중간 빈도 단어에서 고른다
+        indices = rng.integers(len(self.vocabulary) // 50, len(self.vocabulary), size=self.topic_size)
+        return [self.vocabulary[j] for j in indices]
+
+    def _sentence_words(self, rng, topic: list, count: int, topic_ratio: float) -> str:
+        background = self._cumulative.searchsorted(rng.random(count))
+        use_topic = rng.random(count) < topic_ratio
+        topic_picks = rng.integers(0, len(topic), size=count)
+        particles = rng.integers(0, len(PARTICLES), size=count)
+
+        words = []
+        for k in range(count):
+            word = topic[topic_picks[k]] if use_topic[k] else self.vocabulary[background[k]]
+            words.append(word + PARTICLES[particles[k]])
+            if k % 15 == 14:
+                words.append(CONNECTIVES[int(background[k]) % len(CONNECTIVES)])
+        return " ".join(words) + "."
+
+    def _summary(self, i: int) -> tuple:
+        rng = self._rng(i)
+        topic = self.topic(i)
+        summary = self._sentence_words(rng, topic, int(rng.integers(*self.words_per_summary)), 0.4)
+        return rng, topic, summary
+
+    def summary(self, i: int) -> str:
+        """특허 i의 patent_summary만 생성 (청크 생성 비용 없이 검색 벤치마크용)"""
+        return self._summary(i)[2]
+
+    def patent(self, i: int) -> dict:
+        rng, topic, summary = self._summary(i)
+        chunks = []
+        for chunk_id in range(int(rng.integers(*self.chunks_per_patent))):
+            # 청크마다 주제 비중을 달리하여 청크 순위에 의미가 있도록 한다
+            text = self._sentence_words(rng, topic, int(rng.integers(*self.words_per_chunk)), float(rng.uniform(0.02, 0.3)))
+            chunks.append({"chunk_id": chunk_id, "text": text})
+
+        return {"patent_summary": summary, "content_chunks": chunks}
+
+    def question(self, i: int, n_terms: int = 3, n_common: int = 2) -> str:
+        """
+        특허 i를 겨냥한 질문 (요약에 실제로 나온 주제 어절 n_terms개 + 흔한 어절 n_common개 + 질문 어미)
+
+        흔한 어절은 posting list가 긴 단어라 대규모 코퍼스에서 검색 비용을 현실적으로 만든다.
+        """
+        rng = self._rng(i + 7919)
+        topic = self.topic(i)
+        # 조사가 붙은 형태까지 요약과 같아야 TF-IDF 어휘와 맞으므로 요약의 어절에서 고른다
+        tokens = self.summary(i).rstrip(".").split()
+        topical = sorted({t for t in tokens if any(t.startswith(w) for w in topic)})
+        common = sorted({t for t in tokens if t not in topical and t not in CONNECTIVES})
+
+        terms = [topical[int(k)] for k in rng.choice(len(topical), size=min(n_terms, len(topical)), replace=False)]
+        terms += [common[int(k)] for k in rng.choice(len(common), size=min(n_common, len(common)), replace=False)]
+        return " ".join(terms) + " 에 대해 설명해 주세요"
+
+
+def write_corpus(path: str, num_patents: int, generator: CorpusGenerator = None) -> str:
+    """코퍼스를 JSON 파일로 스트리밍 기록"""
+    generator = generator or CorpusGenerator()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{")
+        for i in range(num_patents):
+            if i:
+                f.write(",\n")
+            f.write(json.dumps(generator.patent_id(i)))
+            f.write(": ")
+            f.write(json.dumps(generator.patent(i), ensure_ascii=False))
+        f.write("}\n")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="합성 특허 코퍼스 생성")
+    parser.add_argument("--patents", type=int, default=1000, help="특허 수")
+    parser.add_argument("--output", default="synthetic_patents.json", help="출력 JSON 경로")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-chunks", type=int, default=5)
+    parser.add_argument("--max-chunks", type=int, default=20)
+    args = parser.parse_args()
+
+    generator = CorpusGenerator(seed=args.seed, chunks_per_patent=(args.min_chunks, args.max_chunks + 1))
+    write_corpus(args.output, args.patents, generator)
+    print(f"✅ {args.patents}개 특허 생성 완료: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
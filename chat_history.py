@@ -0,0 +1,167 @@
+"""
+세션별 대화 내역 저장소 (append-only JSONL)
+
+세션마다 {directory}/{session_id}.jsonl 파일에 메시지를 한 줄씩 덧붙이기만 하므로
+대화가 길어져도 메시지 하나를 저장하는 비용이 일정하다. 최근 메시지부터 파일 끝을 거꾸로 읽어
+화면에 보여줄 구간만 가져오고, 더 오래된 메시지는 바이트 offset 커서로 이어서 읽는다.
+
+쓰기는 매번 OS에 넘기고(프로세스가 죽어도 남는다), 디스크 동기화(fsync)는 fsync_every개 또는
+fsync_interval초마다 묶어서 한다. 전원이 나가면 마지막 묶음만 잃을 수 있다.
+"""
+import atexit
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_HISTORY_DIR = "chat_history"
+
+# 세션 id는 파일 이름이 되므로 경로 문자를 허용하지 않는다
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def is_valid_session_id(session_id) -> bool:
+    return isinstance(session_id, str) and bool(_SESSION_ID_PATTERN.match(session_id))
+
+
+class ChatHistoryStore:
+    """세션별 append-only 대화 내역 (스레드 안전)"""
+
+    def __init__(self, directory: str = DEFAULT_HISTORY_DIR, fsync_every: int = 16,
+                 fsync_interval: float = 1.0, max_open_files: int = 64):
+        """
+        Args:
+            directory: 세션별 JSONL 파일을 둘 디렉토리
+            fsync_every: 이만큼 쓰면 fsync
+            fsync_interval: 마지막 fsync 후 이만큼(초) 지난 뒤의 쓰기에서 fsync
+            max_open_files: 열어 둘 세션 파일 수 (오래 안 쓴 파일부터 닫는다)
+        """
+        self.directory = directory
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        self.max_open_files = max(1, max_open_files)
+        self._files = OrderedDict()
+        self._unsynced = set()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(self.close)
+
+    def path(self, session_id: str) -> str:
+        if not is_valid_session_id(session_id):
+            raise Exception(f"잘못된 세션 id: {session_id!r}")
+        return os.path.join(self.directory, f"{session_id}.jsonl")
+
+    def _file(self, session_id: str):
+        """세션 파일 (append 모드, 버퍼 없음)"""
+        f = self._files.get(session_id)
+        if f is not None:
+            self._files.move_to_end(session_id)
+            return f
+
+        f = open(self.path(session_id), "ab", buffering=0)
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            # 비정상 종료로 마지막 줄이 잘린 경우 새 줄에서 이어 쓴다
+            with open(self.path(session_id), "rb") as reader:
+                reader.seek(size - 1)
+                if reader.read(1) != b"\n":
+                    f.write(b"\n")
+        self._files[session_id] = f
+
+        while len(self._files) > self.max_open_files:
+            old_id, old_file = self._files.popitem(last=False)
+            if old_id in self._unsynced:
+                os.fsync(old_file.fileno())
+                self._unsynced.discard(old_id)
+            old_file.close()
+        return f
+
+    def append(self, session_id: str, message: dict) -> int:
+        """
+        메시지 하나를 세션 파일 끝에 추가
+
+        Returns:
+            메시지가 시작하는 바이트 offset (read_before의 커서로 쓸 수 있다)
+        """
+        line = (json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            f = self._file(session_id)
+            offset = os.fstat(f.fileno()).st_size
+            f.write(line)
+            self._unsynced.add(session_id)
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+        return offset
+
+    def _sync(self):
+        for session_id in self._unsynced:
+            f = self._files.get(session_id)
+            if f is not None:
+                os.fsync(f.fileno())
+        self._unsynced.clear()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        """아직 동기화하지 않은 쓰기를 디스크에 반영"""
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
+
+    def read_before(self, session_id: str, before: int = None, limit: int = 20,
+                    block_size: int = 65536) -> tuple:
+        """
+        before offset 앞의 최근 메시지 limit개 (파일 끝에서부터 거꾸로 읽는다)
+
+        Args:
+            before: 이 offset 앞의 메시지만 (None이면 파일 끝부터)
+            limit: 최대 메시지 수
+
+        Returns:
+            ([(offset, message), ...] 오래된 순, 더 오래된 메시지를 읽을 커서 (없으면 None))
+        """
+        path = self.path(session_id)
+        if not os.path.exists(path) or limit <= 0:
+            return [], None
+
+        entries = []
+        with open(path, "rb") as f:
+            position = os.fstat(f.fileno()).st_size if before is None else before
+            # buffer는 파일의 [position, 아직 나누지 않은 끝) 구간
+            buffer = b""
+            while len(entries) < limit and (position > 0 or buffer):
+                if position > 0:
+                    size = min(block_size, position)
+                    position -= size
+                    f.seek(position)
+                    buffer = f.read(size) + buffer
+
+                # 끝에서부터 완전한 줄을 떼어낸다 (앞쪽이 잘린 줄은 다음 블록을 읽은 뒤에)
+                while buffer and len(entries) < limit:
+                    start = buffer.rfind(b"\n", 0, len(buffer) - 1) + 1
+                    if start == 0 and position > 0:
+                        break
+                    line = buffer[start:]
+                    buffer = buffer[:start]
+                    try:
+                        message = json.loads(line)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        # 빈 줄이나 잘린 줄은 건너뛴다
+                        continue
+                    entries.append((position + start, message))
+
+        entries.reverse()
+        cursor = entries[0][0] if entries and entries[0][0] > 0 else None
+        return entries, cursor
@@ -0,0 +1,171 @@
+"""
+청크 요약(digest) 저장소
+
+코퍼스 버전마다 한 번 오프라인으로 청크마다 짧은 digest(핵심 구성요소, 청구 사항, 수치 파라미터)를 만들어 두면,
+질문할 때 청크 원문 대신 digest로 관련 여부를 먼저 거르고 관련 있어 보이는 청크만 원문을 보낸다.
+
+digest는 청크 텍스트 내용의 해시로 저장하므로 같은 청크(반복되는 청구항 문구 등)는 한 번만 만들고,
+코퍼스가 바뀌어도 달라진 청크만 새로 만들면 된다. 중단한 뒤 다시 실행하면 없는 digest만 만든다.
+
+    python chunk_digests.py final_patent_chunking_results.json --workers 16
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+from patent_index import DEFAULT_INDEX_DIR
+
+# digest 프롬프트/형식이 바뀌면 올린다 (키가 바뀌어 새로 만든다)
+DIGEST_VERSION = 1
+
+DEFAULT_DIGEST_PATH = os.path.join(DEFAULT_INDEX_DIR, "chunk_digests.sqlite")
+
+# digest 필드별 최대 항목 수 (digest가 원문만큼 길어지지 않도록)
+DIGEST_FIELDS = {"entities": ("핵심 구성요소", 8), "claims": ("청구 사항", 4), "parameters": ("수치 파라미터", 6)}
+
+
+def digest_key(text: str) -> str:
+    """청크 텍스트의 digest 키"""
+    return hashlib.sha256(f"v{DIGEST_VERSION}\n{text}".encode("utf-8")).hexdigest()
+
+
+def digest_messages(text: str) -> list:
+    """청크 하나의 digest를 만드는 요청 메시지"""
+    prompt = f"""다음 특허 문서 조각을 나중에 질문과의 관련 여부를 판단할 수 있도록 짧게 요약하세요.
+상투적인 청구항 문구는 빼고, 문서에 나온 내용만 쓰세요.
+
+문서 내용:
+{text}
+
+다음 JSON 형식으로만 답하세요.
+{{"summary": "한 문장 요약", "entities": ["핵심 구성요소/기술 용어"], "claims": ["청구하거나 주장하는 내용"], "parameters": ["수치와 단위가 있는 파라미터"]}}"""
+    return [
+        {"role": "system", "content": "특허 문서를 간결하게 색인하는 전문가. 항상 JSON으로만 답한다."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def render_digest(content: str) -> str:
+    """
+    digest JSON 응답을 프롬프트에 넣을 짧은 텍스트로 변환
+
+    JSON이 아니거나 내용이 비어 있으면 예외를 올려 실패로 집계되게 한다 (다시 실행하면 재시도).
+    """
+    try:
+        digest = json.loads(content)
+    except json.JSONDecodeError:
+        raise Exception(f"digest JSON 파싱 실패: {content[:100]}")
+    if not isinstance(digest, dict):
+        raise Exception(f"digest 형식 오류: {content[:100]}")
+
+    lines = []
+    summary = str(digest.get("summary") or "").strip()
+    if summary:
+        lines.append(summary)
+    for field, (label, limit) in DIGEST_FIELDS.items():
+        values = digest.get(field) or []
+        if isinstance(values, str):
+            values = [values]
+        values = [str(value).strip() for value in values if str(value).strip()][:limit]
+        if values:
+            lines.append(f"{label}: {', '.join(values)}")
+
+    if not lines:
+        raise Exception("빈 digest")
+    return "\n".join(lines)
+
+
+class ChunkDigestStore:
+    """
+    청크 텍스트 해시 → digest 텍스트 SQLite 저장소
+
+    WAL 모드라 digest를 만드는 동안에도 서버 프로세스들이 읽을 수 있다.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DIGEST_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS digests (
+                key TEXT PRIMARY KEY,
+                digest TEXT NOT NULL
+            )
+        """)
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """스레드별 SQLite 연결"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, texts: list) -> dict:
+        """{청크 텍스트: digest} (digest가 없는 청크는 빠진다)"""
+        keys = {digest_key(text): text for text in texts}
+        if not keys:
+            return {}
+
+        found = {}
+        conn = self._connection()
+        key_list = list(keys)
+        # SQLite 변수 개수 제한(기본 999) 안에서 나눠 조회
+        for start in range(0, len(key_list), 500):
+            batch = key_list[start:start + 500]
+            rows = conn.execute(
+                f"SELECT key, digest FROM digests WHERE key IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            for key, digest in rows:
+                found[keys[key]] = digest
+        return found
+
+    def missing(self, texts: list) -> list:
+        """digest가 아직 없는 청크 텍스트 (중복 제거, 순서 유지)"""
+        texts = list(dict.fromkeys(texts))
+        found = self.get_many(texts)
+        return [text for text in texts if text not in found]
+
+    def set_many(self, items: list):
+        """[(청크 텍스트, digest), ...] 저장"""
+        conn = self._connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO digests (key, digest) VALUES (?, ?)",
+            [(digest_key(text), digest) for text, digest in items]
+        )
+        conn.commit()
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM digests").fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="청크 digest 사전 생성 (중단 후 다시 실행하면 이어서 생성)")
+    parser.add_argument("json_file_path", help="특허 JSON 경로 또는 컬럼형 코퍼스 디렉토리")
+    parser.add_argument("--digest-path", default=DEFAULT_DIGEST_PATH, help="digest 저장소 경로")
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR, help="검색 인덱스 스냅샷 디렉토리")
+    parser.add_argument("--workers", type=int, default=16, help="동시에 보낼 digest 요청 수")
+    parser.add_argument("--limit", type=int, default=None, help="이번 실행에서 만들 최대 digest 수")
+    parser.add_argument("--rpm", type=float, default=None, help="분당 요청 수 한도")
+    parser.add_argument("--tpm", type=float, default=None, help="분당 토큰 수 한도")
+    args = parser.parse_args()
+
+    from patent_qa import PatentQAChatbot
+
+    chatbot = PatentQAChatbot(
+        args.json_file_path, index_dir=args.index_dir, digest_path=args.digest_path,
+        llm_concurrency=args.workers, requests_per_minute=args.rpm, tokens_per_minute=args.tpm
+    )
+    chatbot.build_chunk_digests(workers=args.workers, limit=args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import time
+
+from file_lock import file_lock
+
+# requests는 실제로 내려받을 때 불러온다
+
+
+def _sha256_of(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_meta(meta_path: str) -> dict:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_meta(meta_path: str, meta: dict):
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def download_file(url: str, dest_path: str, expected_sha256: str = None, validate=None,
+                  progress=None, chunk_size: int = 1 << 20, timeout: tuple = (10, 60),
+                  max_retries: int = 5, session=None) -> str:
+    """
+    파일을 스트리밍으로 내려받아 검증한 뒤 dest_path로 원자적으로 rename
+
+    dest_path + ".part"에 조각 단위로 쓰며, 연결이 끊기거나 프로세스가 중단되면
+    다음 호출에서 Range 요청으로 이어받는다. 서버의 ETag/Last-Modified가 바뀌었으면(If-Range)
+    처음부터 다시 받는다. 검증에 실패한 파일은 지우므로 깨진 파일이 dest_path에 남지 않는다.
+
+    Args:
+        url: 내려받을 URL
+        dest_path: 저장할 경로 (이미 있으면 아무것도 하지 않음)
+        expected_sha256: 기대하는 sha256 (hex). 주어지면 다르면 실패
+        validate: 완성된 임시 파일 경로를 받아 False를 반환하면 실패로 처리하는 함수
+        progress: progress(받은 바이트, 전체 바이트 또는 None) 콜백
+        chunk_size: 한 번에 읽고 쓰는 바이트 수
+        timeout: (연결, 읽기) 타임아웃 (초)
+        max_retries: 연결 오류 시 이어받기 재시도 횟수
+        session: requests.Session (테스트용, None이면 새로 만듦)
+
+    Returns:
+        dest_path
+    """
+    import requests
+
+    if os.path.exists(dest_path):
+        return dest_path
+
+    part_path = dest_path + ".part"
+    meta_path = part_path + ".json"
+    session = session or requests.Session()
+
+    with file_lock(dest_path + ".lock"):
+        # 잠금을 기다리는 동안 다른 프로세스가 이미 받았을 수 있다
+        if os.path.exists(dest_path):
+            return dest_path
+
+        attempt = 0
+        while True:
+            try:
+                _download_to_part(session, url, part_path, meta_path, progress, chunk_size, timeout)
+                break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                attempt += 1
+                if attempt > max_retries:
+                    raise Exception(f"다운로드 실패 ({max_retries}회 재시도): {e}")
+                time.sleep(min(2 ** attempt, 30))
+
+        if expected_sha256 and _sha256_of(part_path) != expected_sha256.lower():
+            os.remove(part_path)
+            _remove_if_exists(meta_path)
+            raise Exception(f"체크섬 불일치: {url}")
+        if validate is not None and not validate(part_path):
+            os.remove(part_path)
+            _remove_if_exists(meta_path)
+            raise Exception(f"내려받은 파일이 올바르지 않습니다: {url}")
+
+        os.replace(part_path, dest_path)
+        _remove_if_exists(meta_path)
+
+    return dest_path
+
+
+def _remove_if_exists(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _download_to_part(session, url: str, part_path: str, meta_path: str, progress,
+                      chunk_size: int, timeout: tuple):
+    """part 파일을 끝까지 채우기 (가능하면 이어받기)"""
+    import requests
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    meta = _read_meta(meta_path)
+
+    headers = {}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        validator = meta.get("etag") or meta.get("last_modified")
+        if validator:
+            headers["If-Range"] = validator
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 416 and offset:
+            # 이미 끝까지 받은 상태면 그대로 검증 단계로
+            if meta.get("total") in (None, offset):
+                return
+            # part 파일이 서버의 파일보다 크다 → 버리고 처음부터
+            os.remove(part_path)
+            _remove_if_exists(meta_path)
+            raise requests.ConnectionError(f"이어받기 위치({offset})가 맞지 않아 처음부터 다시 받습니다")
+
+        response.raise_for_status()
+        if response.headers.get("Content-Type", "").startswith("text/html"):
+            raise Exception(f"파일 대신 HTML 페이지를 받았습니다 (공유 설정/URL 확인 필요): {url}")
+
+        if response.status_code == 206:
+            start = int(response.headers.get("Content-Range", "bytes 0-").split()[1].split("-")[0])
+            if start != offset:
+                raise Exception(f"요청한 위치({offset})와 다른 Range 응답({start})")
+            total = _total_from_content_range(response.headers.get("Content-Range"))
+            mode = "ab"
+        else:
+            # 200이면 서버가 이어받기를 지원하지 않거나 파일이 바뀐 것이므로 처음부터
+            offset = 0
+            length = response.headers.get("Content-Length")
+            total = int(length) if length is not None else None
+            mode = "wb"
+
+        _write_meta(meta_path, {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "total": total
+        })
+
+        received = offset
+        if progress:
+            progress(received, total)
+        with open(part_path, mode) as f:
+            for block in response.iter_content(chunk_size=chunk_size):
+                if not block:
+                    continue
+                f.write(block)
+                received += len(block)
+                if progress:
+                    progress(received, total)
+            f.flush()
+            os.fsync(f.fileno())
+
+    if total is not None and received != total:
+        raise requests.ConnectionError(f"연결이 끊겼습니다 ({received}/{total} 바이트)")
+
+
+def _total_from_content_range(content_range: str):
+    """'bytes 100-199/1000'에서 전체 크기 (알 수 없으면 None)"""
+    if not content_range or "/" not in content_range:
+        return None
+    total = content_range.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
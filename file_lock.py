@@ -0,0 +1,33 @@
+"""
+여러 프로세스가 같은 파일을 만들거나 교체할 때 쓰는 잠금
+
+patent_index(스냅샷 빌드), patent_qa(압축 해제), downloader(다운로드 완료 후 교체)가 함께 쓴다.
+"""
+from contextlib import contextmanager
+
+
+@contextmanager
+def file_lock(lock_path: str):
+    """프로세스 간 배타 잠금 (lock 파일 기반)"""
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+
+    with open(lock_path, "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            # Windows
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+DEFAULT_CACHE_PATH = ".llm_cache.sqlite"
+
+
+class LLMResponseCache:
+    """
+    LLM 응답 캐시 (메모리 LRU + SQLite 디스크 2단계)
+
+    키는 (model, messages, temperature, max_tokens)의 해시이며,
+    디스크 계층은 WAL 모드의 SQLite 파일이라 여러 프로세스(Streamlit 워커)가 함께 쓸 수 있다.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH, max_memory_entries: int = 1024,
+                 max_disk_entries: int = 100000, ttl_seconds: float = 7 * 24 * 3600):
+        """
+        Args:
+            db_path: 디스크 캐시 SQLite 파일 경로 (None이면 메모리 계층만 사용)
+            max_memory_entries: 메모리 LRU 최대 항목 수
+            max_disk_entries: 디스크 캐시 최대 항목 수 (초과 시 오래 안 쓴 항목부터 삭제)
+            ttl_seconds: 항목 유효 시간 (None이면 만료 없음)
+        """
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+
+        if db_path:
+            parent = os.path.dirname(os.path.abspath(db_path))
+            os.makedirs(parent, exist_ok=True)
+            conn = self._connection()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            conn.commit()
+
+    @staticmethod
+    def make_key(model: str, messages: list, temperature: float, max_tokens: int, **options) -> str:
+        """
+        요청 내용으로 캐시 키 생성
+
+        options에는 응답 내용을 바꾸는 나머지 요청 옵션(response_format 등)을 넘긴다.
+        옵션이 없으면 키에 넣지 않아 옵션 없는 요청의 기존 캐시 키는 그대로다.
+        """
+        request = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        options = {name: value for name, value in options.items() if value is not None}
+        if options:
+            request["options"] = options
+        payload = json.dumps(request, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        """스레드별 SQLite 연결"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key: str):
+        """캐시된 응답 반환 (없거나 만료되었으면 None)"""
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    return response
+                del self._memory[key]
+
+        if not self.db_path:
+            return None
+
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            response, created_at = row
+            if self._expired(created_at, now):
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+                return None
+
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+        except sqlite3.Error:
+            # 디스크 캐시 문제로 답변 생성이 실패하지 않도록 미스로 처리
+            return None
+
+        self._remember(key, response, created_at)
+        return response
+
+    def set(self, key: str, response: str):
+        """응답 저장 (메모리 + 디스크)"""
+        now = time.time()
+        self._remember(key, response, now)
+
+        if not self.db_path:
+            return
+
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            conn.commit()
+
+            with self._lock:
+                self._writes += 1
+                should_evict = self._writes % 100 == 0
+            if should_evict:
+                self._evict_disk(conn, now)
+        except sqlite3.Error:
+            pass
+
+    def _remember(self, key: str, response: str, created_at: float):
+        """메모리 LRU에 추가하고 용량을 넘으면 가장 오래 안 쓴 항목 제거"""
+        with self._lock:
+            self._memory[key] = (response, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _evict_disk(self, conn: sqlite3.Connection, now: float):
+        """만료 항목과 용량 초과분(오래 안 쓴 순) 삭제"""
+        if self.ttl_seconds is not None:
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        conn.execute("""
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_disk_entries,))
+        conn.commit()
+
+    def clear(self):
+        """캐시 전체 삭제"""
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            conn = self._connection()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
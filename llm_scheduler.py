@@ -0,0 +1,277 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from metrics import percentile
+
+# 우선순위 등급 (숫자가 작을수록 먼저). 대화형 질문이 배치 작업보다 항상 먼저 나간다.
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class TokenBucket:
+    """
+    분당 한도를 초 단위로 채우는 토큰 버킷
+
+    한 번에 한도 전체까지 몰아 쓸 수 있고(burst), 쓴 만큼 per_minute / 60 속도로 다시 찬다.
+    실제 사용량이 예상과 다르면 adjust()로 보정하며, 잔량이 음수(빚)가 될 수 있다.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """amount를 꺼내려면 기다려야 하는 시간 (초)"""
+        self._refill(now)
+        # 한도보다 큰 요청은 버킷이 가득 찼을 때 통과시킨다
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float):
+        """예상보다 delta만큼 더 썼다(음수면 덜 썼다)고 보정"""
+        self.level = min(self.capacity, self.level - delta)
+
+
+class LLMScheduler:
+    """
+    모든 LLM 요청이 거쳐 가는 중앙 스케줄러
+
+    - 동시 요청 수 상한 (max_concurrency)
+    - 분당 요청 수(RPM) / 분당 토큰 수(TPM) 토큰 버킷
+    - 우선순위: 기다리는 요청 중 interactive가 있으면 batch보다 먼저 내보낸다 (같은 등급은 도착 순서)
+    - 같은 프롬프트가 이미 처리 중이면 새로 요청하지 않고 그 결과를 함께 받는다 (coalesce).
+      더 높은 등급의 요청이 함께 기다리면 처리 중인 요청의 차례도 그 등급으로 올린다
+    - rate limit 응답을 받으면 pause()로 모든 요청을 잠시 멈춘다
+
+    API 키 하나의 한도를 나눠 쓰므로, 같은 키를 쓰는 챗봇 인스턴스끼리는 스케줄러 하나를 공유한다.
+    """
+
+    def __init__(self, max_concurrency: int = 16, requests_per_minute: float = None,
+                 tokens_per_minute: float = None, wait_samples: int = 1000):
+        """
+        Args:
+            max_concurrency: 동시에 진행할 요청 수
+            requests_per_minute: 분당 요청 수 한도 (None이면 제한 없음)
+            tokens_per_minute: 분당 토큰 수 한도, 프롬프트 + max_tokens로 예약한다 (None이면 제한 없음)
+            wait_samples: 대기 시간 백분위수 계산에 남길 최근 표본 수
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._running = 0
+        self._paused_until = 0.0
+        self._inflight = {}
+        self._counts = {"requests": {name: 0 for name in PRIORITIES}, "coalesced": 0, "rate_limited": 0}
+        self._waits = {name: deque(maxlen=wait_samples) for name in PRIORITIES}
+
+    def _admission_wait(self, tokens: int, now: float) -> float:
+        """지금 내보내려면 더 기다려야 하는 시간 (0이면 바로 가능)"""
+        wait = self._paused_until - now
+        if self._requests is not None:
+            wait = max(wait, self._requests.wait_time(1, now))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.wait_time(tokens, now))
+        return wait
+
+    @contextmanager
+    def slot(self, priority: str = "interactive", tokens: int = 0, cancelled=None, key=None):
+        """
+        요청 하나를 보낼 차례를 기다렸다가 with 블록 동안 자리를 차지
+
+        Args:
+            priority: "interactive" 또는 "batch"
+            tokens: 예약할 토큰 수 (프롬프트 토큰 + max_tokens 추정치)
+            cancelled: 기다리는 동안 깰 때마다, 그리고 자리를 받기 직전에 확인할 함수.
+                True를 돌려주면 RPM/TPM을 쓰지 않고 대기열에서 빠지며 예외를 올린다
+            key: coalesce(key, ...)로 처리 중인 요청이면 그 key. 더 높은 등급의 요청이
+                함께 기다리게 되면 기다리는 동안에도 차례를 그 등급으로 올린다
+
+        Yields:
+            차례를 기다린 시간 (초)
+        """
+        if priority not in PRIORITIES:
+            raise Exception(f"지원하지 않는 priority: {priority} (가능한 값: {', '.join(PRIORITIES)})")
+
+        enqueued = time.monotonic()
+
+        with self._cond:
+            leader = self._inflight.get(key) if key is not None else None
+            rank = PRIORITIES[priority] if leader is None else min(PRIORITIES[priority], leader.rank)
+            ticket = (rank, next(self._sequence))
+            if leader is not None:
+                leader.ticket = ticket
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    if cancelled is not None and cancelled():
+                        raise Exception("요청이 취소되어 보내지 않습니다")
+                    if leader is not None:
+                        # 기다리는 동안 _promote로 등급이 올라갔을 수 있다
+                        ticket = leader.ticket
+                    if self._waiting[0] == ticket and self._running < self.max_concurrency:
+                        wait = self._admission_wait(tokens, time.monotonic())
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                if leader is not None:
+                    ticket = leader.ticket
+                    leader.ticket = None
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+
+            heapq.heappop(self._waiting)
+            if leader is not None:
+                leader.ticket = None
+            if self._requests is not None:
+                self._requests.take(1)
+            if self._tokens is not None:
+                self._tokens.take(tokens)
+            self._running += 1
+            waited = time.monotonic() - enqueued
+            self._counts["requests"][priority] += 1
+            self._waits[priority].append(waited)
+            # 다음 순서의 요청이 바로 나갈 수 있는지 다시 확인하게 한다
+            self._cond.notify_all()
+
+        try:
+            yield waited
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._cond.notify_all()
+
+    def record_usage(self, reserved: int, used: int):
+        """
+        예약한 토큰 수와 실제 사용량(usage.total_tokens)의 차이를 TPM 버킷에 반영
+
+        used가 없으면(None/0) 0으로 보고 예약한 토큰을 모두 돌려준다. 사용량을 모르면 호출 측에서 추정해 넘긴다.
+        """
+        if self._tokens is None:
+            return
+        used = used or 0
+        if used == reserved:
+            return
+        with self._cond:
+            self._tokens.adjust(used - reserved)
+            self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """rate limit 응답을 받았을 때 모든 요청을 seconds 동안 멈춤"""
+        with self._cond:
+            self._counts["rate_limited"] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def coalesce(self, key, fn, priority: str = "interactive") -> tuple:
+        """
+        같은 key의 요청이 처리 중이면 그 결과를 기다려 받고, 아니면 fn()을 실행
+
+        fn 안에서 slot(..., key=key)으로 차례를 기다리는 요청은, 더 높은 priority의 요청이
+        함께 기다리게 되면 그 등급으로 올라간다 (대화형 질문이 배치 요청 뒤에 묶여 기다리지 않도록).
+
+        Returns:
+            (결과, 다른 요청의 결과를 받았는지 여부)
+        """
+        if priority not in PRIORITIES:
+            raise Exception(f"지원하지 않는 priority: {priority} (가능한 값: {', '.join(PRIORITIES)})")
+
+        with self._cond:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                future.followers = 0
+                future.rank = PRIORITIES[priority]
+                future.ticket = None
+                self._inflight[key] = future
+            else:
+                future.followers += 1
+                self._counts["coalesced"] += 1
+                self._promote(future, PRIORITIES[priority])
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._cond:
+                del self._inflight[key]
+
+    def _promote(self, future, rank: int):
+        """처리 중인 요청의 등급을 rank로 올리고, 대기열에 있으면 그 자리도 옮긴다 (_cond 안에서 호출)"""
+        if rank >= future.rank:
+            return
+        future.rank = rank
+        if future.ticket is not None:
+            self._waiting.remove(future.ticket)
+            future.ticket = (rank, future.ticket[1])
+            self._waiting.append(future.ticket)
+            heapq.heapify(self._waiting)
+            self._cond.notify_all()
+
+    def has_followers(self, key) -> bool:
+        """처리 중인 key의 결과를 함께 기다리는 요청이 있는지"""
+        with self._cond:
+            future = self._inflight.get(key)
+            return future is not None and future.followers > 0
+
+    def metrics(self) -> dict:
+        """대기열 길이, 등급별 요청 수와 대기 시간 백분위수, 버킷 잔량"""
+        with self._cond:
+            now = time.monotonic()
+            queued = {name: 0 for name in PRIORITIES}
+            names = {rank: name for name, rank in PRIORITIES.items()}
+            for rank, _ in self._waiting:
+                queued[names[rank]] += 1
+
+            buckets = {}
+            for name, bucket in (("requests", self._requests), ("tokens", self._tokens)):
+                if bucket is not None:
+                    bucket.wait_time(0, now)
+                    buckets[name] = {"available": bucket.level, "per_minute": bucket.capacity}
+
+            return {
+                "queued": queued,
+                "running": self._running,
+                "inflight": len(self._inflight),
+                "paused_seconds": max(0.0, self._paused_until - now),
+                "requests": dict(self._counts["requests"]),
+                "coalesced": self._counts["coalesced"],
+                "rate_limited": self._counts["rate_limited"],
+                "wait_seconds": {
+                    name: {
+                        "p50": percentile(list(samples), 50),
+                        "p95": percentile(list(samples), 95),
+                        "max": max(samples, default=0.0)
+                    }
+                    for name, samples in self._waits.items()
+                },
+                "buckets": buckets
+            }
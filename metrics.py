@@ -0,0 +1,119 @@
+import json
+import math
+import os
+import threading
+
+
+def percentile(values: list, q: float) -> float:
+    """nearest-rank 방식 백분위수 (values가 비어 있으면 0.0)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def stage_latency_summary(results: list) -> dict:
+    """
+    ask() 결과들의 단계별 소요 시간 백분위수
+
+    Returns:
+        {stage: {"count": n, "p50": 초, "p95": 초, "p99": 초}, ...}
+        chunk_call / synthesis_call은 LLM 호출 1건 단위 시간이다.
+    """
+    samples = {}
+    for result in results:
+        metrics = result.get("metrics")
+        if not metrics:
+            continue
+        for stage, seconds in metrics.get("stages", {}).items():
+            samples.setdefault(stage, []).append(seconds)
+        for call in metrics.get("calls", []):
+            samples.setdefault(f"{call['stage']}_call", []).append(call["seconds"])
+        samples.setdefault("total", []).append(metrics.get("total_seconds", 0.0))
+
+    return {
+        stage: {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99)
+        }
+        for stage, values in samples.items()
+    }
+
+
+class JsonlMetricsSink:
+    """질문 하나의 계측 결과를 JSONL 파일에 한 줄씩 추가"""
+
+    def __init__(self, path: str = "metrics.jsonl"):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, result: dict):
+        record = {
+            "timestamp": result.get("timestamp"),
+            "question": result.get("question"),
+            "prompt_tokens": result.get("prompt_tokens", 0),
+            "completion_tokens": result.get("completion_tokens", 0),
+            "cache_hits": result.get("cache_hits", 0),
+            "cache_misses": result.get("cache_misses", 0),
+            "metrics": result.get("metrics", {})
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+class PrometheusMetricsSink:
+    """
+    Prometheus 텍스트 형식 카운터
+
+    render()로 노출 형식 문자열을 얻거나, write()로 node_exporter textfile collector용 파일을 쓴다.
+    """
+
+    def __init__(self, prefix: str = "patent_qa"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def _inc(self, name: str, labels: dict, value: float):
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def emit(self, result: dict):
+        metrics = result.get("metrics", {})
+        with self._lock:
+            self._inc("questions_total", {}, 1)
+            self._inc("tokens_total", {"kind": "prompt"}, result.get("prompt_tokens", 0))
+            self._inc("tokens_total", {"kind": "completion"}, result.get("completion_tokens", 0))
+            self._inc("cache_requests_total", {"result": "hit"}, result.get("cache_hits", 0))
+            self._inc("cache_requests_total", {"result": "miss"}, result.get("cache_misses", 0))
+
+            for stage, seconds in metrics.get("stages", {}).items():
+                self._inc("stage_seconds_sum", {"stage": stage}, seconds)
+                self._inc("stage_seconds_count", {"stage": stage}, 1)
+            for call in metrics.get("calls", []):
+                self._inc("llm_calls_total", {"stage": call["stage"], "cached": str(call["cached"]).lower()}, 1)
+                self._inc("llm_call_seconds_sum", {"stage": call["stage"]}, call["seconds"])
+                if call.get("coalesced"):
+                    self._inc("llm_coalesced_total", {"stage": call["stage"]}, 1)
+                if call.get("queue_wait_seconds") is not None:
+                    self._inc("llm_queue_wait_seconds_sum", {"stage": call["stage"]}, call["queue_wait_seconds"])
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                suffix = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{self.prefix}_{name}{suffix} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """임시 파일에 쓴 뒤 rename (수집기가 반쯤 쓰인 파일을 읽지 않도록)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
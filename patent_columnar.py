@@ -0,0 +1,319 @@
+"""
+특허 코퍼스의 컬럼형(columnar) 저장 형식
+
+원본 JSON(특허마다 중첩 dict)을 한 번 변환해 두면, 시작할 때 JSON 파싱 없이
+파일을 메모리 맵으로 열기만 한다. 문자열은 컬럼별로 UTF-8 바이트를 이어 붙인 .bin 파일에,
+각 항목의 위치는 NumPy 오프셋 배열(.npy, 길이 N+1)에 둔다.
+
+    <corpus_dir>/
+        meta.json                 형식/버전, 특허 수, 원본 JSON 해시
+        ids.bin, ids.offsets.npy                 출원번호
+        summaries.bin, summaries.offsets.npy     patent_summary
+        chunks.bin, chunks.offsets.npy           모든 특허의 content_chunks[].text (평탄화)
+        patent_chunks.npy                        특허 i의 청크는 chunks[patent_chunks[i]:patent_chunks[i+1]]
+        extras.bin, extras.offsets.npy           나머지 필드(JSON, 청크의 text 이외 필드 포함)
+        rows.npy                                 원본 순서 → 저장 행 (중복 출원번호 처리용)
+        id_order.npy                             출원번호 정렬 순서 (이진 탐색용)
+
+변환:
+    python patent_columnar.py final_patent_chunking_results.json final_patent_chunking_results.columnar
+"""
+import argparse
+import json
+import mmap
+import os
+import shutil
+import tempfile
+from collections.abc import Mapping, Sequence
+
+from patent_store import iter_json_object_items
+
+# numpy는 실제로 변환/로드할 때 불러온다
+
+COLUMNAR_FORMAT = "patent-columnar"
+COLUMNAR_VERSION = 1
+_TEXT_COLUMNS = ("ids", "summaries", "chunks", "extras")
+
+
+def is_columnar_corpus(path: str) -> bool:
+    """path가 컬럼형 코퍼스 디렉토리인지 확인"""
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.isfile(meta_path):
+        return False
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("format") == COLUMNAR_FORMAT
+    except (OSError, json.JSONDecodeError):
+        return False
+
+
+class StringArray(Sequence):
+    """
+    메모리 맵으로 연 읽기 전용 문자열 배열 (i번째 문자열만 디코딩)
+
+    UTF-8 바이트를 이어 붙인 <name>.bin과 오프셋 배열 <name>.offsets.npy로 이루어진다.
+    order(값 기준 정렬 순서)가 있으면 find()로 값의 위치를 이진 탐색한다.
+    여러 프로세스가 같은 파일을 열면 OS 페이지 캐시를 공유하므로 메모리는 한 벌만 든다.
+    """
+
+    def __init__(self, directory: str, name: str, order=None):
+        import numpy as np
+
+        # np.memmap 서브클래스는 원소 접근이 느려 같은 메모리를 보는 ndarray로 바꿔 둔다
+        self.offsets = np.asarray(np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r"))
+        if order is None and os.path.exists(os.path.join(directory, f"{name}.order.npy")):
+            order = np.load(os.path.join(directory, f"{name}.order.npy"), mmap_mode="r")
+        self.order = np.asarray(order) if order is not None else None
+
+        path = os.path.join(directory, f"{name}.bin")
+        if os.path.getsize(path) == 0:
+            # 빈 파일은 mmap할 수 없다
+            self._buffer = b""
+        else:
+            with open(path, "rb") as f:
+                self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        return self._buffer[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+    def slice(self, start: int, stop: int) -> list:
+        """start번째부터 stop번째 전까지의 문자열 목록"""
+        bounds = self.offsets[start:stop + 1].tolist()
+        buffer = self._buffer
+        return [buffer[a:b].decode("utf-8") for a, b in zip(bounds, bounds[1:])]
+
+    def __iter__(self):
+        return iter(self.slice(0, len(self)))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def find(self, value: str):
+        """order에서 value의 위치를 이진 탐색 (없으면 None)"""
+        if not isinstance(value, str):
+            return None
+        order = self.order
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[int(order[mid])] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order):
+            position = int(order[lo])
+            if self[position] == value:
+                return position
+        return None
+
+
+def save_string_array(directory: str, name: str, strings) -> None:
+    """문자열들을 StringArray 형식으로 저장 (find()용 정렬 순서 포함)"""
+    import numpy as np
+
+    writer = _ColumnWriter(directory, name)
+    values = []
+    try:
+        for value in strings:
+            writer.append(value)
+            values.append(value)
+    finally:
+        writer.close()
+    np.save(os.path.join(directory, f"{name}.order.npy"),
+            np.asarray(sorted(range(len(values)), key=values.__getitem__), dtype=np.int64))
+
+
+class ColumnarPatents(Mapping):
+    """
+    컬럼형 코퍼스를 dict처럼 읽는 읽기 전용 매핑 (LazyPatents와 같은 인터페이스)
+
+    patent_id 조회는 정렬 순서 배열에서 이진 탐색하므로 출원번호 dict도 만들지 않는다.
+    특허 dict는 접근할 때마다 필요한 부분만 디코딩해 만든다.
+    """
+
+    def __init__(self, corpus_dir: str):
+        import numpy as np
+
+        with open(os.path.join(corpus_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != COLUMNAR_FORMAT or meta.get("version") != COLUMNAR_VERSION:
+            raise Exception(f"지원하지 않는 코퍼스 형식입니다: {corpus_dir}")
+
+        self.corpus_dir = corpus_dir
+        self.source_hash = meta["source_hash"]
+        self._patent_chunks, self._rows, id_order = (
+            np.asarray(np.load(os.path.join(corpus_dir, f"{name}.npy"), mmap_mode="r"))
+            for name in ("patent_chunks", "rows", "id_order")
+        )
+        self._columns = {name: StringArray(corpus_dir, name) for name in _TEXT_COLUMNS}
+        # 중복 출원번호는 마지막 행만 id_order에 들어 있다
+        self._columns["ids"].order = id_order
+
+    def _row_of(self, patent_id: str):
+        """출원번호의 저장 행 (없으면 None)"""
+        return self._columns["ids"].find(patent_id)
+
+    def chunk_texts(self, row: int) -> list:
+        """저장 행의 청크 텍스트 목록"""
+        return self._columns["chunks"].slice(int(self._patent_chunks[row]), int(self._patent_chunks[row + 1]))
+
+    def _patent(self, row: int) -> dict:
+        extras = self._columns["extras"][row]
+        patent = json.loads(extras) if extras else {}
+        chunk_meta = patent.pop("content_chunks", None)
+        texts = self.chunk_texts(row)
+        if chunk_meta is None:
+            chunk_meta = [{} for _ in texts]
+
+        result = {"patent_summary": self._columns["summaries"][row]}
+        result["content_chunks"] = [dict(meta, text=text) for meta, text in zip(chunk_meta, texts)]
+        result.update(patent)
+        return result
+
+    def __getitem__(self, patent_id: str) -> dict:
+        row = self._row_of(patent_id)
+        if row is None:
+            raise KeyError(patent_id)
+        return self._patent(row)
+
+    def __contains__(self, patent_id) -> bool:
+        return self._row_of(patent_id) is not None
+
+    def __iter__(self):
+        ids = self._columns["ids"]
+        for row in self._rows.tolist():
+            yield ids[row]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def items(self):
+        """원본 JSON 순서대로 (patent_id, 특허 데이터)를 스트리밍"""
+        ids = self._columns["ids"]
+        for row in self._rows.tolist():
+            yield ids[row], self._patent(row)
+
+
+class _ColumnWriter:
+    """문자열을 .bin에 이어 쓰고 오프셋을 모은다"""
+
+    def __init__(self, corpus_dir: str, name: str):
+        self.corpus_dir = corpus_dir
+        self.name = name
+        self.offsets = [0]
+        self._file = open(os.path.join(corpus_dir, f"{name}.bin"), "wb")
+
+    def append(self, text: str):
+        data = text.encode("utf-8")
+        self._file.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def close(self):
+        import numpy as np
+
+        self._file.close()
+        np.save(os.path.join(self.corpus_dir, f"{self.name}.offsets.npy"), np.asarray(self.offsets, dtype=np.int64))
+
+
+def convert_json_to_columnar(json_file_path: str, corpus_dir: str, source_hash: str = None) -> str:
+    """
+    특허 JSON을 스트리밍으로 읽어 컬럼형 코퍼스 디렉토리로 변환
+
+    임시 디렉토리에 모두 쓴 뒤 rename하므로 중간에 실패해도 corpus_dir이 반쯤 만들어진 채로 남지 않는다.
+
+    Args:
+        json_file_path: 원본 특허 JSON 경로
+        corpus_dir: 만들 디렉토리 (이미 있으면 교체)
+        source_hash: 원본 JSON 내용 해시 (None이면 계산). 검색 인덱스 스냅샷을 원본 JSON과 공유하는 데 쓴다
+
+    Returns:
+        corpus_dir
+    """
+    import numpy as np
+    from patent_index import file_content_hash
+
+    if source_hash is None:
+        source_hash = file_content_hash(json_file_path)
+
+    parent = os.path.dirname(os.path.abspath(corpus_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, suffix=".tmp")
+
+    try:
+        writers = {name: _ColumnWriter(tmp_dir, name) for name in _TEXT_COLUMNS}
+        patent_chunks = [0]
+        row_of = {}
+        ids = []
+
+        try:
+            for row, (patent_id, patent) in enumerate(iter_json_object_items(json_file_path)):
+                texts = []
+                chunk_meta = []
+                for chunk in patent.get("content_chunks", []):
+                    chunk = dict(chunk)
+                    texts.append(str(chunk.pop("text", "") or ""))
+                    chunk_meta.append(chunk)
+
+                extras = {key: value for key, value in patent.items() if key not in ("patent_summary", "content_chunks")}
+                if any(chunk_meta):
+                    extras["content_chunks"] = chunk_meta
+
+                writers["ids"].append(patent_id)
+                writers["summaries"].append(str(patent.get("patent_summary", "") or ""))
+                writers["extras"].append(json.dumps(extras, ensure_ascii=False) if extras else "")
+                for text in texts:
+                    writers["chunks"].append(text)
+                patent_chunks.append(patent_chunks[-1] + len(texts))
+
+                # 같은 출원번호가 여러 번 나오면 json.load처럼 마지막 값을 사용 (순서는 처음 위치 유지)
+                if patent_id in row_of:
+                    ids[row_of[patent_id]] = (patent_id, row)
+                else:
+                    row_of[patent_id] = len(ids)
+                    ids.append((patent_id, row))
+        except json.JSONDecodeError:
+            raise Exception(f"JSON 파일 형식 오류: {json_file_path}")
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        rows = np.asarray([row for _, row in ids], dtype=np.int64)
+        id_order = rows[np.asarray(sorted(range(len(ids)), key=lambda k: ids[k][0]), dtype=np.int64)] if ids else rows
+        np.save(os.path.join(tmp_dir, "rows.npy"), rows)
+        np.save(os.path.join(tmp_dir, "id_order.npy"), id_order)
+        np.save(os.path.join(tmp_dir, "patent_chunks.npy"), np.asarray(patent_chunks, dtype=np.int64))
+
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "format": COLUMNAR_FORMAT,
+                "version": COLUMNAR_VERSION,
+                "count": len(ids),
+                "chunk_count": patent_chunks[-1],
+                "source_hash": source_hash
+            }, f, ensure_ascii=False, indent=2)
+
+        if os.path.exists(corpus_dir):
+            shutil.rmtree(corpus_dir)
+        os.replace(tmp_dir, corpus_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    return corpus_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="특허 JSON → 컬럼형 코퍼스 변환")
+    parser.add_argument("json_file_path", help="원본 특허 JSON 경로")
+    parser.add_argument("corpus_dir", nargs="?", default=None, help="출력 디렉토리 (기본: <json 경로>.columnar)")
+    args = parser.parse_args()
+
+    corpus_dir = args.corpus_dir or os.path.splitext(args.json_file_path)[0] + ".columnar"
+    convert_json_to_columnar(args.json_file_path, corpus_dir)
+    print(f"✅ 변환 완료: {corpus_dir}")
+
+
+if __name__ == "__main__":
+    main()
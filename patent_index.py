@@ -0,0 +1,719 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from file_lock import file_lock
+from patent_columnar import StringArray, save_string_array
+from patent_search import InvertedIndex, ShardedInvertedIndex, select_top_k
+from patent_vectorizer import HashingTfidfVectorizer
+
+# numpy / scipy / sklearn은 import 시간이 길어 실제로 인덱스를 다룰 때 불러온다
+# (타입 표기용 이름만 타입 검사 때 불러온다)
+if TYPE_CHECKING:
+    import numpy as np
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+# 요약문 TF-IDF 설정 (값이 바뀌면 스냅샷 키도 바뀌어 자동으로 재생성된다)
+VECTORIZER_PARAMS = {
+    "max_features": 10000,
+    "ngram_range": (1, 2),
+    "min_df": 1,
+}
+
+# 청크 본문 TF-IDF 설정 (특허 선택 후 청크 순위를 매기는 2차 검색용)
+CHUNK_VECTORIZER_PARAMS = {
+    "max_features": 10000,
+    "ngram_range": (1, 2),
+    "min_df": 1,
+}
+
+# 해싱 backend 설정: 어휘 사전 없이 문자 n-gram을 고정 크기 열로 해싱 (상태는 idf 배열뿐)
+# 조사가 붙은 어절도 어간의 n-gram을 공유하므로 질문과 문서의 조사가 달라도 맞는다
+HASHING_VECTORIZER_PARAMS = {
+    "analyzer": "char_wb",
+    "ngram_range": (2, 3),
+    "n_features": 2 ** 20,
+}
+
+HASHING_CHUNK_VECTORIZER_PARAMS = {
+    "analyzer": "char_wb",
+    "ngram_range": (2, 3),
+    "n_features": 2 ** 20,
+}
+
+# vectorizer backend별 (요약문 설정, 청크 설정)
+VECTORIZER_BACKENDS = {
+    "tfidf": (VECTORIZER_PARAMS, CHUNK_VECTORIZER_PARAMS),
+    "hashing": (HASHING_VECTORIZER_PARAMS, HASHING_CHUNK_VECTORIZER_PARAMS),
+}
+
+DEFAULT_VECTORIZER_BACKEND = "tfidf"
+
+# 스냅샷 포맷 버전 (저장 구조가 바뀌면 올린다)
+INDEX_FORMAT_VERSION = 4
+
+DEFAULT_INDEX_DIR = ".patent_index"
+
+
+def file_content_hash(file_path: str, cache_dir: str = DEFAULT_INDEX_DIR) -> str:
+    """
+    파일 내용의 sha256 해시 계산
+
+    크기/수정시각이 같으면 이전에 계산한 해시를 재사용하므로
+    대용량 JSON도 매번 다시 읽지 않는다.
+    """
+    stat = os.stat(file_path)
+    abs_path = os.path.abspath(file_path)
+    hashes_path = os.path.join(cache_dir, "source_hashes.json")
+
+    try:
+        with open(hashes_path, "r", encoding="utf-8") as f:
+            known = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        known = {}
+
+    entry = known.get(abs_path)
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["sha256"]
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    content_hash = digest.hexdigest()
+
+    known[abs_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": content_hash}
+    os.makedirs(cache_dir, exist_ok=True)
+    _atomic_write_json(hashes_path, known)
+
+    return content_hash
+
+
+def _atomic_write_json(path: str, obj):
+    """임시 파일에 쓴 뒤 rename하여 JSON을 원자적으로 저장"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _check_backend(backend: str):
+    if backend not in VECTORIZER_BACKENDS:
+        raise Exception(f"지원하지 않는 vectorizer backend: {backend} (가능한 값: {', '.join(VECTORIZER_BACKENDS)})")
+
+
+def _params_key(backend: str = DEFAULT_VECTORIZER_BACKEND) -> str:
+    """벡터화 설정을 스냅샷 키에 반영하기 위한 짧은 해시"""
+    params, chunk_params = VECTORIZER_BACKENDS[backend]
+    payload = {
+        "params": params,
+        "chunk_params": chunk_params,
+        "version": INDEX_FORMAT_VERSION
+    }
+    # 기본 backend는 backend 항목 없이 해시하여 기존 스냅샷을 그대로 쓴다
+    if backend != DEFAULT_VECTORIZER_BACKEND:
+        payload["backend"] = backend
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+
+
+def _make_vectorizer(backend: str, params: dict):
+    """backend에 맞는 학습 전 vectorizer"""
+    if backend == "hashing":
+        return HashingTfidfVectorizer(**params)
+
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer(**params)
+
+
+def _fit_transform(vectorizer, texts, n_jobs: int = None):
+    """vectorizer 학습 + 변환 (해싱 backend는 n_jobs > 1일 때만 여러 프로세스에서 블록 단위로 해싱)"""
+    if isinstance(vectorizer, HashingTfidfVectorizer):
+        return vectorizer.fit_transform(texts, n_jobs=n_jobs or 1)
+    return vectorizer.fit_transform(texts)
+
+
+def chunk_texts_of(patent_data: dict) -> list:
+    """특허의 content_chunks에서 비어 있지 않은 텍스트만 순서대로 추출"""
+    texts = []
+    for chunk in patent_data.get('content_chunks', []):
+        text = chunk.get('text', '')
+        if text and text.strip():
+            texts.append(text)
+    return texts
+
+
+def _save_vectorizer(index_dir: str, prefix: str, vectorizer: "TfidfVectorizer"):
+    """vectorizer의 단어 목록(열 번호 순)과 idf 저장 (해싱 vectorizer는 idf만)"""
+    import numpy as np
+
+    if isinstance(vectorizer, HashingTfidfVectorizer):
+        np.save(os.path.join(index_dir, f"{prefix}idf.npy"), vectorizer.idf_)
+        return
+
+    terms = [None] * len(vectorizer.vocabulary_)
+    for term, col in vectorizer.vocabulary_.items():
+        terms[col] = term
+
+    with open(os.path.join(index_dir, f"{prefix}vocabulary.json"), "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False)
+    np.save(os.path.join(index_dir, f"{prefix}idf.npy"), vectorizer.idf_)
+
+
+def _load_vectorizer(index_dir: str, prefix: str, params: dict,
+                     backend: str = DEFAULT_VECTORIZER_BACKEND) -> "TfidfVectorizer":
+    """저장된 단어 목록과 idf로 학습된 상태의 vectorizer 복원"""
+    import numpy as np
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    if backend == "hashing":
+        vectorizer = HashingTfidfVectorizer(**params)
+        vectorizer.idf_ = np.asarray(np.load(os.path.join(index_dir, f"{prefix}idf.npy"), mmap_mode="r"))
+        return vectorizer
+
+    with open(os.path.join(index_dir, f"{prefix}vocabulary.json"), "r", encoding="utf-8") as f:
+        terms = json.load(f)
+
+    vectorizer = TfidfVectorizer(**params)
+    vectorizer.vocabulary_ = {term: col for col, term in enumerate(terms)}
+    vectorizer.idf_ = np.asarray(np.load(os.path.join(index_dir, f"{prefix}idf.npy"), mmap_mode="r"))
+    return vectorizer
+
+
+def _save_sparse(index_dir: str, prefix: str, matrix, fmt: str = "csr"):
+    """CSR/CSC 행렬을 data/indices/indptr .npy 파일로 저장"""
+    import numpy as np
+
+    matrix = matrix.asformat(fmt)
+    np.save(os.path.join(index_dir, f"{prefix}data.npy"), matrix.data)
+    np.save(os.path.join(index_dir, f"{prefix}indices.npy"), matrix.indices)
+    np.save(os.path.join(index_dir, f"{prefix}indptr.npy"), matrix.indptr)
+
+
+def _load_sparse(index_dir: str, prefix: str, shape: list, fmt: str = "csr"):
+    """.npy 파일을 메모리 매핑하여 CSR/CSC 행렬 복원"""
+    import numpy as np
+    from scipy import sparse
+
+    def load_array(name):
+        return np.load(os.path.join(index_dir, f"{prefix}{name}.npy"), mmap_mode="r")
+
+    matrix_class = sparse.csc_matrix if fmt == "csc" else sparse.csr_matrix
+    return matrix_class(
+        (load_array("data"), load_array("indices"), load_array("indptr")),
+        shape=tuple(shape)
+    )
+
+
+class PatentIndex:
+    """
+    특허 검색 인덱스
+
+    - 1차: patent_summary TF-IDF (vectorizer, summary_vectors, patent_ids)
+      summary_postings는 같은 행렬의 CSC 사본으로, 역색인 검색(search)에 쓴다.
+    - 2차: content_chunks 텍스트 TF-IDF (chunk_vectorizer, chunk_vectors)
+      chunk_offsets[i]:chunk_offsets[i+1] 행이 patent_ids[i]의 청크들이다.
+
+    vectorizer는 backend에 따라 TfidfVectorizer(단어 n-gram 어휘) 또는
+    HashingTfidfVectorizer(문자 n-gram 해싱)이며, 둘 다 L2 정규화된 TF-IDF 행렬을 만든다.
+
+    스냅샷에서 로드한 인덱스는 행렬, idf, 출원번호(StringArray)가 모두 읽기 전용 메모리 맵이라
+    같은 스냅샷을 연 프로세스들은 OS 페이지 캐시의 한 벌을 공유한다.
+    """
+
+    def __init__(self, vectorizer: "TfidfVectorizer", summary_vectors, patent_ids: list,
+                 chunk_vectorizer: "TfidfVectorizer", chunk_vectors, chunk_offsets,
+                 summary_postings=None):
+        self.vectorizer = vectorizer
+        self.summary_vectors = summary_vectors
+        self.patent_ids = patent_ids
+        self.chunk_vectorizer = chunk_vectorizer
+        self.chunk_vectors = chunk_vectors
+        self.chunk_offsets = chunk_offsets
+        self.summary_postings = summary_postings if summary_postings is not None else summary_vectors.tocsc()
+        self.index_dir = None
+        self._positions = None
+        self._searcher = InvertedIndex(self.summary_postings)
+
+    @property
+    def backend(self) -> str:
+        """vectorizer backend 이름 (VECTORIZER_BACKENDS의 키)"""
+        return "hashing" if isinstance(self.vectorizer, HashingTfidfVectorizer) else "tfidf"
+
+    @classmethod
+    def build(cls, patents_data, backend: str = DEFAULT_VECTORIZER_BACKEND, n_jobs: int = None) -> "PatentIndex":
+        """
+        특허 데이터의 patent_summary / content_chunks로 TF-IDF 인덱스 생성
+
+        patents_data는 dict 또는 items()로 특허를 순서대로 스트리밍하는 매핑(LazyPatents)이며,
+        요약문과 청크를 각각 한 번씩 순회하므로 청크 본문 전체를 메모리에 모으지 않는다.
+
+        Args:
+            backend: "tfidf"(단어 1~2-gram 어휘) 또는 "hashing"(문자 n-gram 해싱 + idf)
+            n_jobs: hashing backend에서 해싱에 쓸 프로세스 수 (None/1이면 현재 프로세스에서,
+                2 이상이면 spawn 프로세스 풀 - 호출하는 스크립트에 if __name__ == "__main__" 가드가 필요)
+        """
+        import numpy as np
+
+        _check_backend(backend)
+        params, chunk_params = VECTORIZER_BACKENDS[backend]
+
+        patent_ids = []
+        summaries = []
+        for patent_id, patent in patents_data.items():
+            patent_ids.append(patent_id)
+            summaries.append(patent.get('patent_summary', ''))
+
+        vectorizer = _make_vectorizer(backend, params)
+        summary_vectors = _fit_transform(vectorizer, summaries, n_jobs).tocsr()
+        del summaries
+
+        chunk_offsets = [0]
+
+        def iter_chunk_texts():
+            for patent_id, patent in patents_data.items():
+                texts = chunk_texts_of(patent)
+                chunk_offsets.append(chunk_offsets[-1] + len(texts))
+                yield from texts
+
+        chunk_vectorizer = _make_vectorizer(backend, chunk_params)
+        chunk_vectors = _fit_transform(chunk_vectorizer, iter_chunk_texts(), n_jobs).tocsr()
+
+        return cls(vectorizer, summary_vectors, patent_ids,
+                   chunk_vectorizer, chunk_vectors, np.asarray(chunk_offsets, dtype=np.int64))
+
+    def with_patents(self, patents: list) -> "PatentIndex":
+        """
+        특허를 추가한 새 인덱스 반환 (현재 인덱스는 그대로 둔다)
+
+        재학습 없이 현재 vectorizer의 어휘와 idf로 변환하므로, 어휘에 없는 새 단어는
+        다음 재학습(build) 전까지 검색에 반영되지 않는다. 이미 있는 출원번호는 교체되어 맨 뒤로 간다.
+
+        Args:
+            patents: [(patent_id, 특허 데이터), ...]
+        """
+        if not patents:
+            return self
+
+        base = self.without_patents([patent_id for patent_id, _ in patents])
+        return base._append(base.vectorize_patents(patents))
+
+    def _append(self, other: "PatentIndex") -> "PatentIndex":
+        """같은 vectorizer로 만든 other의 특허를 뒤에 붙인 새 인덱스 (행렬을 복사한다)"""
+        import numpy as np
+        from scipy import sparse
+
+        return PatentIndex(
+            self.vectorizer,
+            sparse.vstack([self.summary_vectors, other.summary_vectors], format="csr"),
+            list(self.patent_ids) + list(other.patent_ids),
+            self.chunk_vectorizer,
+            sparse.vstack([self.chunk_vectors, other.chunk_vectors], format="csr"),
+            np.concatenate([self.chunk_offsets, self.chunk_offsets[-1] + other.chunk_offsets[1:]])
+        )
+
+    def vectorize_patents(self, patents: list) -> "PatentIndex":
+        """
+        patents만 담은 새 인덱스 (현재 vectorizer의 어휘와 idf로 변환, 재학습 없음)
+
+        Args:
+            patents: [(patent_id, 특허 데이터), ...]
+        """
+        import numpy as np
+        from scipy import sparse
+
+        chunk_lists = [chunk_texts_of(patent) for _, patent in patents]
+        summary_vectors = self.vectorizer.transform([patent.get('patent_summary', '') for _, patent in patents])
+        chunk_texts = [text for texts in chunk_lists for text in texts]
+        if chunk_texts:
+            chunk_vectors = self.chunk_vectorizer.transform(chunk_texts)
+        else:
+            # 청크가 없는 특허만 추가할 때 (TfidfVectorizer는 빈 입력을 변환하지 못한다)
+            chunk_vectors = sparse.csr_matrix((0, self.chunk_vectors.shape[1]), dtype=self.chunk_vectors.dtype)
+        chunk_offsets = np.concatenate([[0], np.cumsum([len(texts) for texts in chunk_lists])]).astype(np.int64)
+
+        return PatentIndex(
+            self.vectorizer, summary_vectors.tocsr(), [patent_id for patent_id, _ in patents],
+            self.chunk_vectorizer, chunk_vectors.tocsr(), chunk_offsets
+        )
+
+    def without_patents(self, patent_ids: list) -> "PatentIndex":
+        """출원번호들을 뺀 새 인덱스 반환 (없는 출원번호는 무시)"""
+        import numpy as np
+
+        drop = [position for position in map(self.position_of, set(patent_ids)) if position is not None]
+        if not drop:
+            return self
+
+        keep = np.ones(len(self.patent_ids), dtype=bool)
+        keep[drop] = False
+        chunk_counts = np.diff(self.chunk_offsets)
+        chunk_keep = np.repeat(keep, chunk_counts)
+
+        return PatentIndex(
+            self.vectorizer,
+            self.summary_vectors[np.flatnonzero(keep)],
+            [patent_id for patent_id, kept in zip(self.patent_ids, keep) if kept],
+            self.chunk_vectorizer,
+            self.chunk_vectors[np.flatnonzero(chunk_keep)],
+            np.concatenate([[0], np.cumsum(chunk_counts[keep])]).astype(np.int64)
+        )
+
+    def position_of(self, patent_id: str):
+        """출원번호의 patent_ids 내 위치 (없으면 None)"""
+        if isinstance(self.patent_ids, StringArray):
+            # 공유 메모리 맵에서 이진 탐색 (프로세스마다 dict를 만들지 않는다)
+            return self.patent_ids.find(patent_id)
+        if self._positions is None:
+            self._positions = {patent_id: i for i, patent_id in enumerate(self.patent_ids)}
+        return self._positions.get(patent_id)
+
+    def search(self, question_vector, top_k: int) -> list:
+        """
+        요약문 유사도 상위 top_k개 특허
+
+        Args:
+            question_vector: vectorizer로 변환한 질문 벡터
+            top_k: 반환할 특허 수
+
+        Returns:
+            [(patent_ids 내 위치, 코사인 유사도), ...] (유사도 0 초과만, 내림차순)
+        """
+        return self._searcher.search(question_vector, top_k)
+
+    def search_batch(self, question_vectors, top_k: int, block_size: int = 256) -> list:
+        """
+        여러 질문의 요약문 유사도 상위 top_k개를 한 번에 계산
+
+        질문 행렬을 block_size행씩 나눠 (질문 x 특허) 희소 행렬곱으로 유사도를 구하므로
+        메모리는 블록 하나의 결과 크기로 제한되고, 단어를 공유하지 않는 특허는 계산되지 않는다.
+
+        Args:
+            question_vectors: vectorizer로 변환한 (질문 수 x 단어 수) 행렬
+            top_k: 질문마다 반환할 특허 수
+            block_size: 한 번에 곱할 질문 수
+
+        Returns:
+            질문 순서대로 [(patent_ids 내 위치, 코사인 유사도), ...] 리스트의 리스트
+        """
+        question_vectors = question_vectors.tocsr()
+        summary_columns = self.summary_vectors.T
+
+        results = []
+        for start in range(0, question_vectors.shape[0], max(1, block_size)):
+            similarities = (question_vectors[start:start + block_size] @ summary_columns).tocsr()
+            for row in range(similarities.shape[0]):
+                begin, end = similarities.indptr[row], similarities.indptr[row + 1]
+                scores = similarities.data[begin:end]
+                positive = scores > 0
+                results.append(select_top_k(similarities.indices[begin:end][positive], scores[positive], top_k))
+        return results
+
+    def enable_sharding(self, shards: int):
+        """
+        요약문 검색을 shards개 프로세스로 나눠 수행 (수백만 건 규모용)
+
+        워커가 스냅샷 파일을 직접 열어야 하므로 저장/로드된 인덱스에서만 쓸 수 있다.
+        """
+        if shards <= 1:
+            return
+        if self.index_dir is None:
+            raise Exception("샤딩은 저장된 인덱스 스냅샷에서만 사용할 수 있습니다")
+        self._searcher = ShardedInvertedIndex(self.index_dir, "summary_", self.summary_vectors.shape, shards)
+
+    @property
+    def sharded(self) -> bool:
+        """요약문 검색을 샤드 프로세스에서 하는지 여부"""
+        return isinstance(self._searcher, ShardedInvertedIndex)
+
+    def close(self):
+        """
+        샤드 워커 프로세스 종료
+
+        이 인덱스(또는 이 인덱스 위의 PatentIndexOverlay)로 검색하는 곳이 더 없을 때만 호출한다.
+        교체된 인덱스는 닫지 않아도 마지막 참조가 사라질 때 샤드 워커가 종료된다.
+        """
+        if self.sharded:
+            self._searcher.close()
+
+    def chunk_scores(self, question_vector, patent_id: str) -> "np.ndarray":
+        """
+        특허 하나의 청크별 질문 유사도
+
+        Args:
+            question_vector: chunk_vectorizer로 변환한 질문 벡터
+            patent_id: 출원번호
+
+        Returns:
+            청크 순서대로의 코사인 유사도 배열 (TF-IDF 벡터는 L2 정규화되어 있어 내적과 같다)
+        """
+        import numpy as np
+
+        position = self.position_of(patent_id)
+        if position is None:
+            return np.zeros(0)
+
+        start, end = self.chunk_offsets[position], self.chunk_offsets[position + 1]
+        return (self.chunk_vectors[start:end] @ question_vector.T).toarray().ravel()
+
+    def save(self, index_dir: str, source_hash: str = ""):
+        """
+        인덱스를 디렉토리에 저장
+
+        CSR 배열과 idf는 메모리 매핑으로 읽을 수 있도록 개별 .npy 파일로 저장한다.
+        임시 디렉토리에 모두 쓴 뒤 rename하므로 중간 상태의 스냅샷은 보이지 않는다.
+        """
+        import numpy as np
+
+        params, chunk_params = VECTORIZER_BACKENDS[self.backend]
+        parent = os.path.dirname(os.path.abspath(index_dir))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-index-")
+
+        try:
+            _save_sparse(tmp_dir, "summary_", self.summary_vectors)
+            _save_sparse(tmp_dir, "summary_postings_", self.summary_postings, "csc")
+            _save_vectorizer(tmp_dir, "", self.vectorizer)
+            _save_sparse(tmp_dir, "chunk_", self.chunk_vectors)
+            _save_vectorizer(tmp_dir, "chunk_", self.chunk_vectorizer)
+            np.save(os.path.join(tmp_dir, "chunk_offsets.npy"), self.chunk_offsets)
+
+            save_string_array(tmp_dir, "patent_ids", self.patent_ids)
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({
+                    "format_version": INDEX_FORMAT_VERSION,
+                    "source_hash": source_hash,
+                    "vectorizer_backend": self.backend,
+                    "vectorizer_params": params,
+                    "chunk_vectorizer_params": chunk_params,
+                    "shape": list(self.summary_vectors.shape),
+                    "chunk_shape": list(self.chunk_vectors.shape),
+                    "created_at": datetime.now().isoformat()
+                }, f, ensure_ascii=False)
+
+            os.replace(tmp_dir, index_dir)
+        except OSError:
+            # 다른 프로세스가 먼저 같은 스냅샷을 만든 경우 그쪽을 그대로 사용
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(os.path.join(index_dir, "meta.json")):
+                raise
+
+    @classmethod
+    def load(cls, index_dir: str) -> "PatentIndex":
+        """저장된 인덱스를 읽기 전용 메모리 매핑으로 로드 (재학습 없음)"""
+        import numpy as np
+
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        backend = meta.get("vectorizer_backend", DEFAULT_VECTORIZER_BACKEND)
+        params, chunk_params = VECTORIZER_BACKENDS[backend]
+        index = cls(
+            _load_vectorizer(index_dir, "", params, backend),
+            _load_sparse(index_dir, "summary_", meta["shape"]),
+            StringArray(index_dir, "patent_ids"),
+            _load_vectorizer(index_dir, "chunk_", chunk_params, backend),
+            _load_sparse(index_dir, "chunk_", meta["chunk_shape"]),
+            np.load(os.path.join(index_dir, "chunk_offsets.npy"), mmap_mode="r"),
+            summary_postings=_load_sparse(index_dir, "summary_postings_", meta["shape"], "csc")
+        )
+        index.index_dir = index_dir
+        return index
+
+
+class _OverlayPatentIds:
+    """PatentIndexOverlay의 위치 -> 출원번호 (삭제된 기본 인덱스 위치는 비어 있고, len은 남은 특허 수)"""
+
+    def __init__(self, overlay: "PatentIndexOverlay"):
+        self._overlay = overlay
+
+    def __getitem__(self, position: int) -> str:
+        base_size = self._overlay.base_size
+        if position >= base_size:
+            return self._overlay.added.patent_ids[position - base_size]
+        return self._overlay.base.patent_ids[position]
+
+    def __len__(self) -> int:
+        overlay = self._overlay
+        added = len(overlay.added.patent_ids) if overlay.added is not None else 0
+        return overlay.base_size - len(overlay.removed) + added
+
+    def __iter__(self):
+        overlay = self._overlay
+        for position in range(overlay.base_size):
+            if position not in overlay.removed:
+                yield overlay.base.patent_ids[position]
+        if overlay.added is not None:
+            yield from overlay.added.patent_ids
+
+
+class PatentIndexOverlay:
+    """
+    스냅샷 인덱스(PatentIndex) 위에 추가/삭제분을 얹은 검색 인덱스
+
+    add/remove마다 전체 행렬을 복사하지 않고, 추가된 특허만 작은 PatentIndex(added)로 벡터화하며
+    삭제(교체 포함)된 기본 인덱스 위치는 removed로 가린다. 기본 인덱스의 메모리 맵 공유와 검색 샤드는 그대로 쓴다.
+    변경할 때마다 새 객체를 만들므로 이미 참조 중인 쪽은 이전 상태를 그대로 본다 (patent_store.PatentOverlay와 같은 방식).
+
+    위치는 기본 인덱스의 위치 뒤에 추가분의 위치가 이어진다 (patent_ids[위치]로 출원번호를 얻는다).
+    """
+
+    def __init__(self, base: PatentIndex, added: PatentIndex = None, removed: frozenset = frozenset()):
+        self.base = base
+        self.added = added
+        self.removed = frozenset(removed)
+        self.base_size = len(base.patent_ids)
+        self.vectorizer = base.vectorizer
+        self.chunk_vectorizer = base.chunk_vectorizer
+        self.patent_ids = _OverlayPatentIds(self)
+        # 스냅샷 자체가 아니므로 enable_sharding / save 대상이 아니다
+        self.index_dir = None
+
+    @property
+    def backend(self) -> str:
+        return self.base.backend
+
+    @property
+    def sharded(self) -> bool:
+        return self.base.sharded
+
+    def with_patents(self, patents: list) -> "PatentIndexOverlay":
+        """특허를 추가한 새 오버레이 반환 (이미 있는 출원번호는 교체되어 맨 뒤로 간다)"""
+        if not patents:
+            return self
+        overlay = self.without_patents([patent_id for patent_id, _ in patents])
+        added = (overlay.added.with_patents(patents) if overlay.added is not None
+                 else overlay.base.vectorize_patents(patents))
+        return PatentIndexOverlay(overlay.base, added, overlay.removed)
+
+    def without_patents(self, patent_ids: list) -> "PatentIndexOverlay":
+        """출원번호들을 뺀 새 오버레이 반환 (없는 출원번호는 무시)"""
+        removed = set(self.removed)
+        for patent_id in set(patent_ids):
+            position = self.base.position_of(patent_id)
+            if position is not None:
+                removed.add(position)
+        added = self.added.without_patents(patent_ids) if self.added is not None else None
+        if added is self.added and len(removed) == len(self.removed):
+            return self
+        return PatentIndexOverlay(self.base, added, frozenset(removed))
+
+    def position_of(self, patent_id: str):
+        if self.added is not None:
+            position = self.added.position_of(patent_id)
+            if position is not None:
+                return self.base_size + position
+        position = self.base.position_of(patent_id)
+        return None if position is None or position in self.removed else position
+
+    def _merge(self, base_hits: list, added_hits: list, top_k: int) -> list:
+        """기본 인덱스 결과에서 삭제된 위치를 빼고 추가분 결과와 합쳐 다시 top_k개 선택"""
+        hits = [hit for hit in base_hits if hit[0] not in self.removed]
+        hits += [(self.base_size + position, score) for position, score in added_hits]
+        if not hits:
+            return []
+        positions, scores = zip(*hits)
+        return select_top_k(list(positions), list(scores), top_k)
+
+    def search(self, question_vector, top_k: int) -> list:
+        """PatentIndex.search와 같음 (삭제된 특허가 빠져도 top_k개가 남도록 그만큼 더 찾는다)"""
+        base_hits = self.base.search(question_vector, top_k + len(self.removed))
+        added_hits = self.added.search(question_vector, top_k) if self.added is not None else []
+        return self._merge(base_hits, added_hits, top_k)
+
+    def search_batch(self, question_vectors, top_k: int, block_size: int = 256) -> list:
+        """PatentIndex.search_batch와 같음"""
+        base_results = self.base.search_batch(question_vectors, top_k + len(self.removed), block_size)
+        if self.added is not None:
+            added_results = self.added.search_batch(question_vectors, top_k, block_size)
+        else:
+            added_results = [[] for _ in base_results]
+        return [self._merge(base_hits, added_hits, top_k)
+                for base_hits, added_hits in zip(base_results, added_results)]
+
+    def chunk_scores(self, question_vector, patent_id: str) -> "np.ndarray":
+        """PatentIndex.chunk_scores와 같음"""
+        import numpy as np
+
+        if self.added is not None and self.added.position_of(patent_id) is not None:
+            return self.added.chunk_scores(question_vector, patent_id)
+        if self.position_of(patent_id) is None:
+            return np.zeros(0)
+        return self.base.chunk_scores(question_vector, patent_id)
+
+    def materialize(self) -> PatentIndex:
+        """추가/삭제를 반영한 하나의 PatentIndex (행렬 전체를 복사한다)"""
+        index = self.base.without_patents([self.base.patent_ids[position] for position in self.removed])
+        if self.added is not None and len(self.added.patent_ids):
+            index = index._append(self.added)
+        return index
+
+    @property
+    def summary_vectors(self):
+        """남은 특허 순서의 요약문 행렬 (materialize()로 새로 만든다)"""
+        return self.materialize().summary_vectors
+
+    def close(self):
+        """기본 인덱스의 샤드 워커 종료 (같은 기본 인덱스를 쓰는 다른 오버레이도 더 쓰지 않을 때만)"""
+        self.base.close()
+
+
+def remove_snapshot(snapshot_dir: str):
+    """
+    load_or_build_index가 만든 스냅샷 디렉토리와 잠금 파일 삭제
+
+    이미 연 프로세스의 메모리 맵은 그대로 유지되며(POSIX), 지우지 못한 파일은 그대로 둔다.
+    """
+    with file_lock(snapshot_dir + ".lock"):
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        try:
+            os.remove(snapshot_dir + ".lock")
+        except OSError:
+            pass
+
+
+def load_or_build_index(json_file_path: str, load_patents, index_dir: str = DEFAULT_INDEX_DIR,
+                        source_hash: str = None, backend: str = DEFAULT_VECTORIZER_BACKEND,
+                        n_jobs: int = None) -> tuple:
+    """
+    JSON 내용 해시에 해당하는 스냅샷이 있으면 로드하고, 없으면 새로 만들어 저장
+
+    Args:
+        json_file_path: 원본 특허 JSON 경로
+        load_patents: 스냅샷이 없을 때만 호출되는 특허 데이터 로더
+        index_dir: 스냅샷 저장 디렉토리
+        source_hash: 원본 JSON 내용 해시 (None이면 json_file_path로 계산, 컬럼형 코퍼스는 meta의 해시)
+        backend: vectorizer backend (backend마다 스냅샷이 따로 생긴다)
+        n_jobs: 스냅샷을 새로 만들 때 hashing backend가 쓸 프로세스 수 (None/1이면 현재 프로세스에서)
+
+    Returns:
+        (PatentIndex, 스냅샷 사용 여부)
+    """
+    _check_backend(backend)
+    if source_hash is None:
+        source_hash = file_content_hash(json_file_path, index_dir)
+    snapshot_dir = os.path.join(index_dir, f"{source_hash[:16]}-{_params_key(backend)}")
+    os.makedirs(index_dir, exist_ok=True)
+
+    # 여러 서버 프로세스가 동시에 시작해도 한 프로세스만 인덱스를 만들어 게시하고,
+    # 나머지는 잠금을 기다렸다가 같은 스냅샷을 메모리 맵으로 연다
+    with file_lock(snapshot_dir + ".lock"):
+        if os.path.exists(os.path.join(snapshot_dir, "meta.json")):
+            try:
+                return PatentIndex.load(snapshot_dir), True
+            except (OSError, ValueError, KeyError, json.JSONDecodeError):
+                # 손상된 스냅샷은 지우고 다시 만든다
+                shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+        PatentIndex.build(load_patents(), backend, n_jobs).save(snapshot_dir, source_hash=source_hash)
+
+    # 만든 프로세스도 학습 결과의 사본 대신 게시한 스냅샷을 공유한다
+    return PatentIndex.load(snapshot_dir), False
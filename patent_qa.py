@@ -1,65 +1,493 @@
-import pandas as pd
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from openai import OpenAI
+import asyncio
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
 import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
 from datetime import datetime
 
-# 압축해제
-import zipfile, os
+from chat_history import DEFAULT_HISTORY_DIR, ChatHistoryStore
+from chunk_digests import ChunkDigestStore, digest_messages, render_digest
+from file_lock import file_lock
+from llm_cache import DEFAULT_CACHE_PATH, LLMResponseCache
+from llm_scheduler import LLMScheduler
+from metrics import stage_latency_summary
+from patent_columnar import ColumnarPatents, is_columnar_corpus
+from patent_index import (
+    DEFAULT_INDEX_DIR, DEFAULT_VECTORIZER_BACKEND, PatentIndex, PatentIndexOverlay, chunk_texts_of,
+    file_content_hash, VECTORIZER_BACKENDS, load_or_build_index, remove_snapshot
+)
+from patent_store import PatentOverlay, open_patent_store
+from question_cache import SemanticQuestionCache
+from request_scheduler import FairScheduler
+from token_counter import count_message_tokens, count_tokens
 
-if not os.path.exists("final_patent_chunking_results.json"):
-    with zipfile.ZipFile("data.zip", "r") as z:
-        z.extractall(".")
+# numpy / sklearn / openai는 import 시간이 길어 실제로 사용할 때 불러온다
 
+DEFAULT_JSON_PATH = "final_patent_chunking_results.json"
+DEFAULT_ZIP_PATH = "data.zip"
 
-# OpenAI API 설정
-import os
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# 청크 답변 추출 방식: 청크마다 요청 1건 / 여러 청크를 묶어 요청 1건 (JSON 응답)
+EXTRACTION_MODES = ("per_chunk", "packed")
+
+# 묶음 요청에서 청크 구분 머리글
+PACKED_SECTION_HEADER = "### 문서 {number}"
+
+# "정보 없음" 답변을 걸러내는 문구 (per_chunk 모드)
+NO_ANSWER_PHRASES = [
+    "찾을 수 없습니다", "정보가 없습니다", "언급되지 않습니다",
+    "나와 있지 않습니다", "확인할 수 없습니다"
+]
+
+
+def prepare_data(json_file_path: str = DEFAULT_JSON_PATH, zip_path: str = DEFAULT_ZIP_PATH) -> str:
+    """
+    특허 JSON이 없으면 data.zip에서 압축 해제
+    
+    여러 프로세스가 동시에 호출해도 한 번만 압축을 풀며, 임시 파일에 쓴 뒤 rename하므로
+    중간에 실패해도 깨진 JSON이 남지 않는다. 이미 JSON이 있으면 아무것도 하지 않는다.
+    
+    Returns:
+        JSON 파일 경로
+    """
+    if os.path.exists(json_file_path):
+        return json_file_path
+    
+    target_dir = os.path.dirname(os.path.abspath(json_file_path))
+    with file_lock(json_file_path + ".lock"):
+        # 잠금을 기다리는 동안 다른 프로세스가 이미 풀었을 수 있다
+        if os.path.exists(json_file_path):
+            return json_file_path
+        
+        if not os.path.exists(zip_path):
+            raise Exception(f"압축 파일을 찾을 수 없습니다: {zip_path}")
+        
+        with zipfile.ZipFile(zip_path, "r") as z:
+            name = os.path.basename(json_file_path)
+            members = [m for m in z.namelist() if os.path.basename(m) == name]
+            if not members:
+                raise Exception(f"압축 파일에 {name}이(가) 없습니다: {zip_path}")
+            
+            fd, tmp_path = tempfile.mkstemp(dir=target_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as out, z.open(members[0]) as src:
+                    shutil.copyfileobj(src, out, 1 << 20)
+                os.replace(tmp_path, json_file_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+    
+    return json_file_path
+
+
+# OpenAI API 설정 (처음 사용할 때 생성)
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_client():
+    """기본 OpenAI 클라이언트 반환 (OPENAI_API_KEY 환경 변수 사용)"""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                from openai import OpenAI
+                _default_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _default_client
+
+
+class _CallStats:
+    """
+    ask() 한 번 동안의 계측 정보 (여러 스레드에서 동시에 갱신)
+    
+    - counts: 캐시 적중/미스, 토큰 수 합계
+    - stages: 단계별 소요 시간 (초)
+    - calls: LLM 호출 1건마다의 소요 시간과 토큰 수
+    - priority: 이 질문의 LLM 요청 우선순위 ("interactive" / "batch")
+    """
+    
+    def __init__(self, priority: str = "interactive"):
+        self.priority = priority
+        # 조기 종료로 결과를 버린 요청이면 True (캐시에 쓰지 않고, 아직 보내지 않았으면 보내지 않는다)
+        self.abandoned = False
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.counts = {"cache_hits": 0, "cache_misses": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self.stages = {}
+        self.calls = []
+    
+    def add(self, name: str, value: int = 1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+    
+    @contextmanager
+    def timed(self, stage: str):
+        """with 블록의 소요 시간을 stage에 누적"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(stage, time.perf_counter() - start)
+    
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+    
+    def add_call(self, stage: str, seconds: float, usage=None, cached: bool = False, **extra):
+        """LLM 호출 1건 기록 (usage는 response.usage)"""
+        prompt_tokens = (getattr(usage, "prompt_tokens", 0) or 0) if usage is not None else 0
+        completion_tokens = (getattr(usage, "completion_tokens", 0) or 0) if usage is not None else 0
+        
+        call = {
+            "stage": stage,
+            "seconds": seconds,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached": cached
+        }
+        call.update(extra)
+        
+        with self._lock:
+            self.calls.append(call)
+            self.counts["prompt_tokens"] += prompt_tokens
+            self.counts["completion_tokens"] += completion_tokens
+    
+    def child(self) -> "_CallStats":
+        """같은 우선순위로 따로 모으는 계측 (끝난 뒤 merge로 합친다)"""
+        return _CallStats(self.priority)
+    
+    def merge(self, other: "_CallStats"):
+        """child()로 모은 계측을 합침"""
+        with other._lock:
+            counts, stages, calls = dict(other.counts), dict(other.stages), list(other.calls)
+        with self._lock:
+            for name, value in counts.items():
+                self.counts[name] = self.counts.get(name, 0) + value
+            for stage, seconds in stages.items():
+                self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+            self.calls.extend(calls)
+    
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "total_seconds": time.perf_counter() - self._started,
+                "stages": dict(self.stages),
+                "calls": list(self.calls)
+            }
 
 
 class PatentQAChatbot:
-    def __init__(self, json_file_path: str):
-        """특허 QA 챗봇 초기화 (다중 문서 참조)"""
+    def __init__(self, json_file_path: str, max_concurrency: int = 8,
+                 request_timeout: float = 60.0, max_retries: int = 5,
+                 index_dir: str = DEFAULT_INDEX_DIR, chunk_top_n: int = 5,
+                 chunk_min_score: float = 0.0, cache_path: str = DEFAULT_CACHE_PATH,
+                 llm_concurrency: int = 16, patent_cache_size: int = 64, client=None,
+                 metrics_sinks: list = None, search_shards: int = 1, refit_after: int = 1000,
+                 extraction_mode: str = "per_chunk", pack_token_budget: int = 3000,
+                 synthesis_token_budget: int = 6000, dedup_threshold: float = 0.9,
+                 early_exit_answers: int = None, early_exit_confidence: float = None,
+                 question_cache_size: int = 0, question_cache_threshold: float = 0.85,
+                 serving_workers: int = 8, max_questions_per_session: int = 2,
+                 requests_per_minute: float = None, tokens_per_minute: float = None, llm_scheduler=None,
+                 digest_path: str = None, vectorizer_backend: str = DEFAULT_VECTORIZER_BACKEND,
+                 index_jobs: int = None):
+        """
+        특허 QA 챗봇 초기화 (다중 문서 참조)
+        
+        Args:
+            json_file_path: 특허 청킹 결과 JSON 경로 (또는 patent_columnar로 변환한 코퍼스 디렉토리)
+            max_concurrency: 동시에 진행할 청크 LLM 호출 수 (1이면 순차 처리)
+            request_timeout: LLM 요청 1건당 타임아웃 (초)
+            max_retries: rate limit / 타임아웃 발생 시 최대 재시도 횟수
+            index_dir: TF-IDF 인덱스 스냅샷 저장 디렉토리
+            chunk_top_n: 특허마다 LLM에 보낼 관련도 상위 청크 수 (None이면 전체)
+            chunk_min_score: 이 점수 미만인 청크는 LLM에 보내지 않음
+            cache_path: LLM 응답 디스크 캐시(SQLite) 경로, 워커 간 공유 가능 (None이면 메모리 캐시만 사용)
+            llm_concurrency: 인스턴스 전체(동시 질문 포함)에서 동시에 진행할 LLM 요청 수 상한
+            patent_cache_size: 청크 본문을 메모리에 유지할 최근 특허 수
+            client: chat.completions.create를 제공하는 LLM 클라이언트 (None이면 기본 OpenAI 클라이언트)
+            metrics_sinks: 질문마다 계측 결과를 받을 sink 리스트 (metrics.JsonlMetricsSink 등)
+            search_shards: 요약문 검색을 나눠 맡을 프로세스 수 (1이면 현재 프로세스에서 검색)
+            refit_after: add_patents/remove_patents로 이만큼 바뀌면 백그라운드에서 TF-IDF 재학습 (None이면 자동 재학습 안 함)
+            extraction_mode: "per_chunk"(청크마다 요청) 또는 "packed"(한 특허의 청크 여러 개를 한 요청에 묶음)
+            pack_token_budget: packed 모드에서 요청 하나에 담을 청크 본문 토큰 수 상한
+            synthesis_token_budget: 종합 요청 하나에 담을 청크 답변 토큰 수 상한 (넘으면 나눠서 요약한 뒤 종합)
+            dedup_threshold: 청크 답변끼리 TF-IDF 코사인 유사도가 이 값 이상이면 중복으로 보고 하나만 사용
+            early_exit_answers: 유효 답변이 이만큼 모이면 남은 청크는 LLM에 보내지 않음 (None이면 모든 청크 검토)
+            early_exit_confidence: 답변이 나온 청크들의 관련도 합이 이 값 이상이면 남은 청크는 보내지 않음
+                (둘 중 하나라도 설정하면 청크를 관련도 높은 순서로 검토한다)
+            question_cache_size: 비슷한 질문의 답변을 재사용하는 질문 캐시 크기 (기본 0: 사용 안 함)
+            question_cache_threshold: 질문 캐시에서 같은 질문으로 볼 문자 n-gram 코사인 유사도
+                (내용어 집합도 같아야 재사용한다)
+            serving_workers: ask_async / ask_stream_async 질문을 동시에 처리할 공유 워커 수
+            max_questions_per_session: 세션 하나가 동시에 처리할 수 있는 질문 수 (나머지는 차례를 기다림)
+            requests_per_minute: LLM 분당 요청 수 한도 (None이면 제한 없음)
+            tokens_per_minute: LLM 분당 토큰 수 한도 (None이면 제한 없음)
+            llm_scheduler: 같은 API 키를 쓰는 인스턴스끼리 공유할 LLMScheduler
+                (None이면 llm_concurrency / requests_per_minute / tokens_per_minute로 새로 만듦)
+            digest_path: 청크 digest 저장소(chunk_digests.ChunkDigestStore) 경로. 주면 청크 원문을 보내기 전에
+                digest로 관련 여부를 먼저 거르고, 관련 있어 보이는 청크만 원문으로 답변을 만든다 (None이면 사용 안 함).
+                거르기가 지연 시간과 토큰을 줄일 수 있을 때만 거른다 (_screen_by_digest 참고)
+            vectorizer_backend: 검색 인덱스 vectorizer. "tfidf"(단어 1~2-gram 어휘, 기본) 또는
+                "hashing"(문자 n-gram 해싱 + idf, 어휘 사전이 없어 메모리가 코퍼스 크기와 무관)
+            index_jobs: hashing backend로 인덱스를 만들 때 쓸 프로세스 수 (None/1이면 현재 프로세스에서 해싱).
+                2 이상이면 spawn 프로세스 풀을 쓰는데, 자식 프로세스가 __main__ 모듈을 다시 import하므로
+                챗봇을 만드는 스크립트는 if __name__ == "__main__": 가드 안에서 만들어야 한다
+        """
         print("🤖 특허 QA 챗봇을 초기화하는 중...")
         
-        # JSON 파일 읽기
-        self.patents_data = self._load_json(json_file_path)
+        if extraction_mode not in EXTRACTION_MODES:
+            raise Exception(f"지원하지 않는 extraction_mode: {extraction_mode} (가능한 값: {', '.join(EXTRACTION_MODES)})")
+        if vectorizer_backend not in VECTORIZER_BACKENDS:
+            raise Exception(f"지원하지 않는 vectorizer_backend: {vectorizer_backend} "
+                            f"(가능한 값: {', '.join(VECTORIZER_BACKENDS)})")
         
-        # 출원번호 리스트
-        self.patent_ids = list(self.patents_data.keys())
-        print(f"✓ 총 {len(self.patent_ids)}개 특허 문서 로드 완료")
+        self._client = client
+        self.metrics_sinks = list(metrics_sinks or [])
+        self.max_concurrency = max(1, max_concurrency)
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.chunk_top_n = chunk_top_n
+        self.chunk_min_score = chunk_min_score
+        self.extraction_mode = extraction_mode
+        self.pack_token_budget = pack_token_budget
+        self.synthesis_token_budget = synthesis_token_budget
+        self.dedup_threshold = dedup_threshold
+        self.early_exit_answers = early_exit_answers
+        self.early_exit_confidence = early_exit_confidence
+        self.question_cache = (SemanticQuestionCache(question_cache_size, question_cache_threshold)
+                               if question_cache_size else None)
+        # 여러 세션(Streamlit 브라우저 탭)의 질문을 공평하게 나눠 처리하는 공유 작업 큐
+        # (LLM 요청은 세션과 관계없이 llm_scheduler 하나를 거친다)
+        self.scheduler = FairScheduler(serving_workers, max_questions_per_session)
+        self.cache = LLMResponseCache(cache_path)
+        # 모든 LLM 요청의 동시 요청 수 / RPM / TPM 한도와 우선순위(대화형 > 배치)를 관리
+        self.llm_scheduler = llm_scheduler or LLMScheduler(llm_concurrency, requests_per_minute, tokens_per_minute)
+        self.digests = ChunkDigestStore(digest_path) if digest_path else None
+        self.refit_after = refit_after
+        self.vectorizer_backend = vectorizer_backend
+        self.index_jobs = index_jobs
+        self._update_lock = threading.Lock()
+        self._changes_since_fit = 0
+        self._refit_thread = None
+        self._pending_changes = None
+        # 마지막 재학습이 저장한 스냅샷 (다음 재학습이 교체하면 지운다)
+        self._refit_snapshot_dir = None
+        
+        if not os.path.exists(json_file_path):
+            raise Exception(f"JSON 파일을 찾을 수 없습니다: {json_file_path}")
+        self.json_file_path = json_file_path
+        self.index_dir = index_dir
+        self.search_shards = search_shards
+        
+        if is_columnar_corpus(json_file_path):
+            # 컬럼형 코퍼스는 메모리 맵으로 열기만 한다 (JSON 파싱 없음)
+            self.patents_data = ColumnarPatents(json_file_path)
+            source_hash = self.patents_data.source_hash
+        else:
+            # 특허 원문은 디스크 저장소(SQLite)에 두고, 질문에 필요한 특허만 읽는다
+            # (처음 한 번만 JSON을 스트리밍 파싱하여 저장소를 만든다)
+            source_hash = file_content_hash(json_file_path, index_dir)
+            self.patents_data = open_patent_store(json_file_path, source_hash, index_dir, patent_cache_size)
+        print("✓ 특허 저장소 준비 완료")
         
-        # 벡터화용 요약 텍스트 수집
-        self.summaries = []
-        for patent_id in self.patent_ids:
-            summary = self.patents_data[patent_id].get('patent_summary', '')
-            self.summaries.append(summary)
-        
-        # TF-IDF 벡터화
-        self.vectorizer = TfidfVectorizer(
-            max_features=10000,
-            ngram_range=(1, 2),
-            min_df=1
+        # TF-IDF 검색 인덱스 (JSON 내용이 같으면 저장된 스냅샷을 재사용, 컬럼형으로 변환해도 공유)
+        self.index, from_snapshot = load_or_build_index(
+            json_file_path, lambda: self.patents_data, index_dir, source_hash=source_hash,
+            backend=vectorizer_backend, n_jobs=index_jobs
         )
-        self.summary_vectors = self.vectorizer.fit_transform(self.summaries)
+        if from_snapshot:
+            print("✓ 저장된 검색 인덱스 로드 완료")
+        else:
+            print("✓ 검색 인덱스 생성 및 저장 완료")
+        if search_shards > 1:
+            self.index.enable_sharding(search_shards)
+            print(f"✓ 검색 샤드 {search_shards}개 준비 완료")
+        # 원본 내용 해시에 add/remove 내역을 이어 붙인 해시 (재학습 스냅샷의 키)
+        self._content_hash = source_hash
+        # 원본 스냅샷은 재시작할 때 다시 쓰므로 재학습 후에도 지우지 않는다
+        self._source_snapshot_dir = self.index.index_dir
+        print(f"✓ 총 {len(self.patent_ids)}개 특허 문서 로드 완료")
         
         print("✅ 챗봇 준비 완료!\n")
     
-    def _load_json(self, json_file_path: str) -> dict:
-        """JSON 파일 로드"""
+    @property
+    def client(self):
+        """LLM 클라이언트 (주입하지 않았으면 기본 OpenAI 클라이언트)"""
+        if self._client is None:
+            self._client = get_client()
+        return self._client
+    
+    @property
+    def vectorizer(self):
+        return self.index.vectorizer
+    
+    @property
+    def summary_vectors(self):
+        return self.index.summary_vectors
+    
+    @property
+    def patent_ids(self) -> list:
+        return self.index.patent_ids
+    
+    @property
+    def summaries(self) -> list:
+        """벡터화에 사용한 요약 텍스트 (patent_ids 순서)"""
+        return [patent.get('patent_summary', '') for _, patent in self.patents_data.items()]
+    
+    def add_patents(self, patents: dict) -> int:
+        """
+        특허 추가 (서비스 중단 없이 바로 검색 대상에 포함)
+        
+        현재 TF-IDF 어휘/idf로 새 특허만 벡터화하여 인덱스 위에 얹는다 (기존 행렬은 복사하지 않는다).
+        이미 있는 출원번호는 새 데이터로 교체된다. 변경은 메모리에만 반영되므로
+        재시작 후에도 유지하려면 원본 JSON에도 추가해야 한다.
+        
+        Args:
+            patents: {출원번호: {"patent_summary": ..., "content_chunks": [...]}}
+        
+        Returns:
+            추가(교체 포함)된 특허 수
+        """
+        if not patents:
+            return 0
+        self._apply_changes(added=dict(patents))
+        return len(patents)
+    
+    def remove_patents(self, patent_ids: list) -> int:
+        """
+        특허 삭제 (서비스 중단 없이 바로 검색 대상에서 제외)
+        
+        Returns:
+            실제로 삭제된 특허 수
+        """
+        removed = [patent_id for patent_id in dict.fromkeys(patent_ids) if patent_id in self.patents_data]
+        if removed:
+            self._apply_changes(removed=removed)
+        return len(removed)
+    
+    def refit_index(self, wait: bool = False):
+        """
+        현재 특허 전체로 TF-IDF를 백그라운드에서 다시 학습하고, 끝나면 인덱스를 교체
+        
+        재학습 중에도 기존 인덱스로 계속 답변하며, 그 사이의 추가/삭제는 새 인덱스에 다시 반영한다.
+        
+        Args:
+            wait: True면 재학습이 끝날 때까지 기다림
+        """
+        with self._update_lock:
+            thread = self._start_refit()
+        if wait:
+            thread.join()
+    
+    def _apply_changes(self, added: dict = None, removed: list = None):
+        """특허 데이터와 인덱스에 변경을 반영한 새 객체를 만들어 교체"""
+        with self._update_lock:
+            patents_data = self.patents_data
+            if not isinstance(patents_data, PatentOverlay):
+                patents_data = PatentOverlay(patents_data)
+            
+            index = self.index
+            if not isinstance(index, PatentIndexOverlay):
+                index = PatentIndexOverlay(index)
+            if removed:
+                index = index.without_patents(removed)
+            if added:
+                index = index.with_patents(list(added.items()))
+            
+            # 데이터를 먼저 교체해야 새 인덱스가 가리키는 특허를 항상 읽을 수 있다
+            self.patents_data = patents_data.with_changes(added, removed)
+            self._swap_index(index)
+            self._content_hash = self._changed_hash(self._content_hash, added, removed)
+            if self.question_cache is not None:
+                self.question_cache.clear()
+            
+            if self._pending_changes is not None:
+                self._pending_changes.append((added, removed))
+            
+            self._changes_since_fit += len(added or {}) + len(removed or [])
+            if self.refit_after is not None and self._changes_since_fit >= self.refit_after:
+                self._start_refit()
+    
+    def _start_refit(self) -> threading.Thread:
+        """재학습 스레드 시작 (_update_lock을 잡은 상태에서 호출, 이미 진행 중이면 그 스레드 반환)"""
+        if self._refit_thread is not None and self._refit_thread.is_alive():
+            return self._refit_thread
+        
+        self._pending_changes = []
+        self._changes_since_fit = 0
+        self._refit_thread = threading.Thread(
+            target=self._refit, args=(self.patents_data, self._content_hash), daemon=True
+        )
+        self._refit_thread.start()
+        return self._refit_thread
+    
+    @staticmethod
+    def _changed_hash(content_hash: str, added: dict = None, removed: list = None) -> str:
+        """변경 전 내용 해시와 변경 내역으로 변경 후 내용 해시 계산 (같은 변경을 적용한 프로세스끼리 같은 값)"""
+        digest = hashlib.sha256(content_hash.encode("utf-8"))
+        for patent_id in removed or []:
+            digest.update(f"-{patent_id}\n".encode("utf-8"))
+        for patent_id, patent in (added or {}).items():
+            digest.update(f"+{patent_id}\n".encode("utf-8"))
+            digest.update(json.dumps(patent, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+    
+    def _swap_index(self, index):
+        """
+        검색 인덱스 교체 (_update_lock을 잡은 상태에서 호출)
+        
+        이전 인덱스는 닫지 않는다. 그 인덱스로 검색 중인 질문이 있을 수 있고, add/remove로 만든
+        오버레이는 같은 스냅샷 인덱스(와 검색 샤드)를 공유한다. 마지막 참조가 사라지면 샤드 워커도 종료된다.
+        """
+        self.index = index
+    
+    def _refit(self, patents_data, content_hash: str):
         try:
-            with open(json_file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            print(f"✓ JSON 파일 로드 완료")
-            return data
-        except FileNotFoundError:
-            raise Exception(f"JSON 파일을 찾을 수 없습니다: {json_file_path}")
-        except json.JSONDecodeError:
-            raise Exception(f"JSON 파일 형식 오류: {json_file_path}")
+            # 재학습 결과도 스냅샷으로 저장하고 메모리 맵으로 다시 연다
+            # (같은 변경을 적용한 다른 프로세스나 재시작한 프로세스는 다시 학습하지 않고 공유한다)
+            index, _ = load_or_build_index(
+                self.json_file_path, lambda: patents_data, self.index_dir, source_hash=content_hash,
+                backend=self.vectorizer_backend, n_jobs=self.index_jobs
+            )
+            if self.search_shards > 1:
+                index.enable_sharding(self.search_shards)
+        except Exception as e:
+            print(f"❌ 검색 인덱스 재학습 실패: {e}")
+            with self._update_lock:
+                self._pending_changes = None
+            return
+        
+        with self._update_lock:
+            # 재학습하는 동안 들어온 변경을 새 인덱스 위에 다시 얹은 뒤 교체
+            snapshot_dir = index.index_dir
+            if self._pending_changes:
+                index = PatentIndexOverlay(index)
+            for added, removed in self._pending_changes:
+                if removed:
+                    index = index.without_patents(removed)
+                if added:
+                    index = index.with_patents(list(added.items()))
+            self._swap_index(index)
+            self._pending_changes = None
+            if self.question_cache is not None:
+                self.question_cache.clear()
+            
+            # 이전 재학습의 스냅샷은 더 이상 쓰지 않으므로 지운다 (변경이 쌓일수록 디스크가 늘지 않도록)
+            superseded = self._refit_snapshot_dir
+            self._refit_snapshot_dir = snapshot_dir if snapshot_dir != self._source_snapshot_dir else None
+        if superseded is not None and superseded != snapshot_dir:
+            remove_snapshot(superseded)
+        print(f"✓ 검색 인덱스 재학습 완료 ({len(index.patent_ids)}개 특허)")
     
-    def _find_top_relevant_patents(self, question: str, top_k: int = 3) -> list:
+    def _find_top_relevant_patents(self, question: str, top_k: int = 3, stats: _CallStats = None) -> list:
         """
         질문과 가장 관련성 높은 특허 top_k개 찾기
         
@@ -70,40 +498,275 @@ class PatentQAChatbot:
         Returns:
             [(patent_id, similarity_score, index), ...] 리스트
         """
-        question_vector = self.vectorizer.transform([question])
-        similarities = cosine_similarity(question_vector, self.summary_vectors).flatten()
+        stats = stats or _CallStats()
         
-        # 유사도가 0보다 큰 것만 필터링
-        valid_indices = np.where(similarities > 0)[0]
-        if len(valid_indices) == 0:
-            return []
+        with stats.timed("vectorize"):
+            # add_patents 등으로 인덱스가 교체되어도 한 질문 안에서는 같은 인덱스를 쓴다
+            index = self.index
+            question_vector = index.vectorizer.transform([question])
+        with stats.timed("similarity"):
+            # 역색인으로 질문 단어가 있는 특허만 점수를 매기고 상위 top_k만 고른다 (유사도 0 초과만)
+            top_hits = index.search(question_vector, top_k)
         
-        # 상위 top_k개 인덱스 추출
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        return [(index.patent_ids[idx], similarity, idx) for idx, similarity in top_hits]
+    
+    def find_top_relevant_patents_batch(self, questions: list, top_k: int = 3, block_size: int = 256,
+                                        stats: _CallStats = None) -> list:
+        """
+        여러 질문의 관련 특허 top_k개를 한 번에 찾기
         
-        results = []
-        for idx in top_indices:
-            if similarities[idx] > 0:  # 유사도 0 초과만
-                patent_id = self.patent_ids[idx]
-                results.append((patent_id, similarities[idx], idx))
+        질문 전체를 한 번에 벡터화하고, 유사도는 block_size개 질문씩 희소 행렬곱으로 계산한다.
         
-        return results
+        Args:
+            questions: 질문 리스트
+            top_k: 질문마다 찾을 특허 수
+            block_size: 한 번에 유사도를 계산할 질문 수 (메모리 사용량 상한)
+            stats: 질문 전체의 vectorize / similarity 단계 시간을 누적할 계측
+        
+        Returns:
+            질문 순서대로 [(patent_id, similarity_score, index), ...] 리스트의 리스트
+        """
+        if not questions:
+            return []
+        
+        stats = stats or _CallStats()
+        with stats.timed("vectorize"):
+            index = self.index
+            question_vectors = index.vectorizer.transform(questions)
+        with stats.timed("similarity"):
+            hits_per_question = index.search_batch(question_vectors, top_k, block_size)
+        return [
+            [(index.patent_ids[idx], similarity, idx) for idx, similarity in hits]
+            for hits in hits_per_question
+        ]
     
     def _get_content_chunks(self, patent_id: str) -> list:
         """특허의 content_chunks 가져오기"""
-        patent_data = self.patents_data.get(patent_id, {})
-        content_chunks = patent_data.get('content_chunks', [])
-        
         # 각 청크의 텍스트만 추출
-        chunk_texts = []
-        for chunk in content_chunks:
-            text = chunk.get('text', '')
-            if text and text.strip():
-                chunk_texts.append(text)
+        return chunk_texts_of(self.patents_data.get(patent_id, {}))
+    
+    def _select_chunks(self, question_vector, patent_id: str, index: PatentIndex = None) -> tuple:
+        """
+        청크 인덱스로 질문과 관련 있는 청크만 선별
+        
+        관련도 상위 chunk_top_n개 중 chunk_min_score 이상인 청크를 원래 순서대로 반환한다.
+        
+        Returns:
+            (선별된 청크 텍스트 리스트, 제외된 청크 수, 선별된 청크의 관련도 리스트)
+        """
+        import numpy as np
+        
+        chunks = self._get_content_chunks(patent_id)
+        scores = (index or self.index).chunk_scores(question_vector, patent_id)
+        
+        # 인덱스와 원문 청크 수가 다르면 선별하지 않고 전체 사용
+        if len(scores) != len(chunks):
+            return chunks, 0, [0.0] * len(chunks)
+        
+        ranked = np.argsort(-scores, kind="stable")
+        if self.chunk_top_n is not None:
+            ranked = ranked[:self.chunk_top_n]
+        keep = sorted(i for i in ranked if scores[i] >= self.chunk_min_score)
+        
+        return [chunks[i] for i in keep], len(chunks) - len(keep), [float(scores[i]) for i in keep]
+    
+    @contextmanager
+    def _completion_slot(self, priority: str = "interactive", tokens: int = 0, cancelled=None,
+                         coalesce_key=None, **kwargs):
+        """
+        LLM 스케줄러의 차례를 받아 타임아웃과 재시도(지수 백오프)를 적용한 chat completion 호출
+        
+        with 블록이 끝날 때까지 스케줄러 자리를 차지하므로, 스트리밍 응답은 블록 안에서 끝까지 읽어야
+        동시 요청 수 제한에 포함된다.
+        
+        rate limit(429), 타임아웃, 연결 오류는 max_retries 번까지 재시도하고
+        그래도 실패하면 예외를 그대로 올린다. rate limit이면 스케줄러 전체를 잠시 멈춰
+        다른 요청들이 같은 한도에 연달아 부딪히지 않게 한다. 재시도 대기 중에는 자리를 비운다.
+        
+        Args:
+            priority: "interactive" 또는 "batch"
+            tokens: TPM 버킷에 예약할 토큰 수
+            cancelled: True를 돌려주면 요청을 보내지 않는다. 스케줄러 자리를 기다리는 동안과
+                자리를 받아 RPM/TPM을 쓰기 직전(재시도마다)에 확인한다
+            coalesce_key: llm_scheduler.coalesce로 처리 중인 요청의 key (함께 기다리는 요청의 우선순위를 따른다)
+        
+        Yields:
+            (response, 스케줄러에서 기다린 시간 합계(초))
+        """
+        from openai import RateLimitError, APITimeoutError, APIConnectionError
+        
+        delay = 1.0
+        queue_wait = 0.0
+        for attempt in range(self.max_retries + 1):
+            with self.llm_scheduler.slot(priority, tokens, cancelled, coalesce_key) as waited:
+                queue_wait += waited
+                try:
+                    response = self.client.chat.completions.create(timeout=self.request_timeout, **kwargs)
+                except (RateLimitError, APITimeoutError, APIConnectionError) as e:
+                    if attempt == self.max_retries:
+                        raise
+                    
+                    # 서버가 Retry-After를 알려주면 그 값을 우선 사용
+                    wait = delay
+                    response = getattr(e, "response", None)
+                    if response is not None:
+                        try:
+                            wait = max(wait, float(response.headers.get("retry-after", 0)))
+                        except (TypeError, ValueError):
+                            pass
+                    if isinstance(e, RateLimitError):
+                        self.llm_scheduler.pause(wait)
+                else:
+                    yield response, queue_wait
+                    return
+            
+            time.sleep(wait + random.uniform(0, wait / 2))
+            delay = min(delay * 2, 30.0)
+    
+    def _create_completion(self, priority: str = "interactive", tokens: int = 0, cancelled=None,
+                           coalesce_key=None, **kwargs) -> tuple:
+        """
+        _completion_slot으로 스트리밍하지 않는 chat completion 호출
+        
+        Returns:
+            (response, 스케줄러에서 기다린 시간 합계(초))
+        """
+        with self._completion_slot(priority, tokens, cancelled, coalesce_key, **kwargs) as (response, queue_wait):
+            return response, queue_wait
+    
+    def _complete(self, messages: list, max_tokens: int, temperature: float = 0.3,
+                  model: str = "gpt-4o-mini", stats: _CallStats = None, stage: str = "chunk",
+                  response_format: dict = None, **extra) -> str:
+        """
+        캐시를 먼저 확인하고, 없으면 LLM을 호출하여 응답 텍스트 반환
+        
+        response_format은 그대로 API에 전달하고(예: {"type": "json_object"}), extra는 호출 계측에 남긴다.
+        같은 프롬프트가 이미 요청 중이면 새로 요청하지 않고 그 응답을 함께 받는다.
+        """
+        start = time.perf_counter()
+        options = {"response_format": response_format} if response_format else {}
+        # JSON 모드 여부에 따라 응답이 달라지므로 요청 옵션도 키에 넣는다
+        key = LLMResponseCache.make_key(model, messages, temperature, max_tokens, **options)
+        
+        cached = self.cache.get(key)
+        if cached is not None:
+            if stats:
+                stats.add("cache_hits")
+                stats.add_call(stage, time.perf_counter() - start, cached=True, **extra)
+            return cached
+        
+        if stats:
+            stats.add("cache_misses")
+        
+        prompt_tokens = count_message_tokens(messages, model)
+        reserved = prompt_tokens + max_tokens
+        priority = stats.priority if stats else "interactive"
+        
+        def abandoned() -> bool:
+            # 조기 종료로 버린 질문의 요청이라도 같은 요청을 함께 기다리는 다른 질문이 있으면 보낸다
+            return stats is not None and stats.abandoned and not self.llm_scheduler.has_followers(key)
+        
+        def request():
+            response, queue_wait = self._create_completion(
+                priority,
+                reserved,
+                abandoned,
+                key,
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                **options
+            )
+            content = response.choices[0].message.content.strip()
+            usage = getattr(response, "usage", None)
+            used = getattr(usage, "total_tokens", 0) or 0
+            # usage가 없으면 프롬프트 + 응답 텍스트로 추정해 남은 예약분을 돌려준다
+            self.llm_scheduler.record_usage(reserved, used or prompt_tokens + count_tokens(content, model))
+            # 함께 기다리던 요청이 끝난 직후의 같은 요청은 캐시에서 받도록 결과를 넘기기 전에 저장
+            # (이미 비용을 낸 응답이므로 조기 종료로 버린 질문의 응답도 저장한다)
+            self.cache.set(key, content)
+            return content, usage, queue_wait
+        
+        (content, usage, queue_wait), coalesced = self.llm_scheduler.coalesce(key, request, priority)
+        
+        if stats:
+            if coalesced:
+                # 다른 요청의 응답을 함께 받았으므로 토큰은 다시 세지 않는다
+                stats.add("coalesced_requests")
+                stats.add_call(stage, time.perf_counter() - start, coalesced=True, **extra)
+            else:
+                stats.add_call(stage, time.perf_counter() - start, usage, queue_wait_seconds=queue_wait, **extra)
+        
+        return content
+    
+    def _complete_stream(self, messages: list, max_tokens: int, temperature: float = 0.3,
+                         model: str = "gpt-4o-mini", stats: _CallStats = None, stage: str = "synthesis"):
+        """_complete의 스트리밍 버전 - 응답 텍스트 조각을 생성되는 대로 yield"""
+        start = time.perf_counter()
+        key = LLMResponseCache.make_key(model, messages, temperature, max_tokens)
+        
+        cached = self.cache.get(key)
+        if cached is not None:
+            if stats:
+                stats.add("cache_hits")
+                stats.add_call(stage, time.perf_counter() - start, cached=True)
+            yield cached
+            return
+        
+        if stats:
+            stats.add("cache_misses")
+        
+        prompt_tokens = count_message_tokens(messages, model)
+        reserved = prompt_tokens + max_tokens
+        
+        pieces = []
+        usage = None
+        first_token_seconds = None
+        completed = False
+        # 스트림을 끝까지 읽는 동안 스케줄러 자리를 유지한다 (llm_concurrency가 열린 스트림 수도 제한)
+        with self._completion_slot(
+            stats.priority if stats else "interactive",
+            reserved,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        ) as (response, queue_wait):
+            try:
+                for chunk in response:
+                    if getattr(chunk, "usage", None) is not None:
+                        usage = chunk.usage
+                    
+                    if not chunk.choices:
+                        continue
+                    text = chunk.choices[0].delta.content
+                    if text:
+                        if first_token_seconds is None:
+                            first_token_seconds = time.perf_counter() - start
+                        pieces.append(text)
+                        yield text
+                completed = True
+            finally:
+                # 소비자가 중간에 멈춰도(GeneratorExit) 예약한 토큰을 보정하고 호출을 기록한다
+                if usage is not None:
+                    used = getattr(usage, "total_tokens", 0) or 0
+                else:
+                    # usage를 받기 전에 멈췄으면 프롬프트 + 지금까지 받은 텍스트로 추정
+                    used = prompt_tokens + count_tokens("".join(pieces), model)
+                    if not completed and hasattr(response, "close"):
+                        response.close()
+                self.llm_scheduler.record_usage(reserved, used)
+                if stats:
+                    extra = {} if completed else {"aborted": True}
+                    stats.add_call(stage, time.perf_counter() - start, usage, first_token_seconds=first_token_seconds,
+                                   queue_wait_seconds=queue_wait, **extra)
         
-        return chunk_texts
+        self.cache.set(key, "".join(pieces).strip())
     
-    def _generate_answer_from_chunk(self, question: str, chunk: str) -> tuple:
+    def _generate_answer_from_chunk(self, question: str, chunk: str, stats: _CallStats = None) -> tuple:
         """청크에서 답변 생성"""
         prompt = f"""당신은 특허 전문가입니다. 다음 문서 내용을 바탕으로 질문에 답변해주세요.
 문서에 없는 내용은 추측하지 말고, 문서에 명시된 내용만을 사용하세요.
@@ -115,29 +778,366 @@ class PatentQAChatbot:
 
 답변:"""
         
+        # 재시도 후에도 실패하면 예외가 올라가며, 호출 측에서 실패 청크로 집계한다
+        answer = self._complete(
+            messages=[
+                {"role": "system", "content": "정확한 정보만 제공하는 특허 분석 전문가"},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=400,
+            temperature=0.3,
+            stats=stats,
+            stage="chunk"
+        )
+        
+        # 유효한 답변인지 확인
+        has_answer = not any(phrase in answer.lower() for phrase in NO_ANSWER_PHRASES)
+        
+        return answer, has_answer
+    
+    def _pack_chunks(self, chunks: list) -> list:
+        """
+        청크를 순서대로 pack_token_budget 토큰 이내의 묶음으로 나누기
+        
+        예산보다 큰 청크는 혼자 한 묶음이 된다.
+        """
+        packs = []
+        current = []
+        current_tokens = 0
+        
+        for chunk in chunks:
+            # 구분 머리글과 줄바꿈 몫으로 청크마다 몇 토큰을 더한다
+            tokens = count_tokens(chunk) + 8
+            if current and current_tokens + tokens > self.pack_token_budget:
+                packs.append(current)
+                current = []
+                current_tokens = 0
+            current.append(chunk)
+            current_tokens += tokens
+        
+        if current:
+            packs.append(current)
+        return packs
+    
+    def _generate_answers_from_chunks(self, question: str, chunks: list, stats: _CallStats = None) -> list:
+        """
+        여러 청크를 한 요청에 담아 청크별 답변 생성 (packed 모드)
+        
+        Returns:
+            청크 순서대로 [(답변, has_answer), ...]
+        """
+        sections = "\n\n".join(
+            f"{PACKED_SECTION_HEADER.format(number=i)}\n{chunk}" for i, chunk in enumerate(chunks, 1)
+        )
+        prompt = f"""당신은 특허 전문가입니다. 아래 {len(chunks)}개 문서 내용 각각을 바탕으로 질문에 답변해주세요.
+문서에 없는 내용은 추측하지 말고, 해당 문서에 명시된 내용만을 사용하세요.
+각 문서는 "{PACKED_SECTION_HEADER.format(number='번호')}" 머리글로 구분됩니다.
+
+{sections}
+
+질문: {question}
+
+다음 JSON 형식으로만 답하세요. results에는 모든 문서를 번호 순서대로 하나씩 넣고,
+문서에 질문에 대한 정보가 없으면 has_answer를 false, answer를 빈 문자열로 하세요.
+{{"results": [{{"document": 1, "has_answer": true, "answer": "..."}}]}}"""
+        
+        content = self._complete(
+            messages=[
+                {"role": "system", "content": "정확한 정보만 제공하는 특허 분석 전문가. 항상 JSON으로만 답한다."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=min(400 * len(chunks), 4000),
+            temperature=0.3,
+            stats=stats,
+            stage="chunk",
+            response_format={"type": "json_object"},
+            chunks=len(chunks)
+        )
+        
+        return self._parse_packed_reply(content, len(chunks))
+    
+    @staticmethod
+    def _parse_packed_reply(content: str, num_chunks: int) -> list:
+        """
+        묶음 요청의 JSON 응답을 청크별 (답변, has_answer)로 변환
+        
+        응답에 없는 문서는 답변 없음으로 처리하고, JSON이 아니면 예외를 올려 실패 청크로 집계되게 한다.
+        """
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "정확한 정보만 제공하는 특허 분석 전문가"},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=400,
-                temperature=0.3
-            )
+            results = json.loads(content).get("results", [])
+        except (json.JSONDecodeError, AttributeError):
+            raise Exception(f"묶음 응답 JSON 파싱 실패: {content[:100]}")
+        
+        outcomes = [("", False)] * num_chunks
+        for position, item in enumerate(results):
+            if not isinstance(item, dict):
+                continue
+            number = item.get("document", position + 1)
+            if not isinstance(number, int) or not 1 <= number <= num_chunks:
+                continue
+            answer = str(item.get("answer") or "").strip()
+            outcomes[number - 1] = (answer, bool(item.get("has_answer")) and bool(answer))
+        return outcomes
+    
+    def _screen_by_digest(self, question: str, selections: list, stats: _CallStats = None) -> tuple:
+        """
+        digest로 관련 없어 보이는 청크를 원문 요청 전에 거르기 (특허마다 요청 1건, 동시에)
+        
+        digest가 없는 청크는 그대로 남기고, 거르기 요청이 실패하면 그 특허의 청크를 모두 남긴다.
+        거르기는 원문 요청 전에 LLM 왕복을 한 번 더 하므로 다음 두 조건을 모두 채울 때만 거른다.
+        
+        - 원문 요청이 max_concurrency의 2배보다 많다: 거르기 왕복 한 번을 갚으려면 원문 요청이
+          두 차례 이상 줄어야 하므로, 세 차례 이상 나눠 보내야 할 때만 지연 시간이 줄 수 있다.
+        - digest의 토큰 수가 해당 청크 원문의 절반 이하다: 그래야 거르기 프롬프트가 걸러낸 원문보다 싸다.
+        
+        Args:
+            selections: [(patent_id, 청크 목록, 관련도로 제외한 수, 청크 관련도 목록), ...]
+        
+        Returns:
+            (같은 형식의 걸러낸 selections, {patent_id: 걸러낸 청크 수})
+        """
+        if self.extraction_mode == "packed":
+            requests = sum(len(self._pack_chunks(chunks)) for _, chunks, _, _ in selections)
+        else:
+            requests = sum(len(chunks) for _, chunks, _, _ in selections)
+        if requests <= 2 * self.max_concurrency:
+            return selections, {}
+        
+        found = [self.digests.get_many(chunks) for _, chunks, _, _ in selections]
+        digest_tokens = sum(count_tokens(digest) for digests in found for digest in digests.values())
+        chunk_tokens = sum(count_tokens(chunk) for digests in found for chunk in digests)
+        if not digest_tokens or digest_tokens * 2 > chunk_tokens:
+            return selections, {}
+        
+        def screen(selection, digests):
+            patent_id, chunks, pruned, scores = selection
+            candidates = [i for i, chunk in enumerate(chunks) if chunk in digests]
+            if not candidates:
+                return selection, 0
             
-            answer = response.choices[0].message.content.strip()
+            try:
+                relevant = self._judge_digests(question, [digests[chunks[i]] for i in candidates], stats)
+            except Exception:
+                # 거르지 못하면 원문을 모두 보낸다 (답변을 잃지 않는 쪽)
+                return selection, 0
+            
+            drop = {i for i, keep in zip(candidates, relevant) if not keep}
+            kept = [i for i in range(len(chunks)) if i not in drop]
+            return (patent_id, [chunks[i] for i in kept], pruned, [scores[i] for i in kept]), len(drop)
+        
+        if self.max_concurrency == 1 or len(selections) <= 1:
+            outcomes = [screen(selection, digests) for selection, digests in zip(selections, found)]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(selections))) as executor:
+                outcomes = list(executor.map(screen, selections, found))
+        
+        return [selection for selection, _ in outcomes], {selection[0]: dropped for selection, dropped in outcomes}
+    
+    def _judge_digests(self, question: str, digests: list, stats: _CallStats = None) -> list:
+        """
+        digest들이 질문과 관련 있는지 한 요청으로 판단
+        
+        Returns:
+            digest 순서대로 [관련 여부, ...] (응답에 빠진 digest는 관련 있음으로 본다)
+        """
+        sections = "\n\n".join(
+            f"{PACKED_SECTION_HEADER.format(number=i)}\n{digest}" for i, digest in enumerate(digests, 1)
+        )
+        prompt = f"""아래는 특허 문서 조각 {len(digests)}개의 요약입니다. 각 조각의 원문이 질문에 답하는 데
+도움이 될 정보를 담고 있을지 판단하세요. 조금이라도 관련이 있으면 relevant를 true로 하세요.
+각 요약은 "{PACKED_SECTION_HEADER.format(number='번호')}" 머리글로 구분됩니다.
+
+{sections}
+
+질문: {question}
+
+다음 JSON 형식으로만 답하세요. results에는 모든 요약을 번호 순서대로 하나씩 넣으세요.
+{{"results": [{{"document": 1, "relevant": true}}]}}"""
+        
+        content = self._complete(
+            messages=[
+                {"role": "system", "content": "특허 문서의 관련 여부를 판단하는 전문가. 항상 JSON으로만 답한다."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=min(20 * len(digests) + 50, 2000),
+            temperature=0.0,
+            stats=stats,
+            stage="digest_screen",
+            response_format={"type": "json_object"},
+            chunks=len(digests)
+        )
+        
+        try:
+            results = json.loads(content).get("results", [])
+        except (json.JSONDecodeError, AttributeError):
+            raise Exception(f"digest 판단 JSON 파싱 실패: {content[:100]}")
+        
+        relevant = [True] * len(digests)
+        for position, item in enumerate(results):
+            if not isinstance(item, dict):
+                continue
+            number = item.get("document", position + 1)
+            if isinstance(number, int) and 1 <= number <= len(digests) and item.get("relevant") is False:
+                relevant[number - 1] = False
+        return relevant
+    
+    def _collect_answers(self, question: str, patent_ids: list, stats: _CallStats = None) -> dict:
+        """
+        여러 특허의 모든 청크를 동시에 검토하여 유효한 답변 수집
+        
+        청크 인덱스로 관련 청크만 선별한 뒤 최대 max_concurrency개의 요청을 동시에 보내며,
+        결과는 특허/청크 순서를 유지한다.
+        
+        Returns:
+            {patent_id: {"answers": [...], "scores": 답변별 청크 관련도, "chunks": 검토 청크 수,
+                         "pruned": 제외 청크 수, "failed": 실패 청크 수,
+                         "screened": digest로 걸러낸 청크 수}, ...}
+        """
+        collected = {}
+        for _ in self._iter_collect_answers(question, patent_ids, collected, stats):
+            pass
+        return collected
+    
+    def _iter_collect_answers(self, question: str, patent_ids: list, collected: dict,
+                              stats: _CallStats = None):
+        """
+        _collect_answers의 진행 상황을 내보내는 버전
+        
+        청크 응답이 하나 끝날 때마다 (완료 수, 전체 수)를 yield하고,
+        모두 끝나면 collected에 특허/청크 순서대로 결과를 채운다.
+        
+        early_exit_answers / early_exit_confidence가 설정되어 있으면 관련도 높은 청크부터 보내고,
+        조건을 채우는 즉시 새 요청을 멈춘다. 진행 중인 요청은 기다리지 않고 결과를 버리며,
+        보내지 않거나 버린 청크는 "skipped"로 집계한다.
+        """
+        stats = stats or _CallStats()
+        
+        with stats.timed("chunk_select"):
+            # 질문 벡터와 청크 행렬이 같은 어휘를 쓰도록 인덱스를 한 번만 읽는다
+            index = self.index
+            question_vector = index.chunk_vectorizer.transform([question])
             
-            # 유효한 답변인지 확인
-            has_answer = not any(phrase in answer.lower() for phrase in [
-                "찾을 수 없습니다", "정보가 없습니다", "언급되지 않습니다",
-                "나와 있지 않습니다", "확인할 수 없습니다"
-            ])
+            selections = [(patent_id,) + self._select_chunks(question_vector, patent_id, index)
+                          for patent_id in patent_ids]
+        
+        screened = {}
+        if self.digests is not None:
+            with stats.timed("digest_screen"):
+                selections, screened = self._screen_by_digest(question, selections, stats)
+        
+        # 요청 하나가 맡을 (특허, 청크 묶음, 청크 관련도) 목록 - per_chunk 모드는 청크 하나씩
+        jobs = []
+        for patent_id, chunks, pruned, scores in selections:
+            collected[patent_id] = {"answers": [], "scores": [], "chunks": len(chunks),
+                                    "pruned": pruned, "failed": 0, "skipped": 0,
+                                    "screened": screened.get(patent_id, 0)}
+            if self.extraction_mode == "packed":
+                start = 0
+                for pack in self._pack_chunks(chunks):
+                    jobs.append((patent_id, pack, scores[start:start + len(pack)]))
+                    start += len(pack)
+            else:
+                jobs.extend((patent_id, [chunk], [score]) for chunk, score in zip(chunks, scores))
+        
+        def run(job, job_stats):
+            # 요청마다 계측을 따로 모아 결과를 받을 때 합친다
+            # (조기 종료로 버린 요청이 질문이 끝난 뒤에 계측을 바꾸지 않도록)
+            patent_id, chunks, _ = job
+            try:
+                if self.extraction_mode == "packed":
+                    return self._generate_answers_from_chunks(question, chunks, job_stats)
+                return [self._generate_answer_from_chunk(question, chunks[0], job_stats)]
+            except Exception as e:
+                return e
+        
+        adaptive = self.early_exit_answers is not None or self.early_exit_confidence is not None
+        if adaptive:
+            # 관련도 높은 청크(묶음)부터 보낸다
+            order = sorted(range(len(jobs)), key=lambda i: -max(jobs[i][2], default=0.0))
+        else:
+            order = list(range(len(jobs)))
+        
+        evidence = {"answers": 0, "confidence": 0.0}
+        
+        def record(i, outcome, job_stats):
+            outcomes[i] = outcome
+            stats.merge(job_stats)
+            if isinstance(outcome, Exception):
+                return
+            for (_, has_answer), score in zip(outcome, jobs[i][2]):
+                if has_answer:
+                    evidence["answers"] += 1
+                    evidence["confidence"] += score
+        
+        def enough() -> bool:
+            if self.early_exit_answers is not None and evidence["answers"] >= self.early_exit_answers:
+                return True
+            return self.early_exit_confidence is not None and evidence["confidence"] >= self.early_exit_confidence
+        
+        total = sum(len(chunks) for _, chunks, _ in jobs)
+        done = 0
+        outcomes = [None] * len(jobs)
+        started = time.perf_counter()
+        if self.max_concurrency == 1 or len(jobs) <= 1:
+            for i in order:
+                if enough():
+                    break
+                job_stats = stats.child()
+                record(i, run(jobs[i], job_stats), job_stats)
+                done += len(jobs[i][1])
+                yield done, total
+        else:
+            # 동시에 max_concurrency개까지만 보내 두고, 하나 끝날 때마다 다음 요청을 보낸다
+            executor = ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(jobs)))
+            remaining = iter(order)
+            in_flight = {}
             
-            return answer, has_answer
+            def submit_next() -> bool:
+                for i in remaining:
+                    job_stats = stats.child()
+                    in_flight[executor.submit(run, jobs[i], job_stats)] = (i, job_stats)
+                    return True
+                return False
             
-        except Exception as e:
-            return f"오류 발생: {e}", False
+            try:
+                while len(in_flight) < self.max_concurrency and submit_next():
+                    pass
+                while in_flight:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        i, job_stats = in_flight.pop(future)
+                        record(i, future.result(), job_stats)
+                        done += len(jobs[i][1])
+                        yield done, total
+                    if enough():
+                        break
+                    while len(in_flight) < self.max_concurrency and submit_next():
+                        pass
+            finally:
+                # 조기 종료했거나 소비자가 중단한 경우 진행 중인 요청은 기다리지 않는다
+                # 아직 시작하지 않은 요청은 취소하고, 이미 시작한 요청은 버린 요청으로 표시한다
+                for future, (_, job_stats) in in_flight.items():
+                    future.cancel()
+                    job_stats.abandoned = True
+                executor.shutdown(wait=not in_flight, cancel_futures=True)
+        stats.add_stage("chunk_calls", time.perf_counter() - started)
+        
+        if done < total:
+            # 건너뛴 청크가 있으면 진행률을 완료로 맞춘다
+            yield done, done
+        
+        for (patent_id, chunks, scores), outcome in zip(jobs, outcomes):
+            if outcome is None:
+                collected[patent_id]["skipped"] += len(chunks)
+                collected[patent_id]["chunks"] -= len(chunks)
+                continue
+            if isinstance(outcome, Exception):
+                collected[patent_id]["failed"] += len(chunks)
+                continue
+            for (answer, has_answer), score in zip(outcome, scores):
+                if has_answer:
+                    collected[patent_id]["answers"].append(answer)
+                    collected[patent_id]["scores"].append(score)
     
     def _get_answers_from_patent(self, question: str, patent_id: str) -> list:
         """
@@ -146,38 +1146,140 @@ class PatentQAChatbot:
         Returns:
             유효한 답변 리스트
         """
-        chunks = self._get_content_chunks(patent_id)
-        valid_answers = []
-        
-        for chunk in chunks:
-            answer, has_answer = self._generate_answer_from_chunk(question, chunk)
-            if has_answer:
-                valid_answers.append(answer)
-        
-        return valid_answers
+        return self._collect_answers(question, [patent_id])[patent_id]["answers"]
     
-    def _synthesize_multi_patent_answers(self, question: str, patent_answers: dict) -> str:
+    def _rank_and_dedup_answers(self, patent_answers: dict, answer_scores: dict = None,
+                                stats: _CallStats = None) -> list:
         """
-        여러 특허 문서의 답변들을 자연스럽게 종합
+        종합 전 처리: 청크 관련도 순으로 정렬하고 거의 같은 답변은 하나만 남기기
+        
+        중복 판단은 청크 TF-IDF vectorizer로 답변을 벡터화한 코사인 유사도로 한다.
         
         Args:
-            question: 질문
-            patent_answers: {patent_id: [답변1, 답변2, ...], ...}
+            patent_answers: {patent_id: [답변, ...]}
+            answer_scores: {patent_id: [답변별 청크 관련도, ...]} (없으면 원래 순서 유지)
         
         Returns:
-            종합된 최종 답변
+            관련도 내림차순 답변 리스트
+        """
+        entries = []
+        for patent_id, answers in patent_answers.items():
+            scores = (answer_scores or {}).get(patent_id) or [0.0] * len(answers)
+            entries.extend(zip(scores, answers))
+        if not entries:
+            return []
+        
+        # 관련도가 같으면 원래(특허/청크) 순서
+        order = sorted(range(len(entries)), key=lambda i: -entries[i][0])
+        answers = [entries[i][1] for i in order]
+        
+        vectors = self.index.chunk_vectorizer.transform(answers)
+        similarities = (vectors @ vectors.T).toarray()
+        
+        kept = []
+        seen_texts = set()
+        for i, answer in enumerate(answers):
+            normalized = " ".join(answer.split())
+            if normalized in seen_texts:
+                continue
+            if any(similarities[i, j] >= self.dedup_threshold for j in kept):
+                continue
+            kept.append(i)
+            seen_texts.add(normalized)
+        
+        if stats:
+            stats.add("duplicate_answers", len(answers) - len(kept))
+        return [answers[i] for i in kept]
+    
+    def _split_by_token_budget(self, texts: list, budget: int) -> list:
+        """텍스트를 순서대로 토큰 수 합이 budget 이내인 묶음으로 나누기 (예산보다 큰 텍스트는 혼자 한 묶음)"""
+        groups = []
+        current = []
+        current_tokens = 0
+        for text in texts:
+            tokens = count_tokens(text)
+            if current and current_tokens + tokens > budget:
+                groups.append(current)
+                current = []
+                current_tokens = 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+    
+    def _fit_synthesis_budget(self, question: str, answers: list, stats: _CallStats = None,
+                              max_levels: int = 3) -> list:
         """
-        if not patent_answers:
-            return "해당 질문에 대한 정보를 찾을 수 없습니다."
+        답변들이 synthesis_token_budget을 넘으면 계층적으로 줄이기 (map-reduce)
         
+        예산 크기 묶음마다 LLM으로 중간 요약을 만들고(map), 요약들이 다시 예산을 넘으면 반복한다.
+        max_levels번 후에도 넘으면 관련도가 낮은 뒤쪽 답변부터 뺀다.
+        """
+        budget = self.synthesis_token_budget
+        if budget is None:
+            return answers
+        
+        level = 0
+        while sum(count_tokens(answer) for answer in answers) > budget and level < max_levels:
+            # 요약 하나만 남았는데도 넘으면 더 요약해도 줄지 않으므로 아래에서 자른다
+            if len(answers) == 1 and level > 0:
+                break
+            groups = self._split_by_token_budget(answers, budget)
+            
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrency, len(groups)))) as executor:
+                answers = list(executor.map(lambda group: self._summarize_answer_group(question, group, stats), groups))
+            level += 1
+        
+        # 그래도 넘으면 앞(관련도 높은 쪽)에서부터 예산 안에 드는 만큼만 사용
+        fitted = []
+        used = 0
+        for answer in answers:
+            tokens = count_tokens(answer)
+            if fitted and used + tokens > budget:
+                break
+            fitted.append(answer)
+            used += tokens
+        return fitted
+    
+    def _summarize_answer_group(self, question: str, answers: list, stats: _CallStats = None) -> str:
+        """map 단계: 답변 묶음 하나를 질문에 필요한 내용 위주로 요약"""
+        combined_content = "\n\n".join(answers)
+        prompt = f"""다음은 특허 문서들에서 추출한 정보입니다. 질문에 답하는 데 필요한 사실을 빠짐없이 유지하면서,
+중복을 없애고 간결하게 정리해주세요. 정보에 없는 내용은 추가하지 마세요.
+
+질문: {question}
+
+정보:
+{combined_content}
+
+정리된 정보:"""
+        
+        return self._complete(
+            messages=[
+                {"role": "system", "content": "정확한 정보만 제공하는 특허 분석 전문가"},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=800,
+            temperature=0.3,
+            stats=stats,
+            stage="synthesis_map"
+        )
+    
+    def _build_synthesis_messages(self, question: str, patent_answers: dict):
+        """종합 답변 요청 메시지 생성 (종합할 답변이 없으면 None)"""
         # 모든 답변을 하나로 합치기 (특허 구분 없이)
         all_answers = []
         for patent_id, answers in patent_answers.items():
             all_answers.extend(answers)
         
         if not all_answers:
-            return "해당 질문에 대한 정보를 찾을 수 없습니다."
+            return None
         
+        return self._synthesis_messages_for(question, all_answers)
+    
+    def _synthesis_messages_for(self, question: str, all_answers: list) -> list:
+        """정리된 답변 리스트로 종합 요청 메시지 생성"""
         # 모든 답변을 하나의 텍스트로
         combined_content = "\n\n".join(all_answers)
         
@@ -198,24 +1300,54 @@ class PatentQAChatbot:
 
 답변 (자연스럽고 통합된 하나의 답변):"""
         
+        return [
+            {"role": "system", "content": "여러 출처의 정보를 자연스럽게 통합하여 하나의 완결된 전문가 답변을 제공하는 특허 분석 전문가"},
+            {"role": "user", "content": synthesis_prompt}
+        ]
+    
+    def _synthesize_multi_patent_answers(self, question: str, patent_answers: dict,
+                                         stats: _CallStats = None, answer_scores: dict = None) -> str:
+        """
+        여러 특허 문서의 답변들을 자연스럽게 종합
+        
+        Args:
+            question: 질문
+            patent_answers: {patent_id: [답변1, 답변2, ...], ...}
+            answer_scores: {patent_id: [답변별 청크 관련도, ...]} (종합 입력 순위에 사용)
+        
+        Returns:
+            종합된 최종 답변
+        """
+        return "".join(self._stream_synthesis(question, patent_answers, stats, stream=False,
+                                              answer_scores=answer_scores))
+    
+    def _stream_synthesis(self, question: str, patent_answers: dict, stats: _CallStats = None,
+                          stream: bool = True, answer_scores: dict = None):
+        """
+        종합 답변을 텍스트 조각 단위로 yield
+        
+        중복 답변을 빼고 관련도 순으로 정렬한 뒤, synthesis_token_budget을 넘으면
+        중간 요약(map)을 거쳐 종합한다. stream=False면 응답 전체를 한 번에 받아 한 조각으로 내보낸다.
+        """
+        answers = self._rank_and_dedup_answers(patent_answers, answer_scores, stats)
+        if not answers:
+            yield "해당 질문에 대한 정보를 찾을 수 없습니다."
+            return
+        
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "여러 출처의 정보를 자연스럽게 통합하여 하나의 완결된 전문가 답변을 제공하는 특허 분석 전문가"},
-                    {"role": "user", "content": synthesis_prompt}
-                ],
-                max_tokens=1500,
-                temperature=0.3
-            )
+            answers = self._fit_synthesis_budget(question, answers, stats)
+            messages = self._synthesis_messages_for(question, answers)
             
-            synthesized_answer = response.choices[0].message.content.strip()
-            
-            # 각주 제거 - 답변만 반환
-            return synthesized_answer
+            if stream:
+                yield from self._complete_stream(messages, max_tokens=1500, temperature=0.3,
+                                                 stats=stats, stage="synthesis")
+            else:
+                # 각주 제거 - 답변만 반환
+                yield self._complete(messages, max_tokens=1500, temperature=0.3,
+                                     stats=stats, stage="synthesis")
             
         except Exception as e:
-            return f"답변 종합 중 오류: {e}"
+            yield f"답변 종합 중 오류: {e}"
     
     def ask(self, question: str, verbose: bool = True, max_patents: int = 3) -> dict:
         """
@@ -229,12 +1361,119 @@ class PatentQAChatbot:
         Returns:
             답변 정보를 담은 딕셔너리
         """
+        for event in self._ask_events(question, verbose, max_patents, stream=False):
+            if event["type"] == "result":
+                return event["result"]
+    
+    def ask_stream(self, question: str, max_patents: int = 3):
+        """
+        질문에 답변하기 (스트리밍)
+        
+        진행 상황과 종합 답변 텍스트를 생성되는 대로 이벤트로 yield한다.
+        
+        Yields:
+            {"type": "patents", "application_numbers": [...], "similarity_scores": [...]}
+            {"type": "chunk_done", "done": 완료 청크 수, "total": 전체 청크 수}
+            {"type": "synthesis_start"}
+            {"type": "token", "text": 답변 조각}
+            {"type": "result", "result": ask()와 같은 결과 딕셔너리}  (항상 마지막)
+        """
+        return self._ask_events(question, verbose=False, max_patents=max_patents, stream=True)
+    
+    async def ask_async(self, question: str, max_patents: int = 3, session_id: str = "default") -> dict:
+        """
+        질문에 답변하기 (비동기)
+        
+        질문은 공유 작업 큐에서 세션별로 공평하게 처리되며, 기다리는 동안 이벤트 루프를 막지 않는다.
+        
+        Args:
+            question: 사용자 질문
+            max_patents: 참조할 최대 특허 문서 수
+            session_id: 요청한 세션 식별자 (세션 간 공평성 단위)
+        
+        Returns:
+            ask()와 같은 결과 딕셔너리
+        """
+        future = self.scheduler.submit(session_id, self.ask, question, False, max_patents)
+        return await asyncio.wrap_future(future)
+    
+    async def ask_stream_async(self, question: str, max_patents: int = 3, session_id: str = "default"):
+        """
+        질문에 답변하기 (비동기 스트리밍)
+        
+        ask_stream()과 같은 이벤트를 async generator로 내보낸다.
+        차례를 기다려야 하면 먼저 {"type": "queued", "ahead": 앞에 대기 중인 질문 수}를 보낸다.
+        """
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        finished = object()
+        
+        def put(item) -> bool:
+            try:
+                loop.call_soon_threadsafe(events.put_nowait, item)
+                return True
+            except RuntimeError:
+                # 이벤트 루프가 이미 닫힘 (소비자가 떠남)
+                return False
+        
+        def produce():
+            generator = self._ask_events(question, verbose=False, max_patents=max_patents, stream=True)
+            try:
+                for event in generator:
+                    if not put(event):
+                        break
+            except Exception as e:
+                put(e)
+            finally:
+                generator.close()
+                put(finished)
+        
+        ahead = self.scheduler.queued()
+        self.scheduler.submit(session_id, produce)
+        if ahead:
+            yield {"type": "queued", "ahead": ahead}
+        
+        while True:
+            item = await events.get()
+            if item is finished:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    
+    def _ask_planned(self, question: str, max_patents: int, top_patents: list,
+                     retrieval_stages: dict = None) -> dict:
+        """
+        검색 결과를 미리 구해 둔 질문에 답변하기 (batch_process용, LLM 요청은 batch 우선순위)
+        
+        retrieval_stages: 한꺼번에 한 검색의 질문당 몫 {"vectorize": 초, "similarity": 초}
+        """
+        for event in self._ask_events(question, False, max_patents, stream=False, top_patents=top_patents,
+                                      priority="batch", retrieval_stages=retrieval_stages):
+            if event["type"] == "result":
+                return event["result"]
+    
+    def _ask_events(self, question: str, verbose: bool, max_patents: int, stream: bool,
+                    top_patents: list = None, priority: str = "interactive", retrieval_stages: dict = None):
+        """
+        ask / ask_stream 공통 파이프라인 (이벤트 generator)
+        
+        top_patents를 주면 검색 단계를 건너뛰고 그 특허들로 답변한다.
+        이때 retrieval_stages({단계: 초})를 주면 미리 한 검색 시간으로 계측에 넣어
+        ask()와 같은 단계별 시간을 남긴다.
+        priority는 이 질문의 LLM 요청이 스케줄러에서 받을 우선순위다.
+        """
         if verbose:
             print(f"\n💬 질문: {question}")
             print("=" * 60)
         
+        stats = _CallStats(priority)
+        for stage, seconds in (retrieval_stages or {}).items():
+            stats.add_stage(stage, seconds)
+        
         # 1. 관련 특허 top 3 찾기
-        top_patents = self._find_top_relevant_patents(question, top_k=max_patents)
+        if top_patents is None:
+            top_patents = self._find_top_relevant_patents(question, top_k=max_patents, stats=stats)
         
         if not top_patents:
             result = {
@@ -242,46 +1481,123 @@ class PatentQAChatbot:
                 "answer": "관련 특허 문서를 찾을 수 없습니다.",
                 "application_numbers": [],
                 "similarity_scores": [],
+                "cache_hit": False,
+                "metrics": stats.metrics(),
                 "timestamp": datetime.now().isoformat()
             }
             if verbose:
                 print("❌ 관련 특허 문서를 찾을 수 없습니다.\n")
-            return result
+            self._emit_metrics(result)
+            yield {"type": "result", "result": result}
+            return
         
         if verbose:
             print(f"🔍 상위 {len(top_patents)}개 관련 특허 발견:")
             for i, (patent_id, sim, _) in enumerate(top_patents, 1):
                 print(f"   {i}. 📋 출원번호: {patent_id} (유사도: {sim:.3f})")
         
-        # 2. 각 특허에서 답변 수집
+        yield {
+            "type": "patents",
+            "application_numbers": [p[0] for p in top_patents],
+            "similarity_scores": [float(p[1]) for p in top_patents]
+        }
+        
+        # 같은 특허들이 검색된 비슷한 질문의 답변이 있으면 그대로 재사용
+        cached = None
+        if self.question_cache is not None:
+            cached = self.question_cache.get(question, [p[0] for p in top_patents])
+        if cached is not None:
+            cached_result, cached_question, similarity = cached
+            result = dict(
+                cached_result,
+                question=question,
+                similarity_scores=[float(p[1]) for p in top_patents],
+                cache_hit=True,
+                cached_question=cached_question,
+                cache_similarity=similarity,
+                cache_hits=0,
+                cache_misses=0,
+                prompt_tokens=0,
+                completion_tokens=0,
+                metrics=stats.metrics(),
+                timestamp=datetime.now().isoformat()
+            )
+            if verbose:
+                print(f"⚡ 비슷한 질문의 답변을 재사용합니다 (유사도: {similarity:.3f}): {cached_question}")
+                print("\n📝 최종 답변:")
+                print("-" * 60)
+                print(result["answer"])
+                print("=" * 60 + "\n")
+            yield {"type": "synthesis_start"}
+            if stream:
+                yield {"type": "token", "text": result["answer"]}
+            self._emit_metrics(result)
+            yield {"type": "result", "result": result}
+            return
+        
+        # 2. 모든 특허의 청크를 동시에 검토하여 답변 수집
+        collected = {}
+        for done, total in self._iter_collect_answers(question, [p[0] for p in top_patents], collected, stats):
+            yield {"type": "chunk_done", "done": done, "total": total}
+        
         patent_answers = {}
+        answer_scores = {}
         total_chunks = 0
+        total_pruned = 0
+        total_skipped = 0
+        total_screened = 0
         total_valid = 0
+        total_failed = 0
         
         for patent_id, similarity, idx in top_patents:
-            if verbose:
-                print(f"\n📄 [{patent_id}] 분석 중...")
+            answers = collected[patent_id]["answers"]
+            num_chunks = collected[patent_id]["chunks"]
+            pruned = collected[patent_id]["pruned"]
+            failed = collected[patent_id]["failed"]
             
-            answers = self._get_answers_from_patent(question, patent_id)
-            chunks = self._get_content_chunks(patent_id)
+            total_chunks += num_chunks
+            total_pruned += pruned
+            total_skipped += collected[patent_id]["skipped"]
+            total_screened += collected[patent_id]["screened"]
+            total_failed += failed
             
-            total_chunks += len(chunks)
+            if verbose:
+                print(f"\n📄 [{patent_id}] 분석 완료")
             
             if answers:
                 patent_answers[patent_id] = answers
+                answer_scores[patent_id] = collected[patent_id]["scores"]
                 total_valid += len(answers)
                 if verbose:
-                    print(f"   ✓ {len(chunks)}개 청크 중 {len(answers)}개에서 답변 발견")
+                    print(f"   ✓ {num_chunks}개 청크 중 {len(answers)}개에서 답변 발견")
             else:
                 if verbose:
-                    print(f"   - {len(chunks)}개 청크 검토 완료 (유효 답변 없음)")
+                    print(f"   - {num_chunks}개 청크 검토 완료 (유효 답변 없음)")
+            
+            if failed and verbose:
+                print(f"   ⚠️ {failed}개 청크는 재시도 후에도 응답을 받지 못했습니다")
         
         if verbose:
-            print(f"\n📊 총 {total_chunks}개 청크 검토, {total_valid}개 유효 답변 발견")
+            print(f"\n📊 총 {total_chunks}개 청크 검토 ({total_pruned}개 청크는 관련도가 낮아 제외), "
+                  f"{total_valid}개 유효 답변 발견")
+            if total_skipped:
+                print(f"⏩ 충분한 답변이 모여 {total_skipped}개 청크는 검토하지 않았습니다")
+            if total_screened:
+                print(f"📝 digest로 {total_screened}개 청크는 관련이 없다고 보고 원문을 보내지 않았습니다")
             print("🔍 답변 종합 중...")
         
         # 3. 최종 답변 종합
-        final_answer = self._synthesize_multi_patent_answers(question, patent_answers)
+        yield {"type": "synthesis_start"}
+        
+        pieces = []
+        started = time.perf_counter()
+        for text in self._stream_synthesis(question, patent_answers, stats, stream=stream,
+                                           answer_scores=answer_scores):
+            pieces.append(text)
+            if stream:
+                yield {"type": "token", "text": text}
+        stats.add_stage("synthesis", time.perf_counter() - started)
+        final_answer = "".join(pieces).strip()
         
         result = {
             "question": question,
@@ -290,7 +1606,18 @@ class PatentQAChatbot:
             "similarity_scores": [float(p[1]) for p in top_patents],
             "patents_with_answers": list(patent_answers.keys()),
             "total_chunks_reviewed": total_chunks,
+            "total_chunks_pruned": total_pruned,
+            "total_chunks_skipped": total_skipped,
+            "total_chunks_screened": total_screened,
             "total_valid_answers": total_valid,
+            "total_failed_chunks": total_failed,
+            "total_duplicate_answers": stats.counts.get("duplicate_answers", 0),
+            "cache_hit": False,
+            "cache_hits": stats.counts["cache_hits"],
+            "cache_misses": stats.counts["cache_misses"],
+            "prompt_tokens": stats.counts["prompt_tokens"],
+            "completion_tokens": stats.counts["completion_tokens"],
+            "metrics": stats.metrics(),
             "timestamp": datetime.now().isoformat()
         }
         
@@ -300,18 +1627,37 @@ class PatentQAChatbot:
             print(final_answer)
             print("=" * 60 + "\n")
         
-        return result
+        # 실패한 청크 없이 답변을 만든 경우만 질문 캐시에 저장 (일시적 오류 결과는 재사용하지 않음)
+        if self.question_cache is not None and patent_answers and not total_failed:
+            self.question_cache.set(question, result["application_numbers"], result)
+        
+        self._emit_metrics(result)
+        yield {"type": "result", "result": result}
     
-    def chat(self):
-        """대화형 모드 시작"""
+    def _emit_metrics(self, result: dict):
+        """등록된 metrics sink에 결과 전달 (sink 오류가 답변을 막지 않도록 무시)"""
+        for sink in self.metrics_sinks:
+            try:
+                sink.emit(result)
+            except Exception as e:
+                print(f"⚠️ 계측 기록 실패: {e}")
+    
+    def chat(self, history_dir: str = DEFAULT_HISTORY_DIR):
+        """
+        대화형 모드 시작
+        
+        질문과 답변은 나오는 대로 history_dir의 세션 파일(JSONL)에 덧붙인다 (app.py와 같은 형식).
+        """
+        history = ChatHistoryStore(history_dir)
+        session_id = datetime.now().strftime("cli-%Y%m%d-%H%M%S")
+        turn = 0
+        
         print("="*60)
         print("🤖 특허 QA 챗봇 (대화형 모드 - 다중 문서 참조)")
         print("="*60)
         print("질문을 입력하세요. 종료하려면 'quit', 'exit', '종료' 입력")
         print("-"*60 + "\n")
         
-        chat_history = []
-        
         while True:
             try:
                 question = input("💬 질문: ").strip()
@@ -323,11 +1669,18 @@ class PatentQAChatbot:
                     print("\n👋 챗봇을 종료합니다. 감사합니다!")
                     break
                 
+                turn += 1
+                history.append(session_id, {"role": "user", "content": question, "turn": turn,
+                                            "timestamp": datetime.now().isoformat()})
+                
                 # 답변 생성 (최대 3개 특허 참조)
                 result = self.ask(question, verbose=True, max_patents=3)
                 
                 # 히스토리 저장
-                chat_history.append(result)
+                history.append(session_id, {"role": "assistant", "content": result["answer"],
+                                            "patents": result["application_numbers"],
+                                            "cache_hit": result.get("cache_hit", False), "turn": turn,
+                                            "timestamp": result.get("timestamp", datetime.now().isoformat())})
                 
             except KeyboardInterrupt:
                 print("\n\n👋 챗봇을 종료합니다.")
@@ -335,12 +1688,12 @@ class PatentQAChatbot:
             except Exception as e:
                 print(f"\n❌ 오류 발생: {e}\n")
         
-        # 대화 히스토리 저장
-        if chat_history:
-            self.save_chat_history(chat_history)
+        history.close()
+        if turn:
+            print(f"\n💾 대화 내역이 '{history.path(session_id)}'에 저장되었습니다.")
     
     def save_chat_history(self, history: list, filename: str = "chat_history.json"):
-        """대화 히스토리 저장"""
+        """대화 히스토리를 JSON 파일 하나로 내보내기 (대화 중 저장은 chat_history.ChatHistoryStore)"""
         try:
             with open(filename, 'w', encoding='utf-8') as f:
                 json.dump(history, f, ensure_ascii=False, indent=2)
@@ -348,24 +1701,235 @@ class PatentQAChatbot:
         except Exception as e:
             print(f"\n❌ 저장 실패: {e}")
     
-    def batch_process(self, questions: list, output_file: str = "batch_results.json", max_patents: int = 3):
-        """여러 질문을 배치로 처리 (다중 문서 참조)"""
+    def batch_process(self, questions: list, output_file: str = "batch_results.jsonl", max_patents: int = 3,
+                      max_parallel_questions: int = 4, resume: bool = True):
+        """
+        여러 질문을 배치로 처리 (다중 문서 참조)
+        
+        LLM 호출 전에 모든 질문의 관련 특허 검색을 한 번에 끝내 두고,
+        질문 여러 개를 동시에 처리하며(LLM 요청은 batch 우선순위라 대화형 질문이 먼저 나간다),
+        끝나는 대로 결과를 JSONL 파일에 한 줄씩 추가한다.
+        중단 후 다시 실행하면 출력 파일에 이미 있는 질문은 건너뛴다.
+        
+        Args:
+            questions: 질문 리스트
+            output_file: 결과 JSONL 파일
+            max_patents: 질문당 참조할 최대 특허 문서 수
+            max_parallel_questions: 동시에 처리할 질문 수
+            resume: True면 출력 파일의 기존 결과를 이어서 사용, False면 새로 작성
+        
+        Returns:
+            질문 순서대로의 결과 리스트 (이전 실행 결과 포함)
+        """
+        done = self._load_batch_results(output_file) if resume else {}
+        pending = [q for q in dict.fromkeys(questions) if q not in done]
+        
         print(f"\n📦 배치 처리 시작: {len(questions)}개 질문 (최대 {max_patents}개 특허 참조)")
+        if done:
+            print(f"↩️ 이전 실행에서 완료된 {len(questions) - len(pending)}개 질문은 건너뜁니다")
         print("="*60)
         
-        results = []
-        for i, question in enumerate(questions, 1):
-            print(f"\n[{i}/{len(questions)}] 처리 중: {question[:50]}...")
-            result = self.ask(question, verbose=False, max_patents=max_patents)
-            results.append(result)
-            print(f"✓ 완료 - {len(result['patents_with_answers'])}개 특허에서 답변 생성")
+        # 검색은 질문 전체를 행렬 하나로 묶어 먼저 계산
+        retrieval_started = time.perf_counter()
+        retrieval_stats = _CallStats("batch")
+        plans = dict(zip(pending, self.find_top_relevant_patents_batch(pending, top_k=max_patents,
+                                                                       stats=retrieval_stats)))
+        # 질문별 계측이 ask()와 같은 단계를 갖도록 한꺼번에 한 검색 시간을 질문 수로 나눠 넣는다
+        retrieval_stages = {stage: seconds / len(pending) for stage, seconds in retrieval_stats.stages.items()} \
+            if pending else {}
+        if pending:
+            print(f"🔍 {len(pending)}개 질문의 관련 특허 검색 완료 ({time.perf_counter() - retrieval_started:.2f}초)")
+        
+        started = time.time()
+        finished = 0
+        total_tokens = 0
         
-        # 결과 저장
         try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
+            with open(output_file, 'a' if resume else 'w', encoding='utf-8') as f:
+                # 비정상 종료로 마지막 줄이 잘린 경우 새 줄에서 이어 쓴다
+                if resume and f.tell() > 0 and not self._ends_with_newline(output_file):
+                    f.write("\n")
+                
+                with ThreadPoolExecutor(max_workers=max(1, max_parallel_questions)) as executor:
+                    futures = {
+                        executor.submit(self._ask_planned, question, max_patents, plans[question],
+                                        retrieval_stages): question
+                        for question in pending
+                    }
+                    
+                    for future in as_completed(futures):
+                        question = futures[future]
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            print(f"\n❌ 처리 실패: {question[:50]}... ({e})")
+                            continue
+                        
+                        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        f.flush()
+                        done[question] = result
+                        
+                        finished += 1
+                        total_tokens += result.get("prompt_tokens", 0) + result.get("completion_tokens", 0)
+                        minutes = max(time.time() - started, 1e-9) / 60
+                        
+                        print(f"[{finished}/{len(pending)}] ✓ {question[:50]}... - "
+                              f"{len(result.get('patents_with_answers', []))}개 특허에서 답변 생성 | "
+                              f"{finished / minutes:.1f} 질문/분, {total_tokens / minutes:,.0f} 토큰/분")
+            
             print(f"\n✅ 배치 처리 완료! 결과가 '{output_file}'에 저장되었습니다.")
         except Exception as e:
             print(f"\n❌ 결과 저장 실패: {e}")
         
+        self._print_stage_latencies([done[q] for q in pending if q in done])
+        
+        return [done[q] for q in questions if q in done]
+    
+    def build_chunk_digests(self, workers: int = 16, limit: int = None, block_size: int = 2000) -> dict:
+        """
+        코퍼스의 모든 청크 digest를 미리 생성 (코퍼스 버전마다 한 번 오프라인으로 실행)
+        
+        이미 digest가 있는 청크는 건너뛰므로 중단 후 다시 실행하면 이어서 만든다.
+        요청은 batch 우선순위로 보내 같은 스케줄러를 쓰는 대화형 질문을 막지 않는다.
+        
+        Args:
+            workers: 동시에 진행할 digest 요청 수
+            limit: 이번 실행에서 만들 최대 digest 수 (None이면 전부)
+            block_size: 저장소에서 기존 digest를 한 번에 확인할 청크 수
+        
+        Returns:
+            {"total": 확인한 고유 청크 수 (limit에 닿으면 거기까지), "existing": 이미 있던 수,
+             "created": 만든 수, "failed": 실패 수}
+        """
+        if self.digests is None:
+            raise Exception("digest_path 없이 만든 챗봇에서는 digest를 생성할 수 없습니다")
+        
+        def pending_blocks():
+            """digest가 없는 청크를 block_size씩 (중복 제거)"""
+            seen = set()
+            block = []
+            for _, patent in self.patents_data.items():
+                for text in chunk_texts_of(patent):
+                    if text and text not in seen:
+                        seen.add(text)
+                        block.append(text)
+                if len(block) >= block_size:
+                    yield block, self.digests.missing(block)
+                    block = []
+            if block:
+                yield block, self.digests.missing(block)
+        
+        counts = {"total": 0, "existing": 0, "created": 0, "failed": 0}
+        reached_limit = False
+        finished = []
+        started = time.time()
+        print(f"\n📝 청크 digest 생성 시작 (동시 요청 {workers}개, 저장소: {self.digests.db_path})")
+        
+        def flush():
+            if finished:
+                self.digests.set_many(finished)
+                counts["created"] += len(finished)
+                finished.clear()
+                minutes = max(time.time() - started, 1e-9) / 60
+                print(f"  ✓ {counts['created']}개 생성 (기존 {counts['existing']}개, 실패 {counts['failed']}개) | "
+                      f"{counts['created'] / minutes:.0f}개/분")
+        
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            in_flight = {}
+            submitted = 0
+            
+            def drain(keep: int):
+                """진행 중인 요청이 keep개 이하가 될 때까지 결과를 받아 저장"""
+                while len(in_flight) > keep:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        text = in_flight.pop(future)
+                        try:
+                            finished.append((text, future.result()))
+                        except Exception as e:
+                            counts["failed"] += 1
+                            print(f"  ⚠️ digest 생성 실패: {e}")
+                    if len(finished) >= 50:
+                        flush()
+            
+            for block, missing in pending_blocks():
+                counts["total"] += len(block)
+                counts["existing"] += len(block) - len(missing)
+                for text in missing:
+                    if limit is not None and submitted >= limit:
+                        break
+                    # 요청을 한꺼번에 제출하지 않고 workers의 몇 배만큼만 앞서 나간다 (메모리 제한)
+                    drain(workers * 4)
+                    in_flight[executor.submit(self._create_digest, text)] = text
+                    submitted += 1
+                if limit is not None and submitted >= limit:
+                    # 나머지 블록은 읽지 않는다 (다시 실행하면 이어서 만든다)
+                    reached_limit = True
+                    break
+            drain(0)
+        flush()
+        
+        if reached_limit:
+            print(f"✅ digest 생성 중단 (limit {limit}개): {counts['created']}개 생성, 기존 {counts['existing']}개, "
+                  f"실패 {counts['failed']}개 - 다시 실행하면 이어서 만듭니다")
+            return counts
+        remaining = counts["total"] - counts["existing"] - counts["created"]
+        print(f"✅ digest 생성 완료: {counts['created']}개 생성, 기존 {counts['existing']}개, "
+              f"실패 {counts['failed']}개, 남은 청크 {remaining}개")
+        return counts
+    
+    def _create_digest(self, text: str) -> str:
+        """청크 하나의 digest 생성 (LLM 캐시를 거치지 않고 결과는 digest 저장소에만 남긴다)"""
+        messages = digest_messages(text)
+        prompt_tokens = count_message_tokens(messages, "gpt-4o-mini")
+        reserved = prompt_tokens + 300
+        response, _ = self._create_completion(
+            "batch", reserved,
+            model="gpt-4o-mini",
+            messages=messages,
+            max_tokens=300,
+            temperature=0.0,
+            response_format={"type": "json_object"}
+        )
+        content = response.choices[0].message.content or ""
+        usage = getattr(response, "usage", None)
+        used = getattr(usage, "total_tokens", 0) or 0
+        self.llm_scheduler.record_usage(reserved, used or prompt_tokens + count_tokens(content, "gpt-4o-mini"))
+        return render_digest(content)
+    
+    def _print_stage_latencies(self, results: list):
+        """배치 결과의 단계별 소요 시간 p50/p95/p99 출력"""
+        summary = stage_latency_summary(results)
+        if not summary:
+            return
+        
+        print("\n⏱️ 단계별 소요 시간 (초)")
+        print(f"   {'단계':<14}{'건수':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for stage, stat in summary.items():
+            print(f"   {stage:<14}{stat['count']:>8}{stat['p50']:>10.3f}{stat['p95']:>10.3f}{stat['p99']:>10.3f}")
+    
+    def _load_batch_results(self, output_file: str) -> dict:
+        """이전 배치 실행의 JSONL 결과 로드 ({question: result}, 손상된 줄은 무시)"""
+        results = {}
+        if not os.path.exists(output_file):
+            return results
+        
+        with open(output_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "question" in result:
+                    results[result["question"]] = result
+        
         return results
+    
+    @staticmethod
+    def _ends_with_newline(path: str) -> bool:
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
@@ -0,0 +1,180 @@
+import concurrent.futures
+import multiprocessing
+import weakref
+
+# numpy / scipy는 import 시간이 길어 실제로 검색할 때 불러온다
+
+
+def select_top_k(indices, scores, top_k: int) -> list:
+    """
+    점수 상위 top_k개를 (index, score) 리스트로 반환
+
+    전체 정렬 대신 argpartition으로 후보를 고른 뒤 후보만 정렬한다.
+    동점이면 index가 큰 쪽이 앞선다 (전체 배열을 안정 정렬한 argsort[::-1]과 같은 순서).
+    """
+    import numpy as np
+
+    indices = np.asarray(indices)
+    scores = np.asarray(scores)
+    if top_k <= 0 or len(scores) == 0:
+        return []
+
+    if len(scores) > top_k:
+        # k번째 점수와 같은 동점 후보까지 남겨야 순서가 전체 정렬과 일치한다
+        kth_score = scores[np.argpartition(-scores, top_k - 1)[:top_k]].min()
+        mask = scores >= kth_score
+        indices, scores = indices[mask], scores[mask]
+
+    order = np.lexsort((-indices, -scores))[:top_k]
+    return [(int(indices[i]), float(scores[i])) for i in order]
+
+
+def brute_force_top_k(query_vector, matrix, top_k: int) -> list:
+    """
+    모든 행과의 코사인 유사도를 계산하는 기준 구현 (벤치마크/검증용)
+
+    역색인 도입 전 _find_top_relevant_patents와 같은 방식(전체 argsort[::-1])이며,
+    select_top_k를 쓰지 않으므로 순위/동점 처리가 바뀌면 결과가 달라져 드러난다.
+    """
+    import numpy as np
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    similarities = cosine_similarity(query_vector, matrix).flatten()
+    top_indices = np.argsort(similarities)[::-1][:top_k]
+    return [(int(idx), float(similarities[idx])) for idx in top_indices if similarities[idx] > 0]
+
+
+class InvertedIndex:
+    """
+    TF-IDF 행렬의 열(단어)별 posting list로 만든 역색인
+
+    질문에 나온 단어의 posting만 읽어 점수를 누적하므로,
+    질문과 단어를 하나도 공유하지 않는 문서는 건드리지 않는다.
+    행렬 행은 L2 정규화되어 있어 내적이 곧 코사인 유사도다.
+    """
+
+    def __init__(self, postings, row_offset: int = 0):
+        """
+        Args:
+            postings: CSC 형식의 (문서 x 단어) TF-IDF 행렬 (메모리 매핑 배열 가능)
+            row_offset: 샤드일 때 전역 문서 번호로 바꾸기 위한 시작 행
+        """
+        self.data = postings.data
+        self.indices = postings.indices
+        self.indptr = postings.indptr
+        self.shape = postings.shape
+        self.row_offset = row_offset
+
+    def search(self, query_vector, top_k: int) -> list:
+        """
+        질문 벡터와 유사도가 0보다 큰 문서 중 상위 top_k개
+
+        Returns:
+            [(문서 번호, 유사도), ...] (유사도 내림차순)
+        """
+        terms, weights = _query_terms(query_vector)
+        return self.search_terms(terms, weights, top_k)
+
+    def search_terms(self, terms, weights, top_k: int) -> list:
+        import numpy as np
+
+        rows = []
+        values = []
+        for term, weight in zip(terms, weights):
+            start, end = self.indptr[term], self.indptr[term + 1]
+            if start == end:
+                continue
+            rows.append(self.indices[start:end])
+            values.append(self.data[start:end] * weight)
+
+        if not rows:
+            return []
+
+        docs, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(values), minlength=len(docs))
+
+        positive = scores > 0
+        return select_top_k(docs[positive] + self.row_offset, scores[positive], top_k)
+
+
+def _query_terms(query_vector) -> tuple:
+    """1행 희소 벡터에서 (단어 열 번호, 가중치) 배열 추출"""
+    query = query_vector.tocsr()
+    return query.indices, query.data
+
+
+# 샤드 워커 프로세스 전역 상태 (프로세스마다 샤드 하나)
+_shard = None
+
+
+def _init_shard(index_dir: str, prefix: str, shape: tuple, start: int, end: int):
+    """저장된 CSR 행렬에서 자기 행 범위만 잘라 역색인 생성"""
+    global _shard
+    from patent_index import _load_sparse
+
+    matrix = _load_sparse(index_dir, prefix, shape, "csr")[start:end]
+    _shard = InvertedIndex(matrix.tocsc(), row_offset=start)
+
+
+def _search_shard(terms, weights, top_k: int) -> list:
+    return _shard.search_terms(terms, weights, top_k)
+
+
+def _ping():
+    return True
+
+
+def _shutdown_executors(executors: list):
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ShardedInvertedIndex:
+    """
+    문서(행)를 여러 프로세스에 나눠 검색하는 역색인
+
+    각 워커는 인덱스 스냅샷의 CSR 파일을 메모리 매핑으로 열어 자기 행 범위만 역색인으로 만든다.
+    샤드별 top_k를 합쳐 다시 고르므로 결과는 단일 InvertedIndex와 같다.
+    close()를 부르지 않아도 객체가 더 이상 참조되지 않으면 워커를 종료한다
+    (교체된 인덱스로 검색 중인 질문이 끝날 때까지 워커가 남는다).
+    """
+
+    def __init__(self, index_dir: str, prefix: str, shape: tuple, shards: int):
+        """
+        Args:
+            index_dir: PatentIndex 스냅샷 디렉토리
+            prefix: 행렬 파일 접두사 (예: "summary_")
+            shape: 행렬 크기 (문서 수, 단어 수)
+            shards: 워커 프로세스 수
+        """
+        num_rows = shape[0]
+        shards = max(1, min(shards, num_rows))
+        bounds = [num_rows * i // shards for i in range(shards + 1)]
+        context = multiprocessing.get_context("spawn")
+
+        self._executors = []
+        for start, end in zip(bounds, bounds[1:]):
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=_init_shard,
+                initargs=(index_dir, prefix, tuple(shape), start, end)
+            )
+            # 워커를 미리 띄워 첫 질문에서 로딩 시간이 들지 않도록 한다
+            executor.submit(_ping)
+            self._executors.append(executor)
+        self._finalizer = weakref.finalize(self, _shutdown_executors, self._executors)
+
+    def search(self, query_vector, top_k: int) -> list:
+        terms, weights = _query_terms(query_vector)
+        futures = [executor.submit(_search_shard, terms, weights, top_k) for executor in self._executors]
+
+        candidates = [hit for future in futures for hit in future.result()]
+        if not candidates:
+            return []
+        indices, scores = zip(*candidates)
+        return select_top_k(list(indices), list(scores), top_k)
+
+    def close(self):
+        self._finalizer()
+        self._executors = []
@@ -0,0 +1,256 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+
+def iter_json_object_items(json_file_path: str, block_size: int = 1 << 20):
+    """
+    최상위가 {key: value, ...}인 JSON 파일을 스트리밍으로 파싱하여 (key, value)를 yield
+
+    파일 전체를 메모리에 올리지 않고 특허 하나(value) 단위로만 디코딩한다.
+    """
+    decoder = json.JSONDecoder()
+
+    with open(json_file_path, 'r', encoding='utf-8') as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def fill():
+            nonlocal buf, pos, eof
+            # 값이 블록보다 크면 읽는 크기를 늘려 재파싱 횟수를 줄인다
+            more = f.read(max(block_size, len(buf) - pos))
+            if not more:
+                eof = True
+            buf = buf[pos:] + more
+            pos = 0
+
+        def skip_whitespace():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n\ufeff":
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        def expect(char):
+            nonlocal pos
+            skip_whitespace()
+            if pos >= len(buf) or buf[pos] != char:
+                raise json.JSONDecodeError(f"'{char}' expected", buf, pos)
+            pos += 1
+
+        def decode():
+            nonlocal pos
+            skip_whitespace()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    # 버퍼 끝에서 끝난 숫자 등은 잘렸을 수 있으므로 더 읽어서 다시 파싱
+                    if end < len(buf) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+        expect("{")
+        skip_whitespace()
+        if pos < len(buf) and buf[pos] == "}":
+            return
+
+        while True:
+            key = decode()
+            if not isinstance(key, str):
+                raise json.JSONDecodeError("object key expected", buf, pos)
+            expect(":")
+            yield key, decode()
+
+            skip_whitespace()
+            if pos < len(buf) and buf[pos] == ",":
+                pos += 1
+                continue
+            expect("}")
+            return
+
+
+class LazyPatents(Mapping):
+    """
+    SQLite에 저장된 특허 데이터를 dict처럼 읽는 읽기 전용 매핑
+
+    patent_id로 접근할 때만 해당 특허를 디스크에서 읽고,
+    최근 사용한 cache_size개 특허만 메모리(LRU)에 유지한다.
+    """
+
+    def __init__(self, db_path: str, cache_size: int = 64):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._length = self._connection().execute("SELECT COUNT(*) FROM patents").fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        """스레드별 읽기 전용 SQLite 연결"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def __getitem__(self, patent_id: str) -> dict:
+        with self._lock:
+            if patent_id in self._cache:
+                self._cache.move_to_end(patent_id)
+                return self._cache[patent_id]
+
+        row = self._connection().execute(
+            "SELECT data FROM patents WHERE patent_id = ?", (patent_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(patent_id)
+
+        patent = json.loads(row[0])
+        with self._lock:
+            self._cache[patent_id] = patent
+            self._cache.move_to_end(patent_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return patent
+
+    def __iter__(self):
+        for (patent_id,) in self._connection().execute("SELECT patent_id FROM patents ORDER BY position"):
+            yield patent_id
+
+    def __len__(self) -> int:
+        return self._length
+
+    def items(self):
+        """원본 JSON 순서대로 (patent_id, 특허 데이터)를 스트리밍 (LRU를 거치지 않음)"""
+        cursor = self._connection().execute("SELECT patent_id, data FROM patents ORDER BY position")
+        for patent_id, data in cursor:
+            yield patent_id, json.loads(data)
+
+
+class PatentOverlay(Mapping):
+    """
+    읽기 전용 특허 매핑(LazyPatents) 위에 추가/삭제분을 얹은 매핑
+
+    변경할 때마다 with_changes()로 새 객체를 만들므로, 이미 참조 중인 쪽은 이전 상태를 그대로 본다.
+    순서는 기본 매핑에서 남은 특허 뒤에 추가된 특허가 추가된 순서대로 온다.
+    """
+
+    def __init__(self, base: Mapping, added: dict = None, removed: frozenset = frozenset()):
+        self.base = base
+        self.added = dict(added or {})
+        self.removed = frozenset(removed)
+
+    def with_changes(self, added: dict = None, removed: list = None) -> "PatentOverlay":
+        """
+        변경을 반영한 새 매핑 반환
+
+        Args:
+            added: {patent_id: 특허 데이터} (이미 있는 출원번호는 교체되어 맨 뒤로 간다)
+            removed: 삭제할 출원번호 리스트
+        """
+        new_added = dict(self.added)
+        new_removed = set(self.removed)
+
+        for patent_id in removed or []:
+            new_added.pop(patent_id, None)
+            if patent_id in self.base:
+                new_removed.add(patent_id)
+
+        for patent_id, patent in (added or {}).items():
+            new_added.pop(patent_id, None)
+            new_added[patent_id] = patent
+            if patent_id in self.base:
+                new_removed.add(patent_id)
+
+        return PatentOverlay(self.base, new_added, frozenset(new_removed))
+
+    def __getitem__(self, patent_id: str) -> dict:
+        if patent_id in self.added:
+            return self.added[patent_id]
+        if patent_id in self.removed:
+            raise KeyError(patent_id)
+        return self.base[patent_id]
+
+    def __iter__(self):
+        for patent_id in self.base:
+            if patent_id not in self.removed:
+                yield patent_id
+        yield from self.added
+
+    def __len__(self) -> int:
+        return len(self.base) - len(self.removed) + len(self.added)
+
+    def items(self):
+        """순서대로 (patent_id, 특허 데이터)를 스트리밍"""
+        for patent_id, patent in self.base.items():
+            if patent_id not in self.removed:
+                yield patent_id, patent
+        yield from self.added.items()
+
+
+def open_patent_store(json_file_path: str, source_hash: str, store_dir: str, cache_size: int = 64) -> LazyPatents:
+    """
+    JSON 내용 해시에 해당하는 특허 저장소(SQLite)를 열고, 없으면 스트리밍 파싱으로 생성
+
+    Args:
+        json_file_path: 원본 특허 JSON 경로
+        source_hash: JSON 내용 해시 (patent_index.file_content_hash)
+        store_dir: 저장소 파일을 둘 디렉토리
+        cache_size: 메모리에 유지할 특허 수
+
+    Returns:
+        LazyPatents 매핑
+    """
+    db_path = os.path.join(store_dir, f"{source_hash[:16]}.patents.sqlite")
+    if not os.path.exists(db_path):
+        _build_store(json_file_path, db_path)
+    return LazyPatents(db_path, cache_size)
+
+
+def _build_store(json_file_path: str, db_path: str):
+    """JSON을 스트리밍으로 읽어 임시 SQLite 파일에 쓴 뒤 rename"""
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(db_path)), suffix=".tmp")
+    os.close(fd)
+
+    try:
+        conn = sqlite3.connect(tmp_path)
+        conn.execute("""
+            CREATE TABLE patents (
+                position INTEGER PRIMARY KEY,
+                patent_id TEXT NOT NULL UNIQUE,
+                data TEXT NOT NULL
+            )
+        """)
+
+        # 같은 출원번호가 여러 번 나오면 json.load처럼 마지막 값을 사용 (순서는 처음 위치 유지)
+        rows = (
+            (position, patent_id, json.dumps(patent, ensure_ascii=False))
+            for position, (patent_id, patent) in enumerate(iter_json_object_items(json_file_path))
+        )
+        conn.executemany("""
+            INSERT INTO patents (position, patent_id, data) VALUES (?, ?, ?)
+            ON CONFLICT(patent_id) DO UPDATE SET data = excluded.data
+        """, rows)
+        conn.commit()
+        conn.close()
+
+        os.replace(tmp_path, db_path)
+    except json.JSONDecodeError:
+        os.remove(tmp_path)
+        raise Exception(f"JSON 파일 형식 오류: {json_file_path}")
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
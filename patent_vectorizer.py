@@ -0,0 +1,115 @@
+"""
+어휘 사전 없는 해싱 TF-IDF vectorizer
+
+TfidfVectorizer는 학습한 단어마다 vocabulary_ dict 항목을 만들기 때문에 코퍼스가 커질수록
+학습/저장 비용이 늘고, max_features로 자르면 조사가 붙은 한국어 어절의 변형들이 잘려 나간다.
+HashingTfidfVectorizer는 문자 n-gram을 고정 크기(n_features) 열로 해싱하고 열별 idf만 학습하므로
+상태 크기가 코퍼스 크기와 무관하다. 해싱은 문서끼리 독립이라 블록으로 나눠 여러 프로세스에서 동시에 계산한다.
+"""
+import concurrent.futures
+import multiprocessing
+
+# numpy / scipy / sklearn은 import 시간이 길어 실제로 벡터화할 때 불러온다
+
+
+def _count_block(params: dict, texts: list):
+    """텍스트 블록의 해싱 n-gram 빈도 행렬 (워커 프로세스에서 호출)"""
+    import numpy as np
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    hasher = HashingVectorizer(alternate_sign=False, norm=None, dtype=np.float32, **params)
+    return hasher.transform(texts).tocsr()
+
+
+class HashingTfidfVectorizer:
+    """
+    HashingVectorizer(문자 n-gram) + idf 가중치 + L2 정규화
+
+    TfidfVectorizer(smooth_idf=True, norm="l2")와 같은 방식으로 가중치를 매기므로
+    PatentIndex에서 TfidfVectorizer 대신 그대로 쓸 수 있다 (transform / fit_transform / idf_).
+    """
+
+    def __init__(self, analyzer: str = "char_wb", ngram_range: tuple = (2, 3), n_features: int = 2 ** 20,
+                 lowercase: bool = True):
+        """
+        Args:
+            analyzer: "char_wb"(어절 경계 안의 문자 n-gram), "char" 또는 "word"
+            ngram_range: n-gram 길이 범위
+            n_features: 해싱할 열 수 (idf 배열 크기, 클수록 충돌이 적다)
+            lowercase: 소문자로 바꾼 뒤 해싱
+        """
+        self.params = {
+            "analyzer": analyzer,
+            "ngram_range": tuple(ngram_range),
+            "n_features": n_features,
+            "lowercase": lowercase
+        }
+        self.idf_ = None
+
+    def _counts(self, texts, n_jobs: int = 1, block_size: int = 2000):
+        """텍스트(이터러블)를 block_size씩 해싱한 빈도 행렬 (n_jobs > 1이면 여러 프로세스에서)"""
+        from scipy import sparse
+
+        def blocks():
+            block = []
+            for text in texts:
+                block.append(text)
+                if len(block) >= block_size:
+                    yield block
+                    block = []
+            if block:
+                yield block
+
+        if n_jobs <= 1:
+            parts = [_count_block(self.params, block) for block in blocks()]
+        else:
+            parts = []
+            context = multiprocessing.get_context("spawn")
+            with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs, mp_context=context) as executor:
+                # 텍스트 전체를 한꺼번에 넘기지 않도록 진행 중인 블록 수를 제한하고, 순서대로 받는다
+                pending = []
+                for block in blocks():
+                    pending.append(executor.submit(_count_block, self.params, block))
+                    if len(pending) >= n_jobs * 2:
+                        parts.append(pending.pop(0).result())
+                parts.extend(future.result() for future in pending)
+
+        if not parts:
+            return sparse.csr_matrix((0, self.params["n_features"]), dtype="float32")
+        return sparse.vstack(parts, format="csr")
+
+    def _weight(self, counts):
+        """빈도 행렬에 idf를 곱하고 행마다 L2 정규화"""
+        from sklearn.preprocessing import normalize
+
+        counts.data *= self.idf_[counts.indices]
+        return normalize(counts, norm="l2", copy=False)
+
+    def fit_transform(self, texts, n_jobs: int = 1, block_size: int = 2000):
+        """
+        idf를 학습하고 TF-IDF 행렬 반환
+
+        Args:
+            texts: 텍스트 이터러블 (제너레이터 가능, 한 번만 순회한다)
+            n_jobs: 해싱에 쓸 프로세스 수 (1이면 현재 프로세스에서. 2 이상이면 spawn 프로세스 풀을 쓰므로
+                호출하는 스크립트에 if __name__ == "__main__" 가드가 있어야 한다)
+            block_size: 프로세스 하나에 한 번에 넘길 텍스트 수
+        """
+        import numpy as np
+
+        counts = self._counts(texts, n_jobs, block_size)
+        num_docs = counts.shape[0]
+        document_frequency = np.bincount(counts.indices, minlength=self.params["n_features"])
+        # TfidfVectorizer(smooth_idf=True)와 같은 식
+        self.idf_ = (np.log((1.0 + num_docs) / (1.0 + document_frequency)) + 1.0).astype(np.float32)
+        return self._weight(counts)
+
+    def fit(self, texts, n_jobs: int = 1, block_size: int = 2000) -> "HashingTfidfVectorizer":
+        self.fit_transform(texts, n_jobs, block_size)
+        return self
+
+    def transform(self, texts):
+        """학습한 idf로 TF-IDF 행렬 반환"""
+        if self.idf_ is None:
+            raise Exception("HashingTfidfVectorizer가 아직 학습되지 않았습니다 (fit_transform 먼저 호출)")
+        return self._weight(_count_block(self.params, list(texts)))
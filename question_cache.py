@@ -0,0 +1,134 @@
+import re
+import threading
+from collections import OrderedDict
+
+# sklearn / scipy는 import 시간이 길어 실제로 캐시를 쓸 때 불러온다
+
+# 어절 끝에서 떼어낼 조사 (긴 것부터 맞춘다)
+_PARTICLES = sorted([
+    "은", "는", "이", "가", "을", "를", "의", "에", "에서", "에게", "으로", "로", "와", "과",
+    "도", "만", "까지", "부터", "이란", "란", "이나", "나", "보다"
+], key=len, reverse=True)
+
+# 질문의 뜻을 바꾸지 않는 의문사/요청 표현
+_FILLER_WORDS = {
+    "무엇", "무엇인가요", "무엇인가", "무엇입니까", "뭐", "뭔가요", "뭐야", "뭐예요", "무슨", "어떤", "어떠한",
+    "어떻게", "어떤가요", "얼마", "얼마인가요", "인가요", "입니까", "있나요", "있습니까", "알려줘", "알려주세요", "알려", "주세요",
+    "설명해줘", "설명해주세요", "설명", "해줘", "해주세요", "좀", "대해", "대해서", "관해", "관해서"
+}
+
+_WORD_PATTERN = re.compile(r"[0-9A-Za-z가-힣]+")
+
+
+def content_tokens(question: str) -> frozenset:
+    """
+    질문의 내용어 집합 (조사를 떼고 의문사/요청 표현은 뺀다)
+
+    "배터리를"과 "배터리는"은 같은 내용어가 되지만 "양극재"와 "음극재", "장점"과 "단점"처럼
+    문자 n-gram은 대부분 겹쳐도 뜻이 반대인 단어는 서로 다른 내용어로 남는다.
+    """
+    tokens = set()
+    for word in _WORD_PATTERN.findall(question.lower()):
+        for particle in _PARTICLES:
+            if word.endswith(particle) and len(word) > len(particle):
+                word = word[:-len(particle)]
+                break
+        if word not in _FILLER_WORDS:
+            tokens.add(word)
+    return frozenset(tokens)
+
+
+class SemanticQuestionCache:
+    """
+    표현만 다른 비슷한 질문의 답변을 재사용하는 질문 단위 캐시
+
+    질문을 문자 n-gram(HashingVectorizer, char_wb)으로 벡터화하므로 학습이 필요 없고,
+    조사/어미가 붙는 한국어 어절 변화에도 비교적 강하다.
+    다만 n-gram 유사도만으로는 "양극재"/"음극재"처럼 한 글자만 다른 반대말을 가려내지 못하므로
+    내용어 집합(content_tokens)까지 같은 질문만 같은 질문으로 본다.
+    같은 특허 집합이 검색된 경우에만 재사용하며, 최근 사용한 max_entries개만 유지한다(LRU).
+    스레드 안전하므로 Streamlit 세션들이 챗봇 인스턴스 하나를 공유하면 캐시도 공유된다.
+    """
+
+    def __init__(self, max_entries: int = 512, threshold: float = 0.85, ngram_range: tuple = (2, 3)):
+        """
+        Args:
+            max_entries: 최대 항목 수
+            threshold: 이 코사인 유사도 이상이면 같은 질문으로 본다
+            ngram_range: 문자 n-gram 범위
+        """
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ngram_range = ngram_range
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._vectorizer = None
+
+    def _vectorize(self, question: str):
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import HashingVectorizer
+            self._vectorizer = HashingVectorizer(
+                analyzer="char_wb", ngram_range=self.ngram_range, n_features=2 ** 20,
+                alternate_sign=False, norm="l2"
+            )
+        return self._vectorizer.transform([" ".join(question.lower().split())])
+
+    def get(self, question: str, patent_ids: list):
+        """
+        비슷한 질문의 캐시된 결과 반환
+
+        Args:
+            question: 새 질문
+            patent_ids: 새 질문으로 검색된 출원번호 (캐시 항목과 같아야 재사용)
+
+        Returns:
+            (캐시된 결과, 원래 질문, 유사도) 또는 None
+        """
+        from scipy import sparse
+
+        vector = self._vectorize(question)
+        patent_key = tuple(patent_ids)
+        tokens = content_tokens(question)
+
+        with self._lock:
+            candidates = [
+                key for key, entry in self._entries.items()
+                if entry["patent_key"] == patent_key and entry["tokens"] == tokens
+            ]
+            if not candidates:
+                return None
+
+            vectors = sparse.vstack([self._entries[key]["vector"] for key in candidates])
+            similarities = (vectors @ vector.T).toarray().ravel()
+            best = int(similarities.argmax())
+            if similarities[best] < self.threshold:
+                return None
+
+            key = candidates[best]
+            self._entries.move_to_end(key)
+            entry = self._entries[key]
+            return entry["result"], entry["question"], float(similarities[best])
+
+    def set(self, question: str, patent_ids: list, result: dict):
+        """결과 저장 (가장 오래 안 쓴 항목부터 제거)"""
+        vector = self._vectorize(question)
+        key = (question, tuple(patent_ids))
+
+        with self._lock:
+            self._entries[key] = {
+                "question": question,
+                "patent_key": tuple(patent_ids),
+                "tokens": content_tokens(question),
+                "vector": vector,
+                "result": result
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
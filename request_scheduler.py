@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+
+class FairScheduler:
+    """
+    세션별로 공평하게 작업을 나눠 실행하는 공유 작업 큐
+
+    세션마다 대기열을 따로 두고 라운드 로빈으로 꺼내므로, 한 세션이 질문을 많이 넣어도
+    다른 세션의 질문이 그 뒤로 밀리지 않는다. 세션 하나가 동시에 쓸 수 있는 워커 수도 제한한다.
+    """
+
+    def __init__(self, max_workers: int = 4, max_per_session: int = None):
+        """
+        Args:
+            max_workers: 동시에 실행할 작업 수 (워커 스레드 수)
+            max_per_session: 세션 하나가 동시에 실행할 수 있는 작업 수 (None이면 제한 없음)
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_per_session = max_per_session
+        self._queues = OrderedDict()
+        self._running = {}
+        self._cond = threading.Condition()
+        self._workers = []
+        self._shutdown = False
+
+    def submit(self, session_id: str, fn, *args, **kwargs) -> Future:
+        """세션의 대기열에 작업을 넣고 Future 반환"""
+        future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("스케줄러가 종료되었습니다")
+            self._queues.setdefault(session_id, deque()).append((future, fn, args, kwargs))
+            self._start_workers()
+            self._cond.notify()
+        return future
+
+    def queued(self, session_id: str = None) -> int:
+        """대기 중인 작업 수 (session_id를 주면 그 세션만)"""
+        with self._cond:
+            if session_id is not None:
+                return len(self._queues.get(session_id, ()))
+            return sum(len(queue) for queue in self._queues.values())
+
+    def running(self) -> int:
+        """실행 중인 작업 수"""
+        with self._cond:
+            return sum(self._running.values())
+
+    def _start_workers(self):
+        # 첫 작업이 들어올 때 워커를 띄운다 (import/생성만으로는 스레드를 만들지 않음)
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._work, daemon=True, name=f"fair-scheduler-{len(self._workers)}")
+            worker.start()
+            self._workers.append(worker)
+
+    def _next_job(self):
+        """실행 한도에 걸리지 않은 세션 중 가장 오래 기다린 세션의 다음 작업 (없으면 None)"""
+        for session_id, queue in self._queues.items():
+            if self.max_per_session is not None and self._running.get(session_id, 0) >= self.max_per_session:
+                continue
+
+            job = queue.popleft()
+            if queue:
+                # 방금 차례를 쓴 세션은 맨 뒤로
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            return session_id, job
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._shutdown and not self._queues:
+                        return
+                    picked = self._next_job()
+                    if picked is not None:
+                        break
+                    self._cond.wait()
+                session_id, (future, fn, args, kwargs) = picked
+                self._running[session_id] = self._running.get(session_id, 0) + 1
+
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running[session_id] -= 1
+                    if not self._running[session_id]:
+                        del self._running[session_id]
+                    # 세션 한도 때문에 기다리던 작업이 있을 수 있다
+                    self._cond.notify_all()
+
+    def shutdown(self, wait: bool = True):
+        """새 작업을 받지 않고, 대기 중인 작업까지 끝낸 뒤 워커 종료"""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
@@ -0,0 +1,51 @@
+import math
+import threading
+
+# tiktoken은 선택 의존성이다. 없거나 인코딩 파일을 받을 수 없으면(오프라인) 근사치를 쓴다.
+
+_encodings = {}
+_lock = threading.Lock()
+
+
+def _encoding_for(model: str):
+    """모델의 tiktoken 인코딩 (사용할 수 없으면 None)"""
+    with _lock:
+        if model in _encodings:
+            return _encodings[model]
+
+        try:
+            import tiktoken
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            encoding = None
+
+        _encodings[model] = encoding
+        return encoding
+
+
+def _estimate_tokens(text: str) -> int:
+    """
+    tiktoken 없이 쓰는 보수적 추정치
+
+    o200k 계열 토크나이저 기준으로 영문/숫자는 약 4자, 한글 등 비ASCII 문자는 약 1.5자당 1토큰이다.
+    """
+    ascii_chars = sum(1 for char in text if char.isascii())
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 1.5)
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """텍스트의 토큰 수"""
+    if not text:
+        return 0
+    encoding = _encoding_for(model)
+    if encoding is None:
+        return _estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: list, model: str = "gpt-4o-mini") -> int:
+    """chat 메시지 목록의 프롬프트 토큰 수 (메시지마다 역할/구분자 토큰 약 4개 포함)"""
+    return sum(count_tokens(message.get("content", ""), model) + 4 for message in messages) + 3